@@ -0,0 +1,438 @@
+"""
+Benchmark suite for the ingest, recommendation and chat paths.
+
+    python -m benchmarks.run --scales 100,1000,5000 --years 5
+    python -m benchmarks.run --compare benchmarks/results/baseline.json
+
+Data comes from benchmarks.synthetic and is served by benchmarks.stub_server,
+so no network access is needed. Results are written as JSON and can be
+compared against an earlier run.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.stub_server import StubServer
+from benchmarks.synthetic import make_universe, mfapi_payload, navall_text, scheme_history
+
+from src import data_fetch, historical_nav, master_cache
+from src.compare import MAX_COMPARE, compare_funds
+from src.similar import SimilarityIndex, scheme_features
+from src.sip import build_nav_panel
+from src.data_fetch import parse_amfi_text
+from src.category_ranks import compute_category_ranks, update_category_ranks
+from src.chat_parser import parse_query
+from src.fund_qa import match_query, select_best_scheme
+from src.nav_quality import check_history, check_snapshot
+from src.nav_snapshot import NavSnapshot
+from src.nav_store import NavHistoryStore
+from src.portfolio import build_portfolio, correlation_matrix, standardized_returns
+from src.preprocess import preprocess_hist_data, merge_hist_live
+from src.recommender import agentic_recommender, detect_fund_type, stream_candidates
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_OUT = os.path.join(ROOT_DIR, "benchmarks", "results", "latest.json")
+
+BENCHMARKS = []
+
+CHAT_TEMPLATES = [
+    "nav of {}", "what are the 3y returns of {}", "compare with {}",
+    "similar to {}", "sip of ₹5,000 in {} for 5 years", "is {} risky?",
+]
+
+# Schemes whose mfapi payloads the history ingest benchmarks parse
+QUALITY_SAMPLE = 200
+
+APP_MODULES = [
+    "streamlit", "pandas", "src.chat_ui", "src.nav_snapshot", "src.preprocess", "src.recommender",
+    "src.portfolio", "src.compare", "src.leaderboard", "src.charts", "src.outbound",
+    "src.prefetch", "src.tracing", "src.warmup",
+]
+
+
+def benchmark(name):
+    def register(fn):
+        BENCHMARKS.append((name, fn))
+        return fn
+    return register
+
+
+# ---------------- CONTEXT ----------------
+def _nav_store(histories):
+    # Flushed to disk and reopened, so lookups go through the memory-mapped segments
+    root = tempfile.mkdtemp(prefix="nav_store_")
+    store = NavHistoryStore(root)
+    for code, df in histories.items():
+        store.add(code, df)
+    store.flush()
+    return NavHistoryStore(root)
+
+
+def build_context(n_schemes, years, server):
+    """
+    Everything the benchmarks need for one scale, built once.
+    """
+    universe = server.universe
+
+    live_text = navall_text(universe, years)
+    hist_text = navall_text(universe, years, offset_days=1)
+
+    df_live = parse_amfi_text(live_text)
+    df_hist = preprocess_hist_data(
+        pd.read_csv(StringIO(hist_text), sep=";", engine="python", on_bad_lines="skip")
+    )
+    df_master = merge_hist_live(df_hist, df_live)
+
+    profiles = df_live.copy()
+    profiles["fund_type"] = profiles["fund_name"].apply(detect_fund_type)
+    profiles["scheme_code"] = profiles["scheme_code"].astype(str)
+
+    queries = [
+        name.split(" - ")[0].lower()
+        for name in universe["fund_name"].sample(min(200, len(universe)), random_state=1)
+    ]
+
+    # Whole universe as portfolio candidates, best score first
+    histories = {code: scheme_history(code, years) for code in universe["scheme_code"]}
+    ranked = universe[["scheme_code"]].assign(
+        final_score=np.random.default_rng(0).normal(size=len(universe))
+    ).sort_values("final_score", ascending=False)
+
+    features = scheme_features(histories)
+
+    # mfapi responses for the history ingest benchmarks
+    sample = universe.head(QUALITY_SAMPLE)
+    payloads = {
+        code: mfapi_payload(code, name, years)
+        for code, name in zip(sample["scheme_code"], sample["fund_name"])
+    }
+
+    return {
+        "n_schemes": n_schemes,
+        "years": years,
+        "server": server,
+        "universe": universe,
+        "live_text": live_text,
+        "hist_bytes": hist_text.encode("utf-8"),
+        "raw_live": df_live[["scheme_code", "fund_name", "nav", "date", "amc", "category"]],
+        "payloads": payloads,
+        "snapshot": NavSnapshot(df=df_live, fetched_at=time.time(), source="bench", digest="bench"),
+        "df_live": df_live,
+        "df_hist": df_hist,
+        "df_master": df_master,
+        "profiles": profiles,
+        "queries": [f"nav of {q}" for q in queries],
+        "chat_messages": [
+            template.format(q)
+            for q in queries
+            for template in CHAT_TEMPLATES
+        ],
+        "histories": histories,
+        "ranked": ranked,
+        "panel": build_nav_panel(histories),
+        "features": features,
+        "similar_index": SimilarityIndex(features, profiles),
+        "category_ranks": compute_category_ranks(features, profiles),
+        "nav_store": _nav_store(histories),
+    }
+
+
+# ---------------- BENCHMARKS ----------------
+@benchmark("parse_amfi_text")
+def bench_parse(ctx):
+    parse_amfi_text(ctx["live_text"])
+
+
+@benchmark("merge_hist_live")
+def bench_merge(ctx):
+    merge_hist_live(ctx["df_hist"], ctx["df_live"])
+
+
+@benchmark("detect_fund_type")
+def bench_detect(ctx):
+    ctx["df_master"]["scheme_name"].apply(detect_fund_type)
+
+
+@benchmark("nav_quality_snapshot")
+def bench_quality_snapshot(ctx):
+    # the share of parse_amfi_text spent on data-quality checks
+    check_snapshot(ctx["raw_live"])
+
+
+def _history_frame(payload):
+    # fetch_scheme_history's parse, without the quality pass
+    df = pd.DataFrame(json.loads(payload)["data"])
+    df["date"] = pd.to_datetime(df["date"], format="%d-%m-%Y", errors="coerce")
+    df["nav"] = pd.to_numeric(df["nav"], errors="coerce")
+    return df.dropna(subset=["date", "nav"])
+
+
+@benchmark("history_ingest")
+def bench_history_ingest(ctx):
+    for code, payload in ctx["payloads"].items():
+        check_history(_history_frame(payload), code)
+
+
+@benchmark("nav_quality_histories")
+def bench_quality_histories(ctx):
+    # the quality-pass part of history_ingest
+    for code in ctx["payloads"]:
+        check_history(ctx["histories"][code], code)
+
+
+def _master_table(ctx):
+    df_hist, digest = master_cache.get_upload("hist.txt", ctx["hist_bytes"])
+    return master_cache.get_master(digest, df_hist, ctx["snapshot"])
+
+
+@benchmark("master_table_cold")
+def bench_master_cold(ctx):
+    # read + preprocess + merge + classify, as before the cache
+    master_cache.clear_master_cache()
+    _master_table(ctx)
+
+
+@benchmark("master_table_cached")
+def bench_master_cached(ctx):
+    # a rerun / another session with the same upload and snapshot
+    _master_table(ctx)
+
+
+@benchmark("agentic_recommender")
+def bench_recommender(ctx):
+    # cold: every candidate history goes through the stub server
+    historical_nav.clear_history_cache()
+    agentic_recommender(ctx["df_master"], "high", "long", "sip", 5000, "Equity", top_n=5)
+
+
+@benchmark("stream_first_result")
+def bench_stream_first(ctx):
+    # cold, like agentic_recommender: time until the provisional ranking is ready
+    historical_nav.clear_history_cache()
+    stream = stream_candidates(ctx["df_master"], "high", "long", "sip", 5000, "Equity")
+    next(stream)
+    stream.close()
+
+
+@benchmark("stream_all_results")
+def bench_stream_all(ctx):
+    # cold, every refinement consumed: comparable to agentic_recommender
+    historical_nav.clear_history_cache()
+    for _ in stream_candidates(ctx["df_master"], "high", "long", "sip", 5000, "Equity"):
+        pass
+
+
+@benchmark("compare_funds")
+def bench_compare(ctx):
+    # first repeat fetches through the rate-limited stub, later ones hit the history cache
+    codes = ctx["universe"]["scheme_code"].head(MAX_COMPARE).tolist()
+    compare_funds(codes)
+
+
+@benchmark("portfolio_builder")
+def bench_portfolio(ctx):
+    # greedy low-correlation top 10 + weights over every scheme
+    build_portfolio(ctx["ranked"], ctx["histories"], top_n=10)
+
+
+@benchmark("correlation_matrix")
+def bench_correlation(ctx):
+    Z, _, _ = standardized_returns(ctx["panel"])
+    correlation_matrix(Z)
+
+
+@benchmark("similar_index_build")
+def bench_similar_build(ctx):
+    SimilarityIndex(scheme_features(ctx["histories"]), ctx["profiles"])
+
+
+@benchmark("similar_query")
+def bench_similar_query(ctx):
+    index = ctx["similar_index"]
+    codes = index.rows["scheme_code"].head(1000)
+    for code in codes:
+        index.neighbours(code, 5)
+    return {"queries": len(codes)}
+
+
+@benchmark("category_ranks_full")
+def bench_category_ranks_full(ctx):
+    compute_category_ranks(ctx["features"], ctx["profiles"])
+
+
+@benchmark("category_ranks_update")
+def bench_category_ranks_update(ctx):
+    # a new NAV date for the schemes of one category
+    ranks = ctx["category_ranks"]
+    features = ctx["features"].copy()
+    moved = ranks.index[ranks["category"] == ranks["category"].iloc[0]]
+    features.loc[moved, "as_of"] += pd.Timedelta(days=1)
+    update_category_ranks(ranks, features, ctx["profiles"])
+
+
+@benchmark("nav_as_of")
+def bench_nav_as_of(ctx):
+    store = ctx["nav_store"]
+    rng = np.random.default_rng(0)
+    codes = rng.choice(ctx["universe"]["scheme_code"].to_numpy(), 2000)
+    # arbitrary dates inside the stored history, so no lookup triggers a refetch
+    days = pd.Timestamp("2026-02-03") - pd.to_timedelta(rng.integers(0, 365 * ctx["years"], 2000), unit="D")
+    for code, day in zip(codes, days):
+        store.nav_as_of(code, day)
+    assert store.stats["fetches"] == 0
+    return {"queries": len(codes)}
+
+
+@benchmark("cold_import")
+def bench_cold_import(ctx):
+    # fresh interpreter importing everything streamlit_app.py imports at module level
+    subprocess.run(
+        [sys.executable, "-c", "import " + ", ".join(APP_MODULES)],
+        cwd=ROOT_DIR, check=True, env={**os.environ, "PYTHONPATH": ROOT_DIR},
+    )
+
+
+@benchmark("chat_parse")
+def bench_chat_parse(ctx):
+    # uncached parse: tokens, intents, entities and keyword in one pass
+    parse = parse_query.__wrapped__
+    for q in ctx["chat_messages"]:
+        parse(q)
+    return {"messages": len(ctx["chat_messages"])}
+
+
+@benchmark("chat_lookup")
+def bench_chat_lookup(ctx):
+    df = ctx["profiles"]
+    for q in ctx["queries"]:
+        match = match_query(df, parse_query(q))
+        if isinstance(match, pd.DataFrame):
+            select_best_scheme(match)
+    return {"messages": len(ctx["queries"])}
+
+
+# ---------------- RUNNER ----------------
+def _time(fn, ctx, repeat):
+    samples = []
+    extra = {}
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        extra = fn(ctx) or {}
+        samples.append((time.perf_counter() - start) * 1000)
+
+    out = {
+        "min_ms": round(min(samples), 3),
+        "median_ms": round(statistics.median(samples), 3),
+        "repeat": repeat,
+    }
+
+    for unit in ("messages", "queries"):
+        if unit in extra:
+            out[f"{unit}_per_s"] = round(extra[unit] / (out["median_ms"] / 1000), 1)
+
+    return out
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except Exception:
+        return None
+
+
+def run(scales, years=5, repeat=3, latency_ms=0.0, failure_rate=0.0, only=None):
+    results = {}
+
+    for n in scales:
+        universe = make_universe(n)
+
+        with StubServer(universe, years, latency_ms, failure_rate) as server:
+            data_fetch.AMFI_URL = server.amfi_url
+            historical_nav.MFAPI_URL = server.mfapi_url
+
+            ctx = build_context(n, years, server)
+            results[str(n)] = {}
+
+            for name, fn in BENCHMARKS:
+                if only and name not in only:
+                    continue
+
+                results[str(n)][name] = _time(fn, ctx, repeat)
+                print(f"[{n:>6} schemes] {name:<24} {results[str(n)][name]['median_ms']:>10.2f} ms")
+
+            results[str(n)]["_stub"] = {"requests": server.requests, "failures": server.failures}
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "pandas": pd.__version__,
+            "years": years,
+            "repeat": repeat,
+            "latency_ms": latency_ms,
+            "failure_rate": failure_rate,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline):
+    """
+    Print median ratios current / baseline for every shared benchmark.
+    """
+    print("\nscale  benchmark                  baseline ms   current ms   ratio")
+
+    for scale, benches in current["results"].items():
+        for name, r in benches.items():
+            old = baseline.get("results", {}).get(scale, {}).get(name)
+            if name.startswith("_") or not old:
+                continue
+
+            ratio = r["median_ms"] / old["median_ms"] if old["median_ms"] else float("nan")
+            print(f"{scale:>6} {name:<24} {old['median_ms']:>12.2f} {r['median_ms']:>12.2f} {ratio:>7.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mutual fund recommender benchmarks")
+    parser.add_argument("--scales", default="100,1000,5000", help="comma separated scheme counts")
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="stub server latency per request")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="stub server failure probability")
+    parser.add_argument("--only", default="", help="comma separated benchmark names")
+    parser.add_argument("--out", default=DEFAULT_OUT)
+    parser.add_argument("--compare", default=None, help="baseline JSON to compare against")
+    args = parser.parse_args(argv)
+
+    scales = [int(s) for s in args.scales.split(",") if s]
+    only = {s for s in args.only.split(",") if s}
+
+    report = run(scales, args.years, args.repeat, args.latency_ms, args.failure_rate, only)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✅ Results written to {args.out}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Local stand-in for amfiindia.com and api.mfapi.in.
+
+Serves /spages/NAVAll.txt and /mf/<scheme_code> for a synthetic universe,
+with configurable latency and failure rate. Runs in a daemon thread.
+"""
+import random
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.synthetic import mfapi_payload, navall_text
+
+
+class StubServer:
+
+    def __init__(self, universe, years=5, latency_ms=0.0, failure_rate=0.0, seed=0):
+        self.universe = universe
+        self.years = years
+        self.latency_ms = latency_ms
+        self.failure_rate = failure_rate
+        self.requests = 0
+        self.failures = 0
+
+        self._names = dict(zip(universe["scheme_code"], universe["fund_name"]))
+        self._navall = navall_text(universe, years).encode("utf-8")
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = None
+
+        self._history = lru_cache(maxsize=4096)(self._build_history)
+
+    # ---------------- PAYLOADS ----------------
+    def _build_history(self, scheme_code):
+        return mfapi_payload(scheme_code, self._names[scheme_code], self.years).encode("utf-8")
+
+    def _should_fail(self):
+        with self._lock:
+            self.requests += 1
+            fail = self._rng.random() < self.failure_rate
+            self.failures += fail
+        return fail
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body, ctype):
+                self.send_response(status)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if stub.latency_ms:
+                    time.sleep(stub.latency_ms / 1000)
+
+                if stub._should_fail():
+                    return self._send(503, b"<html>Service Unavailable</html>", "text/html")
+
+                if self.path.endswith("/NAVAll.txt"):
+                    return self._send(200, stub._navall, "text/plain")
+
+                if self.path.startswith("/mf/"):
+                    code = self.path.rsplit("/", 1)[-1]
+                    if code in stub._names:
+                        return self._send(200, stub._history(code), "application/json")
+                    return self._send(200, b"{}", "application/json")
+
+                self._send(404, b"not found", "text/plain")
+
+        return Handler
+
+    # ---------------- LIFECYCLE ----------------
+    def start(self):
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address
+        return f"http://{host}:{port}"
+
+    @property
+    def amfi_url(self):
+        return f"{self.base_url}/spages/NAVAll.txt"
+
+    @property
+    def mfapi_url(self):
+        return f"{self.base_url}/mf"
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,131 @@
+"""
+Synthetic NAV universe for benchmarks.
+
+N scheme families x 4 variants (Direct/Regular x Growth/IDCW), each with a
+deterministic daily NAV path over M years. Everything is derived from the
+scheme code, so a stub server can rebuild any history on demand.
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+AMCS = [
+    "Aditya Birla Sun Life", "Axis", "HDFC", "ICICI Prudential", "Kotak Mahindra",
+    "Nippon India", "SBI", "UTI", "DSP", "Tata", "Mirae Asset", "Franklin India",
+]
+
+# Category header -> scheme name themes (picked so detect_fund_type spreads out)
+CATEGORIES = {
+    "Equity Scheme - Flexi Cap Fund": ["Flexi Cap", "Large Cap", "Mid Cap", "Small Cap", "ELSS Tax Saver"],
+    "Debt Scheme - Short Duration Fund": ["Short Duration", "Corporate Bond", "Liquid", "Gilt"],
+    "Hybrid Scheme - Aggressive Hybrid Fund": ["Balanced Advantage", "Aggressive Hybrid"],
+    "Other Scheme - Gold ETF": ["Gold ETF"],
+    "Other Scheme - FoF Overseas": ["Global Innovation FoF"],
+}
+
+VARIANTS = [
+    ("Direct", "Growth"),
+    ("Direct", "IDCW"),
+    ("Regular", "Growth"),
+    ("Regular", "IDCW"),
+]
+
+HEADER = "Scheme Code;ISIN Div Payout/ ISIN Growth;ISIN Div Reinvestment;Scheme Name;Net Asset Value;Date"
+BASE_CODE = 500000
+
+
+# ---------------- UNIVERSE ----------------
+def make_universe(n_schemes: int, seed: int = 7) -> pd.DataFrame:
+    """
+    One row per scheme: scheme_code, fund_name, amc, category.
+    n_schemes is rounded up to a multiple of the variant count.
+    """
+    rng = np.random.default_rng(seed)
+    categories = list(CATEGORIES)
+
+    n_families = -(-n_schemes // len(VARIANTS))
+    rows = []
+
+    for fam in range(n_families):
+        amc = AMCS[fam % len(AMCS)]
+        category = categories[rng.integers(len(categories))]
+        theme = CATEGORIES[category][rng.integers(len(CATEGORIES[category]))]
+
+        for v, (plan, option) in enumerate(VARIANTS):
+            code = BASE_CODE + fam * len(VARIANTS) + v
+            rows.append({
+                "scheme_code": str(code),
+                "fund_name": f"{amc} {theme} Fund {fam} - {plan} Plan - {option}",
+                "amc": f"{amc} Mutual Fund",
+                "category": category,
+            })
+
+    return pd.DataFrame(rows[:n_schemes])
+
+
+# ---------------- NAV PATHS ----------------
+def scheme_history(scheme_code, years: int, end_date="2026-02-03") -> pd.DataFrame:
+    """
+    Deterministic business-day NAV history for one scheme.
+    """
+    code = int(scheme_code)
+    rng = np.random.default_rng(code)
+
+    dates = pd.bdate_range(end=pd.Timestamp(end_date), periods=int(years * 252))
+
+    # Younger schemes start part-way through the window
+    start = int(rng.integers(0, len(dates) // 3)) if code % 5 == 0 else 0
+    dates = dates[start:]
+
+    drift = rng.normal(0.0004, 0.0002)
+    vol = rng.uniform(0.002, 0.015)
+    nav = 10 * np.exp(np.cumsum(rng.normal(drift, vol, len(dates))))
+
+    return pd.DataFrame({"date": dates, "nav": nav.round(4)})
+
+
+def mfapi_payload(scheme_code, fund_name: str, years: int, end_date="2026-02-03") -> str:
+    """
+    History in the api.mfapi.in JSON shape (newest first, dd-mm-yyyy strings).
+    """
+    df = scheme_history(scheme_code, years, end_date).iloc[::-1]
+
+    data = [
+        {"date": d, "nav": f"{n:.4f}"}
+        for d, n in zip(df["date"].dt.strftime("%d-%m-%Y"), df["nav"])
+    ]
+
+    return json.dumps({
+        "meta": {"scheme_code": int(scheme_code), "scheme_name": fund_name},
+        "data": data,
+        "status": "SUCCESS",
+    })
+
+
+# ---------------- NAVAll.txt ----------------
+def navall_text(universe: pd.DataFrame, years: int, offset_days: int = 0, end_date="2026-02-03") -> str:
+    """
+    AMFI NAVAll.txt for the universe, `offset_days` business days before the
+    latest date (offset_days=1 gives the "historical" file to merge against).
+    """
+    lines = [HEADER, " "]
+
+    for category, by_cat in universe.groupby("category", sort=False):
+        lines += [f"Open Ended Schemes({category})", " "]
+
+        for amc, by_amc in by_cat.groupby("amc", sort=False):
+            lines += [amc, " "]
+
+            for row in by_amc.itertuples(index=False):
+                hist = scheme_history(row.scheme_code, years, end_date)
+                last = hist.iloc[-1 - offset_days] if len(hist) > offset_days else hist.iloc[0]
+
+                lines.append(
+                    f"{row.scheme_code};INF000000000;-;{row.fund_name};"
+                    f"{last['nav']:.4f};{last['date'].strftime('%d-%b-%Y')}"
+                )
+
+            lines.append(" ")
+
+    return "\n".join(lines)
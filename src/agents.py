@@ -1,3 +1,6 @@
+from src.sip import HORIZON_YEARS, build_nav_panel, simulate_investment
+
+
 def risk_profile_agent(risk_appetite, horizon):
 
     if risk_appetite == "low":
@@ -11,4 +14,15 @@ def risk_profile_agent(risk_appetite, horizon):
 def amount_filter_agent(df, invest_type, amount):
     # For now keep it simple
     # (Later you can filter SIP min_sip, lumpsum min_lumpsum)
+    # SIP vs lumpsum is honoured by investment_agent once histories are fetched
     return df
+
+
+def investment_agent(histories, invest_type, amount, horizon):
+    """
+    Backtest the user's SIP/lumpsum of `amount` over the chosen horizon
+    for every fetched scheme history (batched across schemes).
+    """
+    years = HORIZON_YEARS.get(horizon, 3)
+    panel = build_nav_panel(histories)
+    return simulate_investment(panel, invest_type, amount, years)
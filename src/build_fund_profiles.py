@@ -4,6 +4,7 @@ import pandas as pd
 from src.preprocess import preprocess_hist_data, merge_hist_live
 from src.data_fetch import fetch_live_nav
 from src.recommender import detect_fund_type
+from src.fund_family import FAMILY_COLUMNS, add_family_columns
 
 
 def load_navall_txt(txt_path: str) -> pd.DataFrame:
@@ -22,8 +23,10 @@ def load_navall_txt(txt_path: str) -> pd.DataFrame:
     return df
 
 
-def build_fund_profiles(hist_txt_path: str, output_path: str = "data/fund_profiles.csv"):
-
+def make_fund_profiles(hist_txt_path: str) -> pd.DataFrame:
+    """
+    One row per scheme (latest NAV, fund type, family columns), no returns.
+    """
     # 1) Load historical NAVAll.txt
     df_hist = load_navall_txt(hist_txt_path)
     df_hist = preprocess_hist_data(df_hist)
@@ -49,12 +52,21 @@ def build_fund_profiles(hist_txt_path: str, output_path: str = "data/fund_profil
     else:
         df_profiles = df_master.copy()
 
-    # 7) Save without returns (FAST)
-    final_cols = ["scheme_code", name_col, "fund_type", "nav", "date", "nav_change_pct"]
+    # 7) Fund family (AMC / base scheme / plan / option)
+    if "family_id" not in df_profiles.columns:
+        df_profiles = add_family_columns(df_profiles, name_col)
+
+    # 8) Profile columns only (returns come from src/precompute.py)
+    final_cols = ["scheme_code", name_col, "fund_type", "category", "nav", "date", "nav_change_pct"] + FAMILY_COLUMNS
     final_cols = [c for c in final_cols if c in df_profiles.columns]
     df_profiles = df_profiles[final_cols].copy()
 
-    df_profiles = df_profiles.rename(columns={name_col: "fund_name"})
+    return df_profiles.rename(columns={name_col: "fund_name"})
+
+
+def build_fund_profiles(hist_txt_path: str, output_path: str = "data/fund_profiles.csv"):
+
+    df_profiles = make_fund_profiles(hist_txt_path)
 
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
     df_profiles.to_csv(output_path, index=False)
@@ -0,0 +1,244 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from src.fund_family import add_family_columns, pick_family_representatives
+from src.tracing import span
+
+# Percentile ranks within each AMFI category, one row per fund family, read by
+# chat answers and the recommender with a lookup
+RANKS_PATH = "data/category_ranks.csv"
+
+# metric -> True when higher is better (drawdown is negative %, so -5 beats -30)
+RANK_METRICS = {
+    "ret_6m": True,
+    "ret_1y": True,
+    "ret_3y": True,
+    "ret_5y": True,
+    "volatility": False,
+    "max_drawdown": True,
+}
+
+# Return horizons averaged into category_pct (the recommender's feature)
+SCORE_METRICS = ["ret_1y", "ret_3y", "ret_5y"]
+
+METRIC_LABELS = {
+    "ret_6m": "6M return",
+    "ret_1y": "1Y return",
+    "ret_3y": "3Y return",
+    "ret_5y": "5Y return",
+    "volatility": "Volatility",
+    "max_drawdown": "Max drawdown",
+}
+
+QUARTILE_LABELS = {1: "top quartile", 2: "second quartile", 3: "third quartile", 4: "bottom quartile"}
+
+RANK_COLUMNS = (
+    ["category", "family_id", "category_n", "category_pct", "as_of"]
+    + [f"{m}_pct" for m in RANK_METRICS]
+    + [f"{m}_q" for m in RANK_METRICS]
+)
+
+
+# ---------------- COMPUTE ----------------
+def category_of(profiles: pd.DataFrame) -> pd.Series:
+    """
+    AMFI category, falling back to fund_type for profiles written without one.
+    """
+    fallback = profiles.get("fund_type", pd.Series("Other", index=profiles.index)).fillna("Other")
+    if "category" not in profiles.columns:
+        return fallback.astype(str)
+    return profiles["category"].where(profiles["category"].notna() & (profiles["category"] != ""), fallback).astype(str)
+
+
+def _members(features: pd.DataFrame, profiles: pd.DataFrame) -> pd.DataFrame:
+    """
+    One row per family representative with a feature row: metrics + category.
+    """
+    profiles = profiles.copy()
+    profiles["scheme_code"] = profiles["scheme_code"].astype(str).str.strip()
+    if "family_id" not in profiles.columns:
+        profiles = add_family_columns(profiles, "fund_name")
+
+    reps = pick_family_representatives(profiles)
+    reps = reps.assign(category=category_of(reps))[["scheme_code", "family_id", "category"]]
+
+    if "as_of" not in features.columns:
+        features = features.assign(as_of=pd.NaT)
+
+    cols = list(RANK_METRICS) + ["as_of"]
+    return reps.merge(features[cols], left_on="scheme_code", right_index=True, how="inner").set_index("scheme_code")
+
+
+def rank_members(members: pd.DataFrame) -> pd.DataFrame:
+    """
+    Vectorized groupby-rank: <metric>_pct (0-100, higher = better within the
+    category) and <metric>_q (1 = top quartile) for every metric.
+    """
+    metrics = list(RANK_METRICS)
+    sign = np.array([1.0 if RANK_METRICS[m] else -1.0 for m in metrics])
+
+    # One rank pass over all metrics; lower-is-better ones are negated first
+    values = members[metrics].apply(pd.to_numeric, errors="coerce") * sign
+    pct = values.groupby(members["category"]).rank(pct=True).to_numpy() * 100
+    quartile = np.clip(np.ceil((100 - pct) / 25), 1, 4)
+
+    out = pd.DataFrame(index=members.index)
+    out["category"] = members["category"]
+    out["family_id"] = members["family_id"]
+    out["category_n"] = members.groupby("category")["category"].transform("size")
+    out["as_of"] = members["as_of"]
+
+    pct_cols = pd.DataFrame(np.round(pct, 1), index=members.index, columns=[f"{m}_pct" for m in metrics])
+    out["category_pct"] = pct_cols[[f"{m}_pct" for m in SCORE_METRICS]].mean(axis=1).round(1)
+    q_cols = pd.DataFrame(quartile, index=members.index, columns=[f"{m}_q" for m in metrics]).astype("Int64")
+
+    return pd.concat([out, pct_cols, q_cols], axis=1)[RANK_COLUMNS]
+
+
+def compute_category_ranks(features: pd.DataFrame, profiles: pd.DataFrame) -> pd.DataFrame:
+    with span("compute_category_ranks", rows_in=len(features)) as sp:
+        ranks = rank_members(_members(features, profiles))
+        sp["rows_out"] = len(ranks)
+        return ranks
+
+
+def _as_of_ns(df):
+    # int64 nanoseconds, so NaT compares equal to NaT
+    return pd.to_datetime(df["as_of"], errors="coerce").to_numpy("datetime64[ns]").view("i8")
+
+
+def update_category_ranks(ranks: pd.DataFrame, features: pd.DataFrame, profiles: pd.DataFrame):
+    """
+    Re-rank only the categories where a member's NAV date, category or
+    membership changed since `ranks` was computed.
+    Returns (ranks, affected categories).
+    """
+    with span("update_category_ranks", rows_in=len(features)) as sp:
+        members = _members(features, profiles)
+
+        if ranks is None or ranks.empty:
+            affected = set(members["category"])
+        else:
+            pos = ranks.index.get_indexer(members.index)
+            known = pos >= 0
+
+            old_cat = np.asarray(ranks["category"], dtype=object)[pos]
+            new_cat = np.asarray(members["category"], dtype=object)
+
+            changed = ~known | (old_cat != new_cat) | (_as_of_ns(ranks)[pos] != _as_of_ns(members))
+            affected = set(new_cat[changed]) | set(old_cat[changed & known])
+
+            # Members that left a category change its ranks too
+            gone = np.ones(len(ranks), dtype=bool)
+            gone[pos[known]] = False
+            affected |= set(np.asarray(ranks["category"], dtype=object)[gone])
+
+        sp["categories"] = len(affected)
+
+        if not affected:
+            return ranks, affected
+
+        fresh = rank_members(members[members["category"].isin(affected)])
+        if ranks is None or ranks.empty:
+            out = fresh
+        else:
+            out = pd.concat([ranks[~ranks["category"].isin(affected)], fresh])
+
+        sp["rows_out"] = len(out)
+        return out, affected
+
+
+# ---------------- STORAGE ----------------
+def load_category_ranks(path=RANKS_PATH) -> pd.DataFrame:
+    try:
+        df = pd.read_csv(path, dtype={"scheme_code": str, "family_id": str}, parse_dates=["as_of"])
+        df = df.set_index("scheme_code")
+        for metric in RANK_METRICS:
+            df[f"{metric}_q"] = df[f"{metric}_q"].astype("Int64")
+        return df
+    except Exception:
+        return pd.DataFrame(columns=RANK_COLUMNS)
+
+
+def save_category_ranks(df: pd.DataFrame, path=RANKS_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    df.to_csv(tmp, index_label="scheme_code")
+    os.replace(tmp, path)
+
+
+_refresh_lock = threading.Lock()
+_ranks_cache = {}
+
+
+def get_category_ranks(path=RANKS_PATH) -> pd.DataFrame:
+    """
+    Rank table, parsed once per file version.
+    """
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        mtime = None
+
+    cached = _ranks_cache.get(path)
+    if cached is None or cached[0] != mtime:
+        cached = _ranks_cache[path] = (mtime, load_category_ranks(path))
+    return cached[1]
+
+
+def refresh_category_ranks(features: pd.DataFrame, profiles: pd.DataFrame, path=RANKS_PATH):
+    """
+    Load, incrementally update and persist the rank table. Returns the
+    affected categories (empty when nothing changed).
+    """
+    with _refresh_lock:
+        ranks = load_category_ranks(path)
+        ranks, affected = update_category_ranks(ranks, features, profiles)
+        if affected:
+            save_category_ranks(ranks, path)
+        return affected
+
+
+# ---------------- LOOKUP ----------------
+def attach_category_ranks(profiles: pd.DataFrame, ranks: pd.DataFrame) -> pd.DataFrame:
+    """
+    profiles plus the rank columns; every variant gets its family's ranks.
+    """
+    if ranks is None or ranks.empty or "family_id" not in profiles.columns:
+        return profiles
+
+    cols = [c for c in RANK_COLUMNS if c not in ("family_id", "category", "as_of")]
+    by_family = ranks.drop_duplicates("family_id").set_index("family_id")[cols + ["category"]]
+    by_family = by_family.rename(columns={"category": "rank_category"})
+
+    profiles = profiles.drop(columns=[c for c in by_family.columns if c in profiles.columns])
+    return profiles.join(by_family, on="family_id")
+
+
+def quartile_label(q) -> str:
+    return "N/A" if q is None or pd.isna(q) else QUARTILE_LABELS[int(q)]
+
+
+def describe_ranks(fund_row) -> list:
+    """
+    "• 1Y return: top quartile (92nd percentile of 41)" lines for a profile row.
+    """
+    lines = []
+    n = fund_row.get("category_n")
+    for metric, label in METRIC_LABELS.items():
+        pct = fund_row.get(f"{metric}_pct")
+        if pct is None or pd.isna(pct):
+            continue
+        lines.append(
+            f"• {label}: {quartile_label(fund_row.get(f'{metric}_q'))} "
+            f"({_ordinal(round(pct))} percentile of {int(n)})"
+        )
+    return lines
+
+
+def _ordinal(n) -> str:
+    suffix = "th" if 11 <= n % 100 <= 13 else {1: "st", 2: "nd", 3: "rd"}.get(n % 10, "th")
+    return f"{n}{suffix}"
@@ -1,88 +1,227 @@
-import matplotlib.pyplot as plt
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from io import BytesIO
+
+import pandas as pd
 import streamlit as st
 
+# Rendered images shared by every session, keyed by (chart type, scheme_codes, data key)
+CHART_CACHE_SIZE = 256
+
+CHART_FORMAT = "png"
+CHART_DPI = 110
+
+_cache = OrderedDict()
+_inflight = {}
+_lock = threading.Lock()
+
+stats = {"hits": 0, "renders": 0}
+
+
+# ==========================================
+# RENDER LAYER
+# ==========================================
+def render_figure(draw, figsize, fmt=CHART_FORMAT, dpi=CHART_DPI) -> bytes:
+    """
+    Draw on a standalone Figure and return the encoded image.
+
+    Figure objects are not registered with pyplot, so nothing outlives this
+    call and concurrent sessions can draw at once.
+    """
+    # matplotlib is imported on first render, not at app start
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=figsize)
+    try:
+        ax = fig.subplots()
+        draw(fig, ax)
+        fig.tight_layout()
+
+        buf = BytesIO()
+        fig.savefig(buf, format=fmt, dpi=dpi)
+        return buf.getvalue()
+    finally:
+        fig.clear()
+
+
+def data_key(*values) -> str:
+    """
+    Short digest of the plotted values, for callers without a snapshot id.
+    """
+    h = hashlib.sha1()
+    for v in values:
+        if isinstance(v, (pd.DataFrame, pd.Series)):
+            h.update(pd.util.hash_pandas_object(v, index=True).to_numpy().tobytes())
+        else:
+            h.update(repr(v).encode("utf-8"))
+    return h.hexdigest()[:12]
+
+
+def render_chart(kind, codes, snapshot, draw, figsize) -> bytes:
+    """
+    Cached render: the same (kind, codes, snapshot) is drawn once per process,
+    inline by the first caller; concurrent requests for it wait on that render.
+    """
+    key = (kind, tuple(str(c) for c in codes), str(snapshot))
+
+    with _lock:
+        png = _cache.get(key)
+        if png is not None:
+            _cache.move_to_end(key)
+            stats["hits"] += 1
+            return png
+
+        fut = _inflight.get(key)
+        owner = fut is None
+        if owner:
+            fut = _inflight[key] = Future()
+            stats["renders"] += 1
+
+    if not owner:
+        return fut.result()
+
+    try:
+        png = render_figure(draw, figsize)
+    except BaseException as e:
+        fut.set_exception(e)
+        raise
+    finally:
+        with _lock:
+            _inflight.pop(key, None)
+
+    with _lock:
+        _cache[key] = png
+        while len(_cache) > CHART_CACHE_SIZE:
+            _cache.popitem(last=False)
+    fut.set_result(png)
+
+    return png
+
+
+def clear_chart_cache():
+    with _lock:
+        _cache.clear()
+
+
+def _to_float(values):
+    out = []
+    for v in values:
+        try:
+            out.append(float(v))
+        except (TypeError, ValueError):
+            out.append(0)
+    return out
+
 
 # ==========================================
 # CLEAN SMALL RETURNS CHART
 # ==========================================
-def plot_returns_chart(fund_row, title="Returns"):
+def returns_chart_png(fund_row, snapshot=None) -> bytes:
 
     periods = ["1Y", "3Y", "5Y"]
-
-    returns = [
+    clean_returns = _to_float([
         fund_row.get("returns_1y", 0),
         fund_row.get("returns_3y", 0),
         fund_row.get("returns_5y", 0),
-    ]
-
-    clean_returns = []
-    for r in returns:
-        try:
-            clean_returns.append(float(r))
-        except:
-            clean_returns.append(0)
+    ])
 
-    # Small & Clean figure
-    fig, ax = plt.subplots(figsize=(4, 2.8))
+    def draw(fig, ax):
+        ax.bar(periods, clean_returns)
 
-    ax.bar(periods, clean_returns)
+        ax.set_ylabel("Return %")
+        ax.set_title("Returns Overview", fontsize=10)
 
-    ax.set_ylabel("Return %")
-    ax.set_title("Returns Overview", fontsize=10)
+        ax.tick_params(axis='x', labelsize=8)
+        ax.tick_params(axis='y', labelsize=8)
 
-    ax.tick_params(axis='x', labelsize=8)
-    ax.tick_params(axis='y', labelsize=8)
+    code = fund_row.get("scheme_code", fund_row.get("fund_name"))
+    return render_chart("returns", [code], snapshot or data_key(clean_returns), draw, (4, 2.8))
 
-    plt.tight_layout()
 
-    st.pyplot(fig)
+def plot_returns_chart(fund_row, title="Returns", snapshot=None):
+    st.image(returns_chart_png(fund_row, snapshot))
 
 
 # ==========================================
 # CLEAN SIDE-BY-SIDE COMPARISON CHART
 # ==========================================
-def plot_compare_returns(fund1, fund2):
+def compare_returns_png(fund1, fund2, snapshot=None) -> bytes:
 
     periods = ["1Y", "3Y", "5Y"]
+    cols = ["returns_1y", "returns_3y", "returns_5y"]
+
+    f1_clean = _to_float([fund1.get(c, 0) for c in cols])
+    f2_clean = _to_float([fund2.get(c, 0) for c in cols])
+
+    def draw(fig, ax):
+        x = range(len(periods))
+
+        ax.bar([i - 0.2 for i in x], f1_clean, width=0.4, label="Fund 1")
+        ax.bar([i + 0.2 for i in x], f2_clean, width=0.4, label="Fund 2")
 
-    f1_returns = [
-        fund1.get("returns_1y", 0),
-        fund1.get("returns_3y", 0),
-        fund1.get("returns_5y", 0),
-    ]
+        ax.set_xticks(x)
+        ax.set_xticklabels(periods, fontsize=8)
+        ax.set_ylabel("Return %", fontsize=8)
+        ax.set_title("Return Comparison", fontsize=10)
 
-    f2_returns = [
-        fund2.get("returns_1y", 0),
-        fund2.get("returns_3y", 0),
-        fund2.get("returns_5y", 0),
-    ]
+        ax.legend(fontsize=7)
 
-    def clean(values):
-        out = []
-        for v in values:
-            try:
-                out.append(float(v))
-            except:
-                out.append(0)
-        return out
+    codes = [f.get("scheme_code", f.get("fund_name")) for f in (fund1, fund2)]
+    return render_chart("compare_returns", codes, snapshot or data_key(f1_clean, f2_clean), draw, (5, 3))
 
-    f1_clean = clean(f1_returns)
-    f2_clean = clean(f2_returns)
 
-    x = range(len(periods))
+def plot_compare_returns(fund1, fund2, snapshot=None):
+    st.image(compare_returns_png(fund1, fund2, snapshot))
+
+
+# ==========================================
+# N-FUND GROWTH CHART (REBASED TO 100)
+# ==========================================
+def comparison_png(rebased, names=None, title="Growth of 100", snapshot=None) -> bytes:
+
+    names = names or {}
+
+    def draw(fig, ax):
+        # One figure for the whole set; one Line2D per fund from a single plot call
+        lines = ax.plot(rebased.index, rebased.to_numpy(), linewidth=1)
+
+        ax.set_ylabel("Value (rebased)", fontsize=8)
+        ax.set_title(title, fontsize=10)
+        ax.tick_params(axis='x', labelsize=7)
+        ax.tick_params(axis='y', labelsize=7)
+
+        labels = [str(names.get(c, c))[:40] for c in rebased.columns]
+        ax.legend(lines, labels, fontsize=6, ncol=2 if len(labels) > 8 else 1, loc="upper left")
+
+    return render_chart("comparison", rebased.columns, snapshot or data_key(rebased, title), draw, (7, 3.5))
+
+
+def plot_comparison(rebased, names=None, title="Growth of 100", snapshot=None):
+    st.image(comparison_png(rebased, names, title, snapshot))
+
+
+# ==========================================
+# TOP RECOMMENDED FUNDS (1Y RETURNS)
+# ==========================================
+def top_funds_png(plot_data, snapshot=None) -> bytes:
 
-    fig, ax = plt.subplots(figsize=(5, 3))
+    labels = plot_data["scheme_name"].astype(str).tolist()
+    values = plot_data["returns_1y"].astype(float).tolist()
 
-    ax.bar([i - 0.2 for i in x], f1_clean, width=0.4, label="Fund 1")
-    ax.bar([i + 0.2 for i in x], f2_clean, width=0.4, label="Fund 2")
+    def draw(fig, ax):
+        ax.bar(labels, values)
 
-    ax.set_xticks(x)
-    ax.set_xticklabels(periods, fontsize=8)
-    ax.set_ylabel("Return %", fontsize=8)
-    ax.set_title("Return Comparison", fontsize=10)
+        ax.set_ylabel("1 Year Return (%)")
+        ax.set_title("Top Recommended Funds – 1Y Returns")
+        ax.tick_params(axis='x', labelrotation=45)
+        for label in ax.get_xticklabels():
+            label.set_horizontalalignment("right")
 
-    ax.legend(fontsize=7)
+    codes = plot_data["scheme_code"] if "scheme_code" in plot_data.columns else labels
+    return render_chart("top_funds", codes, snapshot or data_key(labels, values), draw, (6.4, 4.8))
 
-    plt.tight_layout()
 
-    st.pyplot(fig)
+def plot_top_funds(plot_data, snapshot=None):
+    st.image(top_funds_png(plot_data, snapshot))
@@ -0,0 +1,158 @@
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import lru_cache
+
+_MONTHS = r"jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec|january|february|march|april|june|july|august|september|october|november|december"
+
+# One pass over the message: dates, horizons and amounts first, then plain words
+_TOKEN_RE = re.compile(
+    r"(?P<date>\b\d{4}-\d{1,2}-\d{1,2}\b"
+    r"|\b\d{1,2}[-/.]\d{1,2}[-/.]\d{4}\b"
+    rf"|\b\d{{1,2}}(?:st|nd|rd|th)?\s(?:{_MONTHS}),?\s\d{{4}}\b"
+    rf"|\b(?:{_MONTHS})\s\d{{1,2}}(?:st|nd|rd|th)?,?\s\d{{4}}\b)"
+    r"|(?P<horizon>\b\d+\s?(?:y|yr|yrs|year|years|m|mo|mon|month|months)\b)"
+    r"|(?P<amount>(?:₹|\brs\.?|\binr)\s?\d[\d,]*(?:\.\d+)?(?:\s?(?:k|l|lakh|lakhs|cr|crore|crores)\b)?"
+    r"|\b\d[\d,]*(?:\.\d+)?\s?(?:k|lakh|lakhs|cr|crore|crores)\b)"
+    r"|(?P<word>[a-z0-9]+)"
+)
+
+# word -> intent
+INTENT_WORDS = {
+    "nav": "nav",
+    "return": "returns", "returns": "returns",
+    "risk": "risk", "risky": "risk",
+    "detail": "details", "details": "details", "about": "details",
+    "compare": "compare", "vs": "compare", "versus": "compare",
+    "similar": "similar", "alternative": "similar", "alternatives": "similar",
+    "rank": "rank", "ranking": "rank", "ranked": "rank", "quartile": "rank",
+    "percentile": "rank", "peers": "rank",
+}
+
+# Never part of a fund name query
+STOP_WORDS = {
+    "tell", "me", "show", "what", "is", "fund", "funds",
+    "direct", "regular", "plan", "option",
+    "with", "of", "to", "like", "the", "a", "an", "for", "and", "please",
+    "in", "i", "my", "invest", "sip", "lumpsum",
+    "on", "as", "at", "between", "from", "till", "until", "since", "date",
+    "its", "how", "does", "among",
+}
+
+# word -> (intents / words it needs next to it, intent, fund-name use): "word" puts it
+# back in the keyword when it is not an intent ("HDFC Top 100"), "name" also keeps it
+# in name_keyword when it is; "category of hdfc flexi cap" is not a rank question
+_CONTEXT_WORDS = {
+    "clear": ({"compare"}, "clear", "word"),
+    "reset": ({"compare"}, "clear", "word"),
+    "top": ({"rank", "category"}, "rank", "name"),
+    "category": ({"rank", "top"}, "rank", None),
+}
+
+_AMOUNT_UNITS = {"k": 1e3, "l": 1e5, "lakh": 1e5, "lakhs": 1e5, "cr": 1e7, "crore": 1e7, "crores": 1e7}
+_AMOUNT_RE = re.compile(r"(\d[\d,]*(?:\.\d+)?)\s?([a-z]*)$")
+_HORIZON_RE = re.compile(r"(\d+)\s?([a-z]+)")
+_ORDINAL_RE = re.compile(r"(?<=\d)(st|nd|rd|th)\b")
+_DATE_FORMATS = ["%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y", "%d.%m.%Y", "%d %b %Y", "%d %B %Y", "%b %d %Y", "%B %d %Y"]
+
+
+@dataclass(frozen=True)
+class ParsedQuery:
+    text: str
+    keyword: str
+    # keyword with horizon-like tokens and "top" left in: "dsp 10y g sec", "hdfc top 100"
+    name_keyword: str = ""
+    intents: frozenset = field(default_factory=frozenset)
+    horizons: tuple = ()
+    amounts: tuple = ()
+    dates: tuple = ()
+
+    def has(self, intent) -> bool:
+        return intent in self.intents
+
+    @property
+    def has_intent(self) -> bool:
+        return bool(self.intents - {"compare", "clear"})
+
+
+def _horizon(token):
+    n, unit = _HORIZON_RE.match(token.replace(" ", "")).groups()
+    return f"{int(n)}{'m' if unit.startswith('m') else 'y'}"
+
+
+def _date(token):
+    token = _ORDINAL_RE.sub("", token).replace(",", "")
+    token = token.replace("sept ", "sep ")
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(token, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _amount(token):
+    digits = re.sub(r"^(₹|rs\.?|inr)\s?", "", token)
+    m = _AMOUNT_RE.match(digits.strip())
+    if not m:
+        return None
+    value = float(m.group(1).replace(",", ""))
+    return value * _AMOUNT_UNITS.get(m.group(2), 1)
+
+
+@lru_cache(maxsize=4096)
+def parse_query(text: str) -> ParsedQuery:
+    """
+    Tokenise a chat message once into intents, entities (dates like
+    "2023-03-31" / "31 mar 2023", horizons like "3y", amounts like "5k" /
+    "₹1,00,000") and the fund keyword used for matching.
+    """
+    text = str(text).lower().strip()
+
+    words, name_words, intents, horizons, amounts, dates, context_words = [], [], set(), [], [], [], []
+
+    for m in _TOKEN_RE.finditer(text):
+        kind = m.lastgroup
+        token = m.group(kind)
+
+        if kind == "date":
+            value = _date(token)
+            if value is not None:
+                dates.append(value)
+        elif kind == "horizon":
+            horizons.append(_horizon(token))
+            # ...which may just as well be part of the fund name ("DSP 10Y G-Sec")
+            name_words.extend(token.split())
+        elif kind == "amount":
+            value = _amount(token)
+            if value is not None:
+                amounts.append(value)
+        elif token in _CONTEXT_WORDS:
+            context_words.append((len(words), len(name_words), token))
+        elif token in INTENT_WORDS:
+            intents.add(INTENT_WORDS[token])
+        elif token not in STOP_WORDS:
+            words.append(token)
+            name_words.append(token)
+
+    # Context words are intents only next to what they need
+    present = intents | {w for _, _, w in context_words}
+    for pos, name_pos, w in reversed(context_words):
+        needs, intent, name_use = _CONTEXT_WORDS[w]
+        if needs & (present - {w}):
+            intents.add(intent)
+            if name_use == "name":
+                name_words.insert(name_pos, w)
+        elif name_use is not None:
+            words.insert(pos, w)
+            name_words.insert(name_pos, w)
+
+    return ParsedQuery(
+        text=text,
+        keyword=" ".join(words),
+        name_keyword=" ".join(name_words),
+        intents=frozenset(intents),
+        horizons=tuple(horizons),
+        amounts=tuple(amounts),
+        dates=tuple(dates),
+    )
@@ -1,13 +1,27 @@
 import streamlit as st
 import pandas as pd
 
+from src.chat_parser import parse_query
 from src.fund_qa import (
     load_fund_profiles,
-    clean_query,
-    find_best_match,
-    select_best_scheme
+    match_query,
+    select_best_scheme,
+    answer_similar,
+    answer_dated,
+    answer_category_rank,
+    fund_ref,
+    resolve_fund,
+    prefetch_fund,
+    with_metrics,
+    answer_fund_question
 )
 
+# Messages kept per session; older ones are dropped
+CHAT_HISTORY_LIMIT = 100
+
+# Messages rendered per page ("Show earlier" adds a page)
+CHAT_PAGE_SIZE = 10
+
 # ================= CHATBOT LOGIC =================
 def fund_chatbot_response(user_input: str) -> str:
     df = load_fund_profiles()
@@ -15,21 +29,27 @@ def fund_chatbot_response(user_input: str) -> str:
     if df is None or df.empty:
         return "⚠️ Fund data not loaded."
 
-    # Session memory
-    if "last_fund" not in st.session_state:
-        st.session_state.last_fund = None
+    # Session memory: the last fund's scheme code, resolved against the profiles
+    st.session_state.setdefault("last_code", None)
+
+    # -------- Parse once: intents + fund keyword --------
+    pq = parse_query(user_input)
 
-    q = user_input.lower().strip()
-    cleaned = clean_query(user_input)
-    result = find_best_match(df, cleaned)
+    # -------- COMPARE (N funds) --------
+    if pq.has("compare"):
+        # The fund discussed last becomes the comparison base
+        if not st.session_state.get("compare_codes"):
+            st.session_state["base_code"] = st.session_state["last_code"]
+        return answer_fund_question(user_input, df)
 
-    # -------- Intent detection --------
-    is_nav = "nav" in q
-    is_return = "return" in q
-    is_risk = "risk" in q
-    is_details = "detail" in q or "about" in q
+    result = match_query(df, pq)
 
-    has_intent = is_nav or is_return or is_risk or is_details
+    is_nav = pq.has("nav")
+    is_return = pq.has("returns")
+    is_risk = pq.has("risk")
+    is_similar = pq.has("similar")
+
+    has_intent = pq.has_intent
 
     fund = None  # 🔑 ALWAYS initialize
 
@@ -37,7 +57,7 @@ def fund_chatbot_response(user_input: str) -> str:
     if isinstance(result, pd.DataFrame):
         if has_intent:
             fund = select_best_scheme(result)
-            st.session_state.last_fund = fund
+            st.session_state["last_code"] = fund_ref(fund)
         else:
             # AMC-level listing
             names = (
@@ -58,11 +78,11 @@ def fund_chatbot_response(user_input: str) -> str:
     # -------- Single match --------
     elif isinstance(result, pd.Series):
         fund = result
-        st.session_state.last_fund = fund
+        st.session_state["last_code"] = fund_ref(fund)
 
     # -------- Memory fallback --------
     else:
-        fund = st.session_state.last_fund
+        fund = resolve_fund(st.session_state["last_code"], df)
 
     # -------- No fund found --------
     if fund is None:
@@ -74,14 +94,31 @@ def fund_chatbot_response(user_input: str) -> str:
             "• sbi bluechip"
         )
 
+    # Warm history + metrics for the follow-up question
+    prefetch_fund(fund)
+
     name = fund.get("fund_name", "Unknown Fund")
 
+    # -------- SIMILAR FUNDS --------
+    if is_similar:
+        return answer_similar(fund, df)
+
+    # -------- NAV ON A DATE / RETURNS BETWEEN DATES --------
+    dated = answer_dated(pq, fund)
+    if dated is not None:
+        return dated
+
+    # -------- RANK WITHIN CATEGORY --------
+    if pq.has("rank"):
+        return answer_category_rank(fund, df)
+
     # -------- NAV --------
     if is_nav:
         return f"💰 NAV of **{name}** is **{fund.get('nav', 'N/A')}**"
 
     # -------- RETURNS --------
     if is_return:
+        fund = with_metrics(fund)
         return (
             f"📈 **Returns – {name}**\n\n"
             f"• 1Y: {fund.get('returns_1y', 'N/A')}\n"
@@ -99,7 +136,12 @@ def fund_chatbot_response(user_input: str) -> str:
         else:
             risk = "Moderate risk"
 
-        return f"⚠️ **{name}** is considered **{risk}**"
+        fund = with_metrics(fund)
+        return (
+            f"⚠️ **{name}** is considered **{risk}**\n\n"
+            f"• Volatility (1Y, annualised): {fund.get('volatility', 'N/A')}%\n"
+            f"• Max Drawdown: {fund.get('max_drawdown', 'N/A')}%"
+        )
 
     # -------- DETAILS / DEFAULT --------
     return (
@@ -107,21 +149,37 @@ def fund_chatbot_response(user_input: str) -> str:
         f"📌 Name: {name}\n"
         f"📂 Type: {fund.get('fund_type', 'N/A')}\n"
         f"💰 NAV: {fund.get('nav', 'N/A')}\n\n"
-        f"👉 Ask: nav | returns | risk"
+        f"👉 Ask: nav | returns | risk | similar | category rank | compare with <fund>"
     )
 
 
 # ================= CHAT UI =================
+def remember_message(role: str, content: str):
+    """
+    Append to this session's bounded history as a (role, content) tuple.
+    """
+    messages = st.session_state.setdefault("messages", [])
+    messages.append((role, content))
+    if len(messages) > CHAT_HISTORY_LIMIT:
+        del messages[:-CHAT_HISTORY_LIMIT]
+
+
 def render_chat_ui():
     st.subheader("💬 Fund Chat Assistant")
 
-    if "messages" not in st.session_state:
-        st.session_state.messages = []
+    messages = st.session_state.setdefault("messages", [])
+    pages = st.session_state.setdefault("chat_pages", 1)
+
+    # Only the latest page(s) are re-rendered on each rerun
+    shown = CHAT_PAGE_SIZE * pages
+    hidden = max(0, len(messages) - shown)
+    if hidden and st.button(f"⬆️ Show earlier messages ({hidden})", key="chat_show_earlier"):
+        st.session_state["chat_pages"] = pages + 1
+        st.rerun()
 
-    # Display history
-    for msg in st.session_state.messages:
-        with st.chat_message(msg["role"]):
-            st.markdown(msg["content"])
+    for role, content in messages[hidden:]:
+        with st.chat_message(role):
+            st.markdown(content)
 
     # ✅ SINGLE chat_input (no duplicates)
     user_input = st.chat_input(
@@ -130,15 +188,14 @@ def render_chat_ui():
     )
 
     if user_input:
-        st.session_state.messages.append(
-            {"role": "user", "content": user_input}
-        )
-
-        response = fund_chatbot_response(user_input)
+        remember_message("user", user_input)
 
-        st.session_state.messages.append(
-            {"role": "assistant", "content": response}
-        )
+        with st.chat_message("user"):
+            st.markdown(user_input)
 
+        # Comparison charts and tables render inside the reply
         with st.chat_message("assistant"):
+            response = fund_chatbot_response(user_input)
             st.markdown(response)
+
+        remember_message("assistant", response)
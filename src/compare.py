@@ -0,0 +1,177 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from src.historical_nav import fetch_scheme_history
+from src.sip import build_nav_panel
+from src.tracing import span
+
+# Chat / UI cap; the engine itself has no hard limit
+MAX_COMPARE = 30
+
+# mfapi calls still go through the shared rate limiter in src.outbound
+FETCH_WORKERS = 8
+
+COMPARE_HORIZONS = {
+    "6M": pd.DateOffset(months=6),
+    "1Y": pd.DateOffset(years=1),
+    "3Y": pd.DateOffset(years=3),
+    "5Y": pd.DateOffset(years=5),
+}
+
+
+@dataclass
+class Comparison:
+    codes: list
+    names: dict
+    rebased: pd.DataFrame
+    returns: pd.DataFrame
+    correlation: pd.DataFrame
+    drawdown: pd.Series
+    start: pd.Timestamp = None
+    errors: dict = field(default_factory=dict)
+
+
+# ---------------- LOAD ----------------
+def fetch_histories(codes, max_workers=FETCH_WORKERS):
+    """
+    Fetch NAV histories for many schemes concurrently.
+    Returns (histories, errors) keyed by scheme_code.
+    """
+    codes = list(dict.fromkeys(str(c).strip() for c in codes))
+    histories, errors = {}, {}
+
+    if not codes:
+        return histories, errors
+
+    with span("fetch_compare_histories", rows_in=len(codes)) as sp:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(codes))) as pool:
+            futures = {code: pool.submit(fetch_scheme_history, code) for code in codes}
+
+        for code, fut in futures.items():
+            try:
+                df_nav = fut.result()
+            except Exception as e:
+                errors[code] = f"{type(e).__name__}: {e}"
+                continue
+
+            if df_nav is None or df_nav.empty:
+                errors[code] = "no NAV history"
+            else:
+                histories[code] = df_nav
+
+        sp["rows_out"] = len(histories)
+        sp["errors"] = len(errors)
+
+    return histories, errors
+
+
+# ---------------- METRICS ----------------
+def rebase(panel: pd.DataFrame, base=100.0):
+    """
+    Rebase every column to `base` on the first date all schemes have a NAV.
+    Returns (rebased, start_date).
+    """
+    if panel.empty:
+        return panel, None
+
+    start = panel.apply(pd.Series.first_valid_index).max()
+    window = panel.loc[start:]
+
+    return window / window.iloc[0] * base, start
+
+
+def horizon_returns(panel: pd.DataFrame, horizons=None) -> pd.DataFrame:
+    """
+    Point-to-point return (%) per scheme and horizon, from the as-of NAV
+    `horizon` before the panel's last date. NaN where a scheme is too young.
+    """
+    horizons = horizons or COMPARE_HORIZONS
+
+    if panel.empty:
+        return pd.DataFrame(columns=list(horizons), index=panel.columns)
+
+    end = panel.index.max()
+    targets = pd.DatetimeIndex([end - offset for offset in horizons.values()])
+
+    pos = panel.index.searchsorted(targets, side="right") - 1
+    values = panel.to_numpy(dtype=float)
+
+    past = np.where(pos[:, None] >= 0, values[np.clip(pos, 0, None)], np.nan)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rets = (values[-1] / past - 1) * 100
+
+    return pd.DataFrame(rets.T, index=panel.columns, columns=list(horizons))
+
+
+def max_drawdown(panel: pd.DataFrame) -> pd.Series:
+    """
+    Worst peak-to-trough fall (%) per scheme over the panel.
+    """
+    if panel.empty:
+        return pd.Series(dtype=float)
+
+    values = panel.to_numpy(dtype=float)
+    peaks = np.fmax.accumulate(values, axis=0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dd = np.nanmin(values / peaks - 1, axis=0) * 100
+
+    return pd.Series(dd, index=panel.columns)
+
+
+def daily_returns(panel: pd.DataFrame) -> pd.DataFrame:
+    return panel.pct_change(fill_method=None).iloc[1:]
+
+
+# ---------------- ENGINE ----------------
+def compare_funds(codes, names=None, histories=None) -> Comparison:
+    """
+    Align N scheme histories on one date index and compute rebased growth,
+    per-horizon returns, return correlation and max drawdown for the set.
+
+    `histories` can be passed in when already loaded (e.g. recommender output).
+    """
+    codes = list(dict.fromkeys(str(c).strip() for c in codes))
+    names = {str(k): v for k, v in (names or {}).items()}
+    errors = {}
+
+    with span("compare_funds", rows_in=len(codes)) as sp:
+        if histories is None:
+            histories, errors = fetch_histories(codes)
+        histories = {str(k): v for k, v in histories.items() if str(k) in codes}
+
+        panel = build_nav_panel(histories)
+        codes = [c for c in codes if c in panel.columns]
+        panel = panel[codes] if codes else panel
+
+        rebased, start = rebase(panel)
+
+        cmp = Comparison(
+            codes=codes,
+            names={c: names.get(c, c) for c in codes},
+            rebased=rebased,
+            returns=horizon_returns(panel),
+            correlation=daily_returns(rebased).corr() if len(codes) > 1 else pd.DataFrame(),
+            drawdown=max_drawdown(rebased),
+            start=start,
+            errors=errors,
+        )
+        sp["rows_out"] = len(codes)
+        sp["days"] = len(rebased)
+
+    return cmp
+
+
+def comparison_table(cmp: Comparison) -> pd.DataFrame:
+    """
+    One row per fund: name, horizon returns, max drawdown.
+    """
+    table = cmp.returns.round(2).copy()
+    table["max_drawdown"] = cmp.drawdown.round(2)
+    table.insert(0, "fund_name", [cmp.names.get(c, c) for c in table.index])
+    table.index.name = "scheme_code"
+    return table
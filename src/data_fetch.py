@@ -1,35 +1,55 @@
 import os
+import re
 import time
-import requests
 import pandas as pd
 from io import StringIO
 
-AMFI_URL = "https://www.amfiindia.com/spages/NAVAll.txt"
+from src.fund_family import add_family_columns
+from src.nav_quality import check_snapshot
+from src.outbound import CircuitOpenError, guarded_get, record_failure
+from src.tracing import span
+
+AMFI_URL = os.environ.get("MF_AMFI_URL", "https://www.amfiindia.com/spages/NAVAll.txt")
+
+# "Open Ended Schemes(Debt Scheme - Banking and PSU Fund)" -> SEBI category
+_CATEGORY_RE = re.compile(r"Schemes\s*\((.+)\)\s*$")
+
 CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "amfi_nav_cache.txt")
 
 
 def fetch_amfi_text(retries=3):
     headers = {"User-Agent": "Mozilla/5.0"}
 
-    for _ in range(retries):
-        try:
-            r = requests.get(AMFI_URL, headers=headers, timeout=20)
-            r.raise_for_status()
+    with span("fetch_amfi_text") as sp:
+        for attempt in range(retries):
+            sp["attempts"] = attempt + 1
+            try:
+                r = guarded_get("amfi", AMFI_URL, headers=headers)
 
-            if "<html" in r.text.lower():
-                raise Exception("AMFI returned HTML error page")
+                if "<html" in r.text.lower():
+                    record_failure("amfi")
+                    raise Exception("AMFI returned HTML error page")
 
-            return r.text
-        except Exception:
-            time.sleep(3)
+                sp["bytes"] = len(r.content)
+                return r.text
+            except CircuitOpenError:
+                # AMFI is known to be down: fail fast so callers use the cache
+                sp["circuit"] = "open"
+                raise
+            except Exception:
+                time.sleep(3)
 
-    raise Exception("AMFI not responding after retries")
+        raise Exception("AMFI not responding after retries")
 
 
 def save_cache(text: str):
     os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
-    with open(CACHE_PATH, "w", encoding="utf-8") as f:
+
+    # write + rename so other processes never read a half-written file
+    tmp_path = f"{CACHE_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
         f.write(text)
+    os.replace(tmp_path, CACHE_PATH)
 
 
 def load_cache():
@@ -40,8 +60,27 @@ def load_cache():
 
 
 def parse_amfi_text(text: str):
-    # keep only real data rows
-    valid_lines = [line for line in text.splitlines() if ";" in line]
+    with span("parse_amfi_text", bytes=len(text)) as sp:
+        df = _parse_amfi_lines(text)
+        sp["rows_out"] = len(df)
+    return df
+
+
+def _parse_amfi_lines(text: str):
+    # keep only real data rows, tagging each with the AMC and category headers above it
+    valid_lines = []
+    amc = ""
+    category = ""
+
+    for line in text.splitlines():
+        if ";" in line:
+            valid_lines.append(f"{line};{amc};{category}" if valid_lines else f"{line};AMC;Category")
+        elif line.strip().endswith("Mutual Fund"):
+            amc = line.strip()
+        else:
+            m = _CATEGORY_RE.search(line)
+            if m:
+                category = " ".join(m.group(1).split())
 
     df = pd.read_csv(StringIO("\n".join(valid_lines)), sep=";", header=0)
 
@@ -49,7 +88,9 @@ def parse_amfi_text(text: str):
         "Scheme Code": "scheme_code",
         "Scheme Name": "fund_name",
         "Net Asset Value": "nav",
-        "Date": "date"
+        "Date": "date",
+        "AMC": "amc",
+        "Category": "category",
     })
 
     df["scheme_code"] = df["scheme_code"].astype(str)
@@ -57,25 +98,33 @@ def parse_amfi_text(text: str):
 
     df = df.dropna(subset=["scheme_code", "nav"])
 
-    return df[["scheme_code", "fund_name", "nav", "date"]]
+    # Zero / negative NAVs and repeated codes dropped, stale NAV dates flagged
+    df = check_snapshot(df[["scheme_code", "fund_name", "nav", "date", "amc", "category"]])
+    df = add_family_columns(df, "fund_name")
+
+    return df
 
 
 def fetch_live_nav():
     """
     Fetch NAV from AMFI. If AMFI fails, use cached file.
     """
-    try:
-        text = fetch_amfi_text()
-        save_cache(text)
-        df = parse_amfi_text(text)
-        df.attrs["source"] = "LIVE AMFI"
-        return df
+    with span("fetch_live_nav") as sp:
+        try:
+            text = fetch_amfi_text()
+            save_cache(text)
+            df = parse_amfi_text(text)
+            df.attrs["source"] = "LIVE AMFI"
+            sp["cache"] = "miss"
+
+        except Exception:
+            text = load_cache()
+            if text is None:
+                raise Exception("AMFI failed and cache file not found. Upload NAVAll.txt once.")
 
-    except Exception:
-        text = load_cache()
-        if text is None:
-            raise Exception("AMFI failed and cache file not found. Upload NAVAll.txt once.")
+            df = parse_amfi_text(text)
+            df.attrs["source"] = "LOCAL CACHE"
+            sp["cache"] = "hit"
 
-        df = parse_amfi_text(text)
-        df.attrs["source"] = "LOCAL CACHE"
+        sp["rows_out"] = len(df)
         return df
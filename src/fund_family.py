@@ -0,0 +1,136 @@
+import hashlib
+import re
+
+import pandas as pd
+
+
+# Tokens that start the plan/option tail of an AMFI scheme name
+_VARIANT_TOKENS = (
+    r"direct|regular|retail|institutional|growth|cumulative|idcw|dividend(?!\s+yield)|bonus|"
+    r"daily|weekly|fortnightly|monthly|quarterly|half[\s-]?yearly|annual"
+)
+
+# Tail after a separator: "Fund - Direct Plan - Growth", "Fund- Regular Plan-IDCW"
+_TAIL_AFTER_DASH = re.compile(rf"\s*[-–]\s*\(?\s*(?:{_VARIANT_TOKENS})\b.*$", re.IGNORECASE)
+
+# Tail without a separator: "Fund Direct Growth"
+_TAIL_PLAN = re.compile(r"\s+\(?(?:direct|regular)\b.*$", re.IGNORECASE)
+
+_PLAN = re.compile(r"\b(direct|regular)\b", re.IGNORECASE)
+_LEGACY_PLAN = re.compile(r"\b(retail|institutional)\b", re.IGNORECASE)
+_FREQUENCY = re.compile(r"\b(daily|weekly|fortnightly|monthly|quarterly|half[\s-]?yearly|annual)\b", re.IGNORECASE)
+_OPTION = re.compile(
+    r"\b(growth|cumulative|idcw|dividend(?!\s+yield)|div|income distribution|bonus)\b", re.IGNORECASE
+)
+
+# The last "- <x> Option" segment decides over plan words: "Growth Plan - Bonus Option" is Bonus
+_OPTION_SEGMENT = re.compile(r".*[-–(]\s*([^-–()]+?)\s+option\b", re.IGNORECASE)
+_BONUS = re.compile(r"\bbonus\b", re.IGNORECASE)
+
+# Lower rank = preferred variant
+PLAN_RANK = {"Direct": 0, "Regular": 1, "Retail": 2, "Institutional": 3}
+OPTION_RANK = {"Growth": 0, "Bonus": 2}
+DEFAULT_RANK = 9
+
+FAMILY_COLUMNS = ["amc", "base_scheme", "plan", "option", "family_id", "variant_rank"]
+
+
+# ---------------- NAME PARSING ----------------
+def _family_key(base: pd.Series) -> pd.Series:
+    return (
+        base.str.lower()
+        .str.replace("&", " and ", regex=False)
+        .str.replace(r"[^a-z0-9]+", " ", regex=True)
+        .str.strip()
+    )
+
+
+def _family_hash(key: str) -> str:
+    return hashlib.md5(key.encode("utf-8")).hexdigest()[:12]
+
+
+def parse_scheme_names(names: pd.Series) -> pd.DataFrame:
+    """
+    Split scheme names into base_scheme, plan and option (vectorized).
+    """
+    names = names.astype(str).str.strip()
+
+    base = names.str.replace(_TAIL_AFTER_DASH, "", regex=True)
+    base = base.str.replace(_TAIL_PLAN, "", regex=True).str.strip(" -–")
+    base = base.where(base != "", names)
+
+    plan = names.str.extract(_PLAN, expand=False)
+    plan = plan.fillna(names.str.extract(_LEGACY_PLAN, expand=False)).str.title()
+
+    freq = names.str.extract(_FREQUENCY, expand=False).str.title().str.replace(r"[\s-]+", " ", regex=True)
+    segment = names.str.extract(_OPTION_SEGMENT, expand=False).str.strip()
+    named = segment.str.extract(_OPTION, expand=False)
+    option = named.fillna(names.str.extract(_OPTION, expand=False)).str.lower()
+    option = option.mask(names.str.contains(_BONUS), "bonus")
+    option = option.replace({"dividend": "idcw", "div": "idcw", "income distribution": "idcw", "cumulative": "growth"})
+    option = option.map({"growth": "Growth", "idcw": "IDCW", "bonus": "Bonus"})
+    option = (freq.fillna("") + " " + option.fillna("")).str.strip()
+    option = option.where(option != "", None)
+
+    # Any other "<x> Option" is an option of its own (ranked below Growth)
+    other = segment.notna() & named.isna() & ~names.str.contains(_BONUS)
+    option = option.mask(other, segment.str.title())
+
+    return pd.DataFrame({"base_scheme": base, "plan": plan, "option": option}, index=names.index)
+
+
+# ---------------- FAMILY COLUMNS ----------------
+def add_family_columns(df: pd.DataFrame, name_col: str = "fund_name") -> pd.DataFrame:
+    """
+    Add amc, base_scheme, plan, option, family_id and variant_rank columns.
+    All Direct/Regular x Growth/IDCW variants of a scheme share one family_id.
+    """
+    df = df.copy()
+    parsed = parse_scheme_names(df[name_col])
+
+    for c in ["base_scheme", "plan", "option"]:
+        df[c] = parsed[c]
+
+    # AMC comes from the NAVAll section headers; fall back to the first word
+    if "amc" not in df.columns:
+        df["amc"] = None
+    df["amc"] = df["amc"].fillna(df["base_scheme"].str.split().str[0])
+
+    # Hash only the unique keys (a few thousand) and map back
+    key = _family_key(df["base_scheme"])
+    uniq = key.unique()
+    df["family_id"] = key.map(dict(zip(uniq, (_family_hash(k) for k in uniq))))
+
+    df["variant_rank"] = variant_rank(df, name_col)
+
+    return df
+
+
+def variant_rank(df: pd.DataFrame, name_col: str = "fund_name") -> pd.Series:
+    """
+    Preference order inside a family: Direct before Regular, Growth before IDCW
+    and other options, Bonus last, then the shortest name (skips segregated portfolios and legacy variants).
+    """
+    plan_rank = df["plan"].map(PLAN_RANK).fillna(DEFAULT_RANK)
+    option_rank = df["option"].map(OPTION_RANK).fillna(1)
+    option_rank = option_rank.mask(df["option"].str.endswith("Bonus", na=False), OPTION_RANK["Bonus"])
+    name_len = df[name_col].astype(str).str.len()
+    return plan_rank * 100_000 + option_rank * 1_000 + name_len
+
+
+def pick_family_representatives(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Keep one preferred variant (e.g. Direct Plan Growth) per family_id.
+    """
+    if "variant_rank" not in df.columns or df.empty:
+        return df
+
+    ranked = pd.DataFrame({
+        "family_id": df["family_id"].to_numpy(),
+        "rank": df["variant_rank"].to_numpy(),
+        "pos": range(len(df)),
+    })
+    ranked = ranked.sort_values(["family_id", "rank", "pos"], kind="stable")
+    keep = ranked.drop_duplicates(subset="family_id", keep="first")["pos"].sort_values()
+
+    return df.iloc[keep.to_numpy()].copy()
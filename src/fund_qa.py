@@ -1,37 +1,55 @@
-import re
+import os
+import uuid
+import numpy as np
 import pandas as pd
 import streamlit as st
 
-from src.data_fetch import fetch_live_nav
-from src.charts import plot_returns_chart, plot_compare_returns
+from src.nav_snapshot import get_live_snapshot, get_nav_store
+from src.charts import plot_returns_chart, plot_comparison
+from src.compare import MAX_COMPARE, compare_funds, comparison_table
+from src.fund_family import add_family_columns
+from src.similar import get_similarity_store, similar_funds
+from src.prefetch import get_prefetcher
+from src.chat_parser import parse_query
+from src.nav_store import nav_as_of, return_between
+from src.category_ranks import RANKS_PATH, attach_category_ranks, describe_ranks, get_category_ranks
 
 
 # ================= LOAD FUND PROFILES =================
-def load_fund_profiles(path="data/fund_profiles.csv"):
+# Parsed once per file version and shared by every chat message / session
+_profiles_cache = {}
+
+
+def load_fund_profiles(path="data/fund_profiles.csv", ranks_path=RANKS_PATH):
     try:
+        ranks = get_category_ranks(ranks_path)
+
+        # A new rank table (category re-ranked) re-attaches without re-parsing
+        version = (os.path.getmtime(path), id(ranks))
+        cached = _profiles_cache.get(path)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
         df = pd.read_csv(path)
-        return df if "fund_name" in df.columns else None
+        if "fund_name" not in df.columns:
+            return None
+
+        # Older snapshots were written before family columns existed
+        if "family_id" not in df.columns:
+            df = add_family_columns(df, "fund_name")
+
+        df = attach_category_ranks(df, ranks)
+
+        _profiles_cache[path] = (version, df)
+        return df
     except Exception:
         return None
 
 
 # ================= CLEAN USER QUERY =================
 def clean_query(text: str) -> str:
-    text = text.lower()
-
-    remove_words = [
-        "nav", "return", "returns", "risk",
-        "details", "tell", "me", "about",
-        "show", "what", "is", "fund",
-        "direct", "regular", "plan", "option",
-        "compare", "vs", "with", "of"
-    ]
-
-    for w in remove_words:
-        text = re.sub(rf"\b{w}\b", "", text)
-
-    text = re.sub(r"[^a-z0-9\s]", "", text)
-    return re.sub(r"\s+", " ", text).strip()
+    # Fund-name words only: intent words, stop words, horizons and amounts removed
+    return parse_query(text).keyword
 
 
 # ================= WORD MATCH =================
@@ -41,9 +59,10 @@ def _word_match(df, keyword):
 
     words = keyword.split()
     mask = pd.Series(True, index=df.index)
+    names = df["fund_name"].str.lower()
 
     for w in words:
-        mask &= df["fund_name"].str.lower().str.contains(w, na=False)
+        mask &= names.str.contains(w, na=False, regex=False)
 
     return df[mask]
 
@@ -60,8 +79,24 @@ def find_best_match(df, keyword):
     return match
 
 
+def match_query(df, pq):
+    """
+    find_best_match for a parsed message: first with horizon-like tokens and
+    "top" kept ("dsp 10y g sec", "hdfc top 100"), then without them.
+    """
+    if pq.name_keyword != pq.keyword:
+        match = find_best_match(df, pq.name_keyword)
+        if match is not None:
+            return match
+    return find_best_match(df, pq.keyword)
+
+
 # ================= SELECT BEST SCHEME =================
 def select_best_scheme(df):
+    # Indexed lookup on the precomputed variant rank (Direct Growth first)
+    if "variant_rank" in df.columns and df["variant_rank"].notna().any():
+        return df.loc[df["variant_rank"].idxmin()]
+
     priority = ["direct plan growth", "direct growth", "growth"]
 
     for p in priority:
@@ -74,24 +109,280 @@ def select_best_scheme(df):
 
 # ================= LIVE NAV FALLBACK =================
 def fetch_from_live_amfi(keyword):
-    df = fetch_live_nav()
+    df = get_live_snapshot()
     match = _word_match(df, keyword)
     return None if match.empty else match.iloc[0]
 
 
+# ================= SESSION REFERENCES =================
+# Sessions keep scheme codes only; rows are looked up in the shared profiles
+# (or the live snapshot) when a message needs them.
+_ref_index = {}
+
+
+def fund_ref(fund_row):
+    """
+    What session state keeps for a fund: its scheme code (name if it has none).
+    """
+    if fund_row is None:
+        return None
+    code = fund_row.get("scheme_code")
+    if code is None or pd.isna(code):
+        return str(fund_row.get("fund_name"))
+    return str(code).strip()
+
+
+def _ref_positions(source, df):
+    # ref -> row position, built once per profiles / snapshot frame
+    cached = _ref_index.get(source)
+    if cached is None or cached[0] is not df:
+        positions = {}
+        if "fund_name" in df.columns:
+            positions.update(zip(df["fund_name"].astype(str), range(len(df))))
+        if "scheme_code" in df.columns:
+            positions.update(zip(df["scheme_code"].astype(str).str.strip(), range(len(df))))
+        cached = _ref_index[source] = (df, positions)
+    return cached[1]
+
+
+def resolve_fund(ref, df_profiles):
+    """
+    Row for a session's fund reference: the profile, else the live NAV row.
+    """
+    if ref is None:
+        return None
+
+    if df_profiles is not None and not df_profiles.empty:
+        pos = _ref_positions("profiles", df_profiles).get(ref)
+        if pos is not None:
+            return df_profiles.iloc[pos]
+
+    try:
+        live = get_live_snapshot()
+    except Exception:
+        return None
+    pos = _ref_positions("live", live).get(ref)
+    return None if pos is None else live.iloc[pos]
+
+
+# ================= PREFETCH =================
+def _session_id():
+    return st.session_state.setdefault("chat_session_id", uuid.uuid4().hex)
+
+
+def prefetch_fund(fund_row):
+    """
+    Warm the resolved fund's history and metrics (and the live NAV snapshot)
+    in the background for the next question in this session.
+    """
+    session_id = _session_id()
+
+    store = get_nav_store()
+    if store.snapshot is None:
+        store.refresh_async()
+
+    code = fund_row.get("scheme_code") if fund_row is not None else None
+    if code is None or pd.isna(code):
+        get_prefetcher().touch(session_id)
+        return
+
+    get_prefetcher().prefetch(session_id, code)
+
+
+def with_metrics(fund_row):
+    """
+    fund_row plus history-based returns, volatility and drawdown
+    (from the prefetch cache when the previous message warmed it).
+    """
+    code = fund_row.get("scheme_code")
+    if code is None or pd.isna(code):
+        return fund_row
+
+    metrics = get_prefetcher().metrics(code)
+    if not metrics:
+        return fund_row
+
+    extra = {k: round(v, 2) for k, v in metrics.items() if v is not None and not pd.isna(v)}
+    return pd.concat([fund_row.drop(list(extra), errors="ignore"), pd.Series(extra)])
+
+
+# ================= SIMILAR FUNDS =================
+def is_similar_query(q: str) -> bool:
+    return parse_query(q).has("similar")
+
+
+def answer_similar(fund_row, df_profiles, k=5):
+    """
+    Nearest funds by returns, volatility, drawdown and fund type.
+    """
+    snap = get_nav_store().snapshot
+    key = snap.digest if snap is not None else "profiles"
+
+    code = fund_row.get("scheme_code")
+    similar = similar_funds(code, k=k, df_profiles=df_profiles, key=key) if code is not None else None
+
+    if similar is None:
+        return (
+            f"⏳ Similar-fund index does not cover **{fund_row['fund_name']}** yet. "
+            f"It is being built in the background, please try again shortly."
+        )
+
+    if similar.empty:
+        return f"❌ No similar funds found for **{fund_row['fund_name']}**."
+
+    def pct(v):
+        return "N/A" if pd.isna(v) else f"{v:.1f}%"
+
+    lines = [
+        f"• **{row['fund_name']}** ({row.get('fund_type', 'N/A')}) — "
+        f"1Y: {pct(row['ret_1y'])} | 3Y: {pct(row['ret_3y'])} | Vol: {pct(row['volatility'])}"
+        for _, row in similar.iterrows()
+    ]
+
+    return f"🧭 **Funds similar to {fund_row['fund_name']}**\n\n" + "\n".join(lines)
+
+
+# ================= CATEGORY RANK =================
+def answer_category_rank(fund_row, df_profiles):
+    """
+    Where the fund stands within its category, from the precomputed rank table.
+    """
+    lines = describe_ranks(fund_row)
+
+    if not lines:
+        # Ranks come from the similar-fund feature build; make sure it is running
+        snap = get_nav_store().snapshot
+        get_similarity_store().ensure(
+            snap.digest if snap is not None else "profiles", df_profiles, focus=fund_row.get("scheme_code")
+        )
+        return (
+            f"⏳ Category ranks for **{fund_row['fund_name']}** are not computed yet. "
+            f"They are being built in the background, please try again shortly."
+        )
+
+    category = fund_row.get("rank_category", fund_row.get("fund_type", "its category"))
+    return f"🏷️ **{fund_row['fund_name']}** within **{category}**\n\n" + "\n".join(lines)
+
+
+# ================= N-FUND COMPARISON =================
+# Funds listed in the "Comparison Ready" reply
+COMPARE_LIST_SHOWN = 5
+
+
+def _compare_selected(codes, df_profiles):
+    funds = [f for f in (resolve_fund(c, df_profiles) for c in codes) if f is not None]
+    names = {fund_ref(f): f["fund_name"] for f in funds}
+    cmp = compare_funds(list(names), names=names)
+
+    if len(cmp.codes) < 2:
+        return "⚠️ NAV history is not available for enough of the selected funds to compare."
+
+    plot_comparison(cmp.rebased, cmp.names, title=f"Growth of 100 since {cmp.start:%d-%b-%Y}")
+
+    table = comparison_table(cmp)
+    st.dataframe(table.rename(columns={"fund_name": "Fund", "max_drawdown": "Max Drawdown (%)"}))
+
+    def pct(v):
+        return "N/A" if pd.isna(v) else f"{v}%"
+
+    lines = [
+        f"🔹 {row['fund_name']}\n"
+        f"• 1Y: {pct(row['1Y'])} | 3Y: {pct(row['3Y'])} | 5Y: {pct(row['5Y'])} | Max DD: {pct(row['max_drawdown'])}"
+        for _, row in table.iterrows()
+    ]
+
+    corr = cmp.correlation.to_numpy()
+    avg_corr = corr[np.triu_indices_from(corr, k=1)].mean()
+    lines.append(f"🔗 Average pairwise correlation of daily returns: **{avg_corr:.2f}**")
+
+    if cmp.errors:
+        lines.append(f"⚠️ Skipped {len(cmp.errors)} fund(s) without NAV history.")
+
+    return "📊 **Return Comparison**\n\n" + "\n\n".join(lines)
+
+
+# ================= POINT-IN-TIME NAV =================
+def answer_nav_as_of(fund_row, date):
+    code = fund_row.get("scheme_code")
+    if code is None or pd.isna(code):
+        return f"❌ NAV history is not available for **{fund_row['fund_name']}**."
+
+    try:
+        hit = nav_as_of(code, date)
+    except Exception:
+        return "⚠️ NAV history service is unavailable right now, please try again shortly."
+
+    if hit is None:
+        return f"❌ No NAV for **{fund_row['fund_name']}** on or before {date:%d-%b-%Y}."
+
+    note = "" if hit["exact"] else f" (nearest earlier trading day to {date:%d-%b-%Y})"
+    return (
+        f"💰 **NAV of {fund_row['fund_name']}** on **{hit['date']:%d-%b-%Y}**{note} "
+        f"was **{hit['nav']:.4f}**"
+    )
+
+
+def answer_return_between(fund_row, start, end):
+    code = fund_row.get("scheme_code")
+    if code is None or pd.isna(code):
+        return f"❌ NAV history is not available for **{fund_row['fund_name']}**."
+
+    try:
+        r = return_between(code, start, end)
+    except Exception:
+        return "⚠️ NAV history service is unavailable right now, please try again shortly."
+
+    if r is None:
+        return f"❌ No NAV history for **{fund_row['fund_name']}** covering that period."
+
+    a, b = r["start"], r["end"]
+    lines = [
+        f"• {a['date']:%d-%b-%Y}: NAV {a['nav']:.4f}",
+        f"• {b['date']:%d-%b-%Y}: NAV {b['nav']:.4f}",
+        f"• Return: **{r['return_pct']:.2f}%**",
+    ]
+    if r["cagr_pct"] is not None:
+        lines.append(f"• Annualised: **{r['cagr_pct']:.2f}%** over {r['years']:.1f} years")
+
+    return f"📈 **Returns – {fund_row['fund_name']}**\n\n" + "\n".join(lines)
+
+
+def answer_dated(pq, fund_row):
+    """
+    "nav of X on <date>" / "returns of X between <d1> and <d2>" / "returns since <date>".
+    None when the message carries no dates for a nav / returns question.
+    """
+    if not pq.dates or not (pq.has("nav") or pq.has("returns")):
+        return None
+
+    if len(pq.dates) >= 2:
+        return answer_return_between(fund_row, pq.dates[0], pq.dates[1])
+
+    if pq.has("returns"):
+        return answer_return_between(fund_row, pq.dates[0], pd.Timestamp.today().normalize())
+
+    return answer_nav_as_of(fund_row, pq.dates[0])
+
+
 # ================= MAIN QA FUNCTION =================
 def answer_fund_question(question: str, df_profiles: pd.DataFrame):
 
-    # -------- SESSION MEMORY --------
-    st.session_state.setdefault("base_fund", None)
-    st.session_state.setdefault("compare_fund", None)
+    # -------- SESSION MEMORY (scheme codes only) --------
+    st.session_state.setdefault("base_code", None)
+    st.session_state.setdefault("compare_codes", [])
 
-    q = question.lower()
-    keyword = clean_query(question)
+    pq = parse_query(question)
+    keyword = pq.keyword
+
+    # -------- CLEAR COMPARISON --------
+    if pq.has("clear"):
+        st.session_state["base_code"] = None
+        st.session_state["compare_codes"] = []
+        return "🧹 Comparison list cleared."
 
     # -------- FIND FUND --------
     fund_row = None
-    match = find_best_match(df_profiles, keyword)
+    match = match_query(df_profiles, pq)
 
     if isinstance(match, pd.DataFrame):
         fund_row = select_best_scheme(match)
@@ -100,53 +391,63 @@ def answer_fund_question(question: str, df_profiles: pd.DataFrame):
 
     # Use memory only if user didn’t type fund
     if fund_row is None and not keyword:
-        fund_row = st.session_state["base_fund"]
+        fund_row = resolve_fund(st.session_state["base_code"], df_profiles)
 
     if fund_row is None and keyword:
         fund_row = fetch_from_live_amfi(keyword)
 
+    # Likely follow-ups (returns / risk / compare) need this fund's history
+    prefetch_fund(fund_row)
+
+    # ==================================================
+    # 🔹 COMPARE RETURNS / NAV (all selected funds)
+    # ==================================================
+    if pq.has("compare") and not keyword and (pq.has("returns") or pq.has("nav")):
+        codes = st.session_state["compare_codes"]
+
+        if len(codes) < 2:
+            return "⚠️ Please select at least two funds first using `compare with <fund>`."
+
+        return _compare_selected(codes, df_profiles)
+
     # ==================================================
     # 🔹 CAPTURE COMPARISON FUND
     # ==================================================
-    if "compare" in q and fund_row is not None:
-        if st.session_state["base_fund"] is None:
-            st.session_state["base_fund"] = fund_row
+    if pq.has("compare") and keyword and fund_row is not None:
+        codes = st.session_state["compare_codes"]
+
+        # A fund picked earlier (nav / returns) becomes the base
+        if not codes and st.session_state["base_code"] is not None:
+            codes.append(st.session_state["base_code"])
+
+        if fund_ref(fund_row) not in codes:
+            if len(codes) >= MAX_COMPARE:
+                return f"⚠️ You can compare up to {MAX_COMPARE} funds. Type `clear compare` to start over."
+            codes.append(fund_ref(fund_row))
+
+        st.session_state["base_code"] = codes[0]
+
+        if len(codes) == 1:
             return (
                 f"✅ Base fund selected:\n\n"
                 f"• **{fund_row['fund_name']}**\n\n"
                 f"👉 Now type: `compare with <fund name>`"
             )
 
-        st.session_state["compare_fund"] = fund_row
-        return (
-            f"🔄 **Comparison Ready**\n\n"
-            f"🔹 Fund 1: {st.session_state['base_fund']['fund_name']}\n"
-            f"🔹 Fund 2: {fund_row['fund_name']}\n\n"
-            f"👉 Ask: **compare nav | compare returns**"
+        # Long lists show the newest few (the reply is kept in the chat history)
+        shown = codes[-COMPARE_LIST_SHOWN:]
+        first = len(codes) - len(shown) + 1
+        funds = [resolve_fund(c, df_profiles) for c in shown]
+        selected = "\n".join(
+            f"🔹 Fund {i}: {f['fund_name'] if f is not None else c}" for i, (c, f) in enumerate(zip(shown, funds), first)
         )
-
-    # ==================================================
-    # 🔹 COMPARE RETURNS
-    # ==================================================
-    if "compare returns" in q:
-        f1 = st.session_state["base_fund"]
-        f2 = st.session_state["compare_fund"]
-
-        if f1 is None or f2 is None:
-            return "⚠️ Please select two funds first using `compare with <fund>`."
-
-        plot_compare_returns(f1, f2)
-
+        if first > 1:
+            selected = f"… {first - 1} earlier fund(s)\n" + selected
         return (
-            f"📊 **Return Comparison**\n\n"
-            f"🔹 {f1['fund_name']}\n"
-            f"• 1Y: {f1.get('returns_1y', 'N/A')}%\n"
-            f"• 3Y: {f1.get('returns_3y', 'N/A')}%\n"
-            f"• 5Y: {f1.get('returns_5y', 'N/A')}%\n\n"
-            f"🔹 {f2['fund_name']}\n"
-            f"• 1Y: {f2.get('returns_1y', 'N/A')}%\n"
-            f"• 3Y: {f2.get('returns_3y', 'N/A')}%\n"
-            f"• 5Y: {f2.get('returns_5y', 'N/A')}%"
+            f"🔄 **Comparison Ready ({len(codes)} funds)**\n\n"
+            f"{selected}\n\n"
+            f"👉 Ask: **compare nav | compare returns**, add more with `compare with <fund>`, "
+            f"or `clear compare`"
         )
 
     # ==================================================
@@ -155,12 +456,26 @@ def answer_fund_question(question: str, df_profiles: pd.DataFrame):
     if fund_row is None:
         return "❌ I couldn't find that fund. Please type a clearer fund name."
 
-    if "nav" in q:
-        st.session_state["base_fund"] = fund_row
+    if pq.has("similar"):
+        st.session_state["base_code"] = fund_ref(fund_row)
+        return answer_similar(fund_row, df_profiles)
+
+    dated = answer_dated(pq, fund_row)
+    if dated is not None:
+        st.session_state["base_code"] = fund_ref(fund_row)
+        return dated
+
+    if pq.has("rank"):
+        st.session_state["base_code"] = fund_ref(fund_row)
+        return answer_category_rank(fund_row, df_profiles)
+
+    if pq.has("nav"):
+        st.session_state["base_code"] = fund_ref(fund_row)
         return f"💰 **NAV of {fund_row['fund_name']}** is **{fund_row.get('nav', 'N/A')}**"
 
-    if ("return" in q or "returns" in q) and "compare" not in q:
-        st.session_state["base_fund"] = fund_row
+    if pq.has("returns") and not pq.has("compare"):
+        st.session_state["base_code"] = fund_ref(fund_row)
+        fund_row = with_metrics(fund_row)
 
         # 🔹 Chart inside clean container
         with st.container():
@@ -176,11 +491,14 @@ def answer_fund_question(question: str, df_profiles: pd.DataFrame):
             f"• 5Y: {fund_row.get('returns_5y', 'N/A')}%"
         )
 
-    if "risk" in q:
-        st.session_state["base_fund"] = fund_row
+    if pq.has("risk"):
+        st.session_state["base_code"] = fund_ref(fund_row)
+        fund_row = with_metrics(fund_row)
         return (
             f"⚠️ **Risk Profile**\n\n"
             f"• Fund Type: {fund_row.get('fund_type', 'Unknown')}\n"
+            f"• Volatility (1Y, annualised): {fund_row.get('volatility', 'N/A')}%\n"
+            f"• Max Drawdown: {fund_row.get('max_drawdown', 'N/A')}%\n"
             f"• Equity → High volatility\n"
             f"• Debt → Lower volatility\n"
             f"• Hybrid → Moderate risk"
@@ -189,11 +507,11 @@ def answer_fund_question(question: str, df_profiles: pd.DataFrame):
     # ==================================================
     # 🔹 SUMMARY
     # ==================================================
-    st.session_state["base_fund"] = fund_row
+    st.session_state["base_code"] = fund_ref(fund_row)
     return (
         f"📌 **Fund Details**\n\n"
         f"• Name: {fund_row['fund_name']}\n"
         f"• Type: {fund_row.get('fund_type', 'N/A')}\n"
         f"• NAV: {fund_row.get('nav', 'N/A')}\n\n"
-        f"👉 Ask: **nav | returns | risk | compare with <fund>**"
+        f"👉 Ask: **nav | returns | risk | similar | category rank | compare with <fund>**"
     )
@@ -1,28 +1,103 @@
-import requests
+import os
+import threading
+import time
 import pandas as pd
+from collections import OrderedDict
 from io import StringIO
 from datetime import datetime, timedelta
 
+from src.nav_quality import check_history
+from src.outbound import guarded_get
+from src.tracing import span
+
+MFAPI_URL = os.environ.get("MF_MFAPI_URL", "https://api.mfapi.in/mf")
+
+# Histories only change once a day; keep recent ones in memory and fall
+# back to them while mfapi is failing or its circuit is open.
+HISTORY_TTL_S = 6 * 3600
+HISTORY_CACHE_SIZE = 512
+
+_history_cache = OrderedDict()
+_history_lock = threading.Lock()
+
+
+def _cache_get(scheme_code):
+    with _history_lock:
+        hit = _history_cache.get(scheme_code)
+        if hit is not None:
+            _history_cache.move_to_end(scheme_code)
+        return hit
+
+
+def _cache_put(scheme_code, df):
+    with _history_lock:
+        _history_cache[scheme_code] = (df, time.time())
+        _history_cache.move_to_end(scheme_code)
+        while len(_history_cache) > HISTORY_CACHE_SIZE:
+            _history_cache.popitem(last=False)
+
+
+def cached_history(scheme_code):
+    """
+    Fresh in-memory history for a scheme, or None. Never fetches.
+    """
+    cached = _cache_get(str(scheme_code).strip())
+    if cached is None or time.time() - cached[1] >= HISTORY_TTL_S:
+        return None
+    return cached[0]
+
+
+def clear_history_cache():
+    with _history_lock:
+        _history_cache.clear()
+
 
 def fetch_scheme_history(scheme_code: str) -> pd.DataFrame:
     """
     Fetch NAV history of a single scheme from AMFI endpoint.
+    Served from memory when fresh; stale copies are used if mfapi fails.
     """
-    url = f"https://api.mfapi.in/mf/{scheme_code}"
-    r = requests.get(url, timeout=20)
-    r.raise_for_status()
+    scheme_code = str(scheme_code).strip()
+
+    with span("fetch_scheme_history", scheme_code=scheme_code) as sp:
+        cached = _cache_get(scheme_code)
+        if cached is not None and time.time() - cached[1] < HISTORY_TTL_S:
+            sp["cache"] = "hit"
+            return cached[0]
+
+        sp["cache"] = "miss"
+        url = f"{MFAPI_URL}/{scheme_code}"
+
+        try:
+            r = guarded_get("mfapi", url)
+        except Exception as e:
+            if cached is None:
+                raise
+            sp["cache"] = "stale"
+            sp["error"] = f"{type(e).__name__}: {e}"
+            return cached[0]
+
+        sp["bytes"] = len(r.content)
+
+        data = r.json()
 
-    data = r.json()
+        if "data" not in data:
+            sp["rows_out"] = 0
+            return pd.DataFrame()
 
-    if "data" not in data:
-        return pd.DataFrame()
+        df = pd.DataFrame(data["data"])
+        df["date"] = pd.to_datetime(df["date"], format="%d-%m-%Y", errors="coerce")
+        df["nav"] = pd.to_numeric(df["nav"], errors="coerce")
 
-    df = pd.DataFrame(data["data"])
-    df["date"] = pd.to_datetime(df["date"], format="%d-%m-%Y", errors="coerce")
-    df["nav"] = pd.to_numeric(df["nav"], errors="coerce")
+        df = df.dropna(subset=["date", "nav"])
 
-    df = df.dropna(subset=["date", "nav"]).sort_values("date")
-    return df
+        # Sorted by date; zero NAVs, duplicate dates, spikes and pre-split rows removed
+        df = check_history(df, scheme_code)
+        sp["quarantined"] = int(len(data["data"]) - len(df))
+        sp["rows_out"] = len(df)
+
+        _cache_put(scheme_code, df)
+        return df
 
 
 def calc_return(df_nav, years=None, months=None):
@@ -43,27 +118,35 @@ def calc_return(df_nav, years=None, months=None):
     else:
         return None
 
-    # Find closest past NAV
-    past_df = df_nav[df_nav["date"] <= target_date]
-    if past_df.empty:
+    # Closest past NAV: binary search on the sorted dates
+    dates = df_nav["date"].to_numpy()
+    pos = dates.searchsorted(pd.Timestamp(target_date).to_datetime64(), side="right") - 1
+    if pos < 0:
         return None
 
-    past_nav = past_df.iloc[-1]["nav"]
+    past_nav = df_nav["nav"].iat[pos]
 
     return ((latest_nav - past_nav) / past_nav) * 100
 
 
+def compute_returns(df_nav: pd.DataFrame) -> dict:
+    """
+    Returns dict: 6m,1y,2y,3y,5y,10y for an already fetched history.
+    """
+    with span("compute_returns", rows_in=len(df_nav)):
+        return {
+            "returns_6m": calc_return(df_nav, months=6),
+            "returns_1y": calc_return(df_nav, years=1),
+            "returns_2y": calc_return(df_nav, years=2),
+            "returns_3y": calc_return(df_nav, years=3),
+            "returns_5y": calc_return(df_nav, years=5),
+            "returns_10y": calc_return(df_nav, years=10),
+        }
+
+
 def compute_all_returns(scheme_code: str) -> dict:
     """
     Returns dict: 6m,1y,2y,3y,5y,10y
     """
     df_nav = fetch_scheme_history(scheme_code)
-
-    return {
-        "returns_6m": calc_return(df_nav, months=6),
-        "returns_1y": calc_return(df_nav, years=1),
-        "returns_2y": calc_return(df_nav, years=2),
-        "returns_3y": calc_return(df_nav, years=3),
-        "returns_5y": calc_return(df_nav, years=5),
-        "returns_10y": calc_return(df_nav, years=10),
-    }
+    return compute_returns(df_nav)
@@ -0,0 +1,239 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+from src.agents import risk_profile_agent
+from src.master_cache import get_master
+from src.nav_snapshot import get_nav_store
+from src.recommender import (
+    RISK_FUND_TYPES,
+    select_candidates,
+    fetch_candidate_returns,
+    score_candidates,
+    explain_funds,
+)
+from src.sip import HORIZON_YEARS
+from src.tracing import span
+
+FUND_TYPES = ["Equity", "Debt", "Gold", "Hybrid", "Other"]
+INVEST_TYPES = ["sip", "lumpsum"]
+
+# Boards are scored for this amount; served rows are rescaled to the user's.
+# XIRR and the ranking do not depend on the amount as long as
+# amount_filter_agent stays a pass-through.
+REFERENCE_AMOUNT = 1000.0
+AMOUNT_COLS = ["invested", "units", "terminal_value"]
+
+MAX_SNAPSHOTS = 4
+
+# Uploads whose boards are rebuilt after every new NAV snapshot
+MAX_WATCHED = 4
+
+
+@dataclass
+class Leaderboards:
+    key: str
+    name_col: str = "scheme_name"
+    built_at: float = 0.0
+    boards: dict = field(default_factory=dict)
+    messages: dict = field(default_factory=dict)
+    fetch_errors: dict = field(default_factory=dict)
+    n_candidates: dict = field(default_factory=dict)
+
+
+# ---------------- PRECOMPUTE ----------------
+def build_leaderboards(df_master: pd.DataFrame, key: str) -> Leaderboards:
+    """
+    Rank every (fund_type, user_type, invest_type, horizon) combination once.
+
+    Candidates depend only on fund_type, so each fund type costs one round
+    of history fetches; the risk buckets just gate which boards exist.
+    """
+    lb = Leaderboards(key=key)
+
+    with span("build_leaderboards", rows_in=len(df_master)) as sp:
+        for fund_type in FUND_TYPES:
+            candidates, name_col, message = select_candidates(
+                df_master, fund_type, "sip", REFERENCE_AMOUNT
+            )
+            lb.name_col = name_col
+
+            if message:
+                for combo in _combos(fund_type):
+                    lb.messages[combo] = message
+                continue
+
+            enriched, histories, errors = fetch_candidate_returns(candidates)
+            lb.fetch_errors[fund_type] = errors
+            lb.n_candidates[fund_type] = len(enriched)
+
+            for invest_type in INVEST_TYPES:
+                for horizon in HORIZON_YEARS:
+                    ranked = score_candidates(
+                        enriched, histories, invest_type, REFERENCE_AMOUNT, horizon
+                    ).reset_index(drop=True)
+
+                    for user_type, allowed in RISK_FUND_TYPES.items():
+                        combo = (fund_type, user_type, invest_type, horizon)
+                        if fund_type in allowed:
+                            lb.boards[combo] = ranked
+                        else:
+                            lb.messages[combo] = "⚠️ No funds found after risk filtering. Try different risk/horizon."
+
+        lb.built_at = time.time()
+        sp["rows_out"] = len(lb.boards)
+
+    return lb
+
+
+def _combos(fund_type):
+    for user_type in RISK_FUND_TYPES:
+        for invest_type in INVEST_TYPES:
+            for horizon in HORIZON_YEARS:
+                yield (fund_type, user_type, invest_type, horizon)
+
+
+# ---------------- SERVE ----------------
+def lookup_board(lb, risk_appetite, horizon, invest_type, amount, fund_type):
+    """
+    The precomputed ranked pool for these inputs, rescaled to `amount`,
+    with the same context shape as recommender.rank_candidates.
+    Returns None when this combination was not built (caller scores live).
+    """
+    if lb is None:
+        return None
+
+    user_type = risk_profile_agent(risk_appetite, horizon)
+    fund_type = str(fund_type).strip().title()
+    invest_type = str(invest_type).lower()
+    combo = (fund_type, user_type, invest_type, horizon)
+
+    if combo not in lb.boards and combo not in lb.messages:
+        return None
+
+    context = {"name_col": lb.name_col, "user_type": user_type, "message": lb.messages.get(combo),
+               "fetch_errors": lb.fetch_errors.get(fund_type, []),
+               "n_candidates": lb.n_candidates.get(fund_type, 0)}
+
+    if context["message"]:
+        return pd.DataFrame(), context
+
+    pool = lb.boards[combo].copy()
+    pool[AMOUNT_COLS] = pool[AMOUNT_COLS] * (float(amount) / REFERENCE_AMOUNT)
+    return pool, context
+
+
+def serve_from_leaderboards(lb, risk_appetite, horizon, invest_type, amount, fund_type, top_n=5):
+    """
+    O(top_n) read of a precomputed board.
+    Returns None for inputs that were not precomputed (caller scores live).
+    """
+    found = lookup_board(lb, risk_appetite, horizon, invest_type, amount, fund_type)
+    if found is None:
+        return None
+
+    pool, context = found
+    if context["message"]:
+        return pd.DataFrame(), [context["message"]]
+
+    top_funds = pool.head(top_n)
+    explanations = explain_funds(
+        top_funds, context["name_col"], invest_type, amount, context["user_type"],
+        context["fetch_errors"], context["n_candidates"]
+    )
+
+    return top_funds, explanations
+
+
+# ---------------- STORE ----------------
+class LeaderboardStore:
+    """
+    Process-wide leaderboards keyed by (NAV snapshot, upload).
+    Builds run in the background, one per key at a time: for every watched
+    upload right after each new NAV snapshot, so a request only reads them.
+    """
+
+    def __init__(self, max_snapshots=MAX_SNAPSHOTS):
+        self.max_snapshots = max_snapshots
+        self._ready = OrderedDict()
+        self._building = {}
+        self._watched = OrderedDict()     # upload digest -> df_hist
+        self._listening = False
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="leaderboards")
+
+    def get(self, key):
+        with self._lock:
+            lb = self._ready.get(key)
+            if lb is not None:
+                self._ready.move_to_end(key)
+            return lb
+
+    def ensure(self, key, df_master):
+        """
+        Return the boards for `key` if ready, else start building them and return None.
+        """
+        lb = self.get(key)
+        if lb is None:
+            self._submit(key, lambda: df_master)
+        return lb
+
+    def watch(self, hist_digest, df_hist):
+        """
+        Build boards for this upload against the current NAV snapshot and
+        again after every new one.
+        """
+        with self._lock:
+            self._watched[hist_digest] = df_hist
+            self._watched.move_to_end(hist_digest)
+            while len(self._watched) > MAX_WATCHED:
+                self._watched.popitem(last=False)
+            listen, self._listening = not self._listening, True
+
+        nav_store = get_nav_store()
+        if listen:
+            nav_store.add_listener(self._on_snapshot)
+
+        snapshot = nav_store.snapshot
+        if snapshot is not None:
+            self._build_for(hist_digest, df_hist, snapshot)
+
+    def _on_snapshot(self, snapshot):
+        with self._lock:
+            watched = list(self._watched.items())
+        for hist_digest, df_hist in watched:
+            self._build_for(hist_digest, df_hist, snapshot)
+
+    def _build_for(self, hist_digest, df_hist, snapshot):
+        # The master table is merged on the build thread, not the caller's
+        key = f"{snapshot.digest}:{hist_digest}"
+        if self.get(key) is None:
+            self._submit(key, lambda: get_master(hist_digest, df_hist, snapshot))
+
+    def _submit(self, key, master):
+        with self._lock:
+            if key not in self._building and key not in self._ready:
+                self._building[key] = self._executor.submit(self._build, key, master)
+
+    def _build(self, key, master):
+        try:
+            lb = build_leaderboards(master(), key)
+            with self._lock:
+                self._ready[key] = lb
+                while len(self._ready) > self.max_snapshots:
+                    self._ready.popitem(last=False)
+            return lb
+        finally:
+            with self._lock:
+                self._building.pop(key, None)
+
+
+_store = LeaderboardStore()
+
+
+def get_leaderboard_store() -> LeaderboardStore:
+    return _store
@@ -0,0 +1,177 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+from src.preprocess import preprocess_hist_data, merge_hist_live
+from src.recommender import classify_fund_types
+from src.tracing import span
+
+# Uploads (keyed by content sha1), master tables (upload digest, NAV snapshot
+# digest) and ranked pools, shared by every session and evicted least recently
+# used past this combined size. Cached frames are shared: copy before mutating
+MASTER_CACHE_MB = float(os.environ.get("MF_MASTER_CACHE_MB", "512"))
+
+# Hard cap on entries, whatever their size
+MAX_ENTRIES = 32
+
+_cache = OrderedDict()      # key -> (df, bytes)
+_inflight = {}              # key -> Future
+_lock = threading.Lock()
+
+stats = {"hits": 0, "misses": 0, "evictions": 0, "bytes": 0}
+
+
+# ---------------- BUILD ----------------
+def upload_digest(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()[:12]
+
+
+def read_upload(name: str, data: bytes) -> pd.DataFrame:
+    """
+    Uploaded CSV or AMFI TXT -> standardized historical frame.
+    """
+    if name.lower().endswith(".csv"):
+        df_hist = pd.read_csv(BytesIO(data))
+    else:
+        df_hist = pd.read_csv(BytesIO(data), sep=";", engine="python", on_bad_lines="skip")
+    return preprocess_hist_data(df_hist)
+
+
+def build_master(df_hist: pd.DataFrame, df_live: pd.DataFrame) -> pd.DataFrame:
+    """
+    Merge with the live snapshot and classify fund types.
+    """
+    with span("merge_hist_live", rows_in=len(df_hist) + len(df_live)) as sp:
+        df_master = merge_hist_live(df_hist, df_live)
+        sp["rows_out"] = len(df_master)
+
+    if "scheme_name" not in df_master.columns:
+        if "fund_name" not in df_master.columns:
+            raise Exception("❌ scheme_name column missing")
+        df_master["scheme_name"] = df_master["fund_name"]
+
+    with span("classify_fund_type", rows_in=len(df_master)):
+        df_master["fund_type"] = classify_fund_types(df_master["scheme_name"]).astype(str).str.title()
+
+    return df_master
+
+
+# ---------------- CACHE ----------------
+def _frame_bytes(obj) -> int:
+    # frames, arrays, and tuples of them (ranked pools); anything else is small
+    if isinstance(obj, tuple):
+        return sum(_frame_bytes(o) for o in obj)
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True).sum())
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    return 0
+
+
+def _evict():
+    # The newest entry stays even when it alone is over the limit
+    limit = MASTER_CACHE_MB * 1024 * 1024
+    while len(_cache) > 1 and (stats["bytes"] > limit or len(_cache) > MAX_ENTRIES):
+        _, (_, size) = _cache.popitem(last=False)
+        stats["bytes"] -= size
+        stats["evictions"] += 1
+
+
+def _cached(key, build):
+    """
+    Return the cached frame for `key`, building it once; concurrent callers
+    for the same key wait on the first build.
+    """
+    with _lock:
+        hit = _cache.get(key)
+        if hit is not None:
+            _cache.move_to_end(key)
+            stats["hits"] += 1
+            return hit[0], True
+
+        fut = _inflight.get(key)
+        owner = fut is None
+        if owner:
+            fut = _inflight[key] = Future()
+        stats["misses" if owner else "hits"] += 1
+
+    if not owner:
+        return fut.result(), True
+
+    try:
+        df = build()
+    except BaseException as e:
+        fut.set_exception(e)
+        raise
+    finally:
+        with _lock:
+            _inflight.pop(key, None)
+
+    size = _frame_bytes(df)
+    with _lock:
+        _cache[key] = (df, size)
+        stats["bytes"] += size
+        _evict()
+    fut.set_result(df)
+    return df, False
+
+
+def get_upload(name: str, data: bytes, digest: str = None):
+    """
+    (df_hist, digest) for the uploaded bytes, parsed once per content.
+    """
+    digest = digest or upload_digest(data)
+    with span("read_upload", bytes=len(data)) as sp:
+        df_hist, hit = _cached(("upload", digest), lambda: read_upload(name, data))
+        sp["cache"] = "hit" if hit else "miss"
+        sp["rows_out"] = len(df_hist)
+    return df_hist, digest
+
+
+def get_master(digest: str, df_hist: pd.DataFrame, snapshot) -> pd.DataFrame:
+    """
+    Merged, classified master table for (upload, NAV snapshot).
+    """
+    with span("master_table") as sp:
+        df_master, hit = _cached(("master", digest, snapshot.digest), lambda: build_master(df_hist, snapshot.df))
+        sp["cache"] = "hit" if hit else "miss"
+        sp["rows_out"] = len(df_master)
+    return df_master
+
+
+def get_pool(key: str, build=None):
+    """
+    (pool, features, context) of a ranked candidate pool, shared by reruns and
+    sessions (which keep only the key). build() makes it on a miss; without
+    one a miss returns None.
+    """
+    if build is None:
+        with _lock:
+            hit = _cache.get(("pool", key))
+            if hit is None:
+                return None
+            _cache.move_to_end(("pool", key))
+            stats["hits"] += 1
+            return hit[0]
+
+    with span("ranked_pool") as sp:
+        entry, hit = _cached(("pool", key), build)
+        sp["cache"] = "hit" if hit else "miss"
+    return entry
+
+
+def cache_snapshot() -> dict:
+    with _lock:
+        return {**stats, "entries": len(_cache), "mb": round(stats["bytes"] / 1024 / 1024, 1)}
+
+
+def clear_master_cache():
+    with _lock:
+        _cache.clear()
+        stats["bytes"] = 0
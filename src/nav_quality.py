@@ -0,0 +1,252 @@
+import json
+import logging
+import os
+import threading
+from collections import Counter, deque
+
+import numpy as np
+import pandas as pd
+
+# A one-day move beyond this factor (up or down) is not a market move
+MAX_DAILY_JUMP = 1.5
+
+# A jump followed by one back to within this factor of the prior NAV is a spike
+SPIKE_REVERT = 1.1
+
+# A level shift counts as a split only once it has held this many rows...
+SPLIT_MIN_DAYS = 5
+
+# ...and only when the jump is within SPLIT_TOLERANCE of a whole split factor
+SPLIT_FACTORS = np.array([2, 3, 4, 5, 10], dtype=float)
+SPLIT_TOLERANCE = 0.03
+
+# Snapshot NAVs dated this many days before the publish date are stale
+STALE_NAV_DAYS = 7
+
+# Decisions kept in memory for the debug panel
+LOG_SIZE = 1000
+
+# Also append every quarantined row here as JSON lines
+QUALITY_LOG_PATH = os.environ.get("MF_QUALITY_LOG")
+
+logger = logging.getLogger("mf.quality")
+
+_log = deque(maxlen=LOG_SIZE)
+_counts = Counter()
+_lock = threading.Lock()
+
+
+# ---------------- DECISIONS ----------------
+def _record(source, codes, dates, navs, reasons, rows=True):
+    """
+    Count and log quarantine / flag decisions (arrays aligned, one per row).
+    rows=False only counts them (flags repeat on every parse of the file).
+    """
+    if len(reasons) == 0:
+        return
+
+    counts = Counter(reasons)
+    with _lock:
+        _counts.update({f"{source}:{r}": n for r, n in counts.items()})
+    logger.info("%s: %s", source, dict(counts))
+
+    if not rows:
+        return
+
+    records = [
+        {"source": source, "scheme_code": c, "date": str(d)[:10], "nav": None if pd.isna(n) else float(n), "reason": r}
+        for c, d, n, r in zip(codes, dates, navs, reasons)
+    ]
+    with _lock:
+        _log.extend(records)
+
+    if QUALITY_LOG_PATH:
+        os.makedirs(os.path.dirname(os.path.abspath(QUALITY_LOG_PATH)), exist_ok=True)
+        with open(QUALITY_LOG_PATH, "a", encoding="utf-8") as f:
+            f.writelines(json.dumps(r) + "\n" for r in records)
+
+
+def quality_report(last=20) -> dict:
+    with _lock:
+        return {"counts": dict(_counts), "recent": list(_log)[-last:]}
+
+
+def clear_quality_log():
+    with _lock:
+        _log.clear()
+        _counts.clear()
+
+
+# ---------------- SNAPSHOT ----------------
+_MONTHS = {m: f"{i:02d}" for i, m in enumerate(
+    ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"], 1
+)}
+
+
+def _amfi_dates(strings) -> np.ndarray:
+    """
+    "03-Feb-2026" strings -> datetime64[ns] (NaT when malformed), via ISO
+    strings, which pandas parses on its fast path.
+    """
+    iso = []
+    for s in strings:
+        s = str(s).strip()
+        month = _MONTHS.get(s[3:6].title())
+        iso.append(f"{s[7:11]}-{month}-{s[0:2]}" if month and len(s) == 11 else "")
+    return pd.to_datetime(pd.Series(iso, dtype=object), format="%Y-%m-%d", errors="coerce").to_numpy()
+
+
+def check_snapshot(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    One row per scheme from NAVAll.txt: drop non-positive NAVs and repeated
+    scheme codes, flag NAVs dated well before the publish date.
+    Adds nav_flag ("" when clean) and nav_date.
+    """
+    codes = df["scheme_code"].to_numpy()
+    navs = df["nav"].to_numpy(dtype=float)
+
+    # A file carries a few hundred distinct date strings: parse each once
+    date_ids, date_strings = pd.factorize(df["date"])
+    parsed = _amfi_dates(date_strings)
+    dates = np.where(date_ids >= 0, parsed[date_ids], np.datetime64("NaT"))
+
+    reasons = np.full(len(df), "", dtype=object)
+    reasons[~(navs > 0)] = "non_positive"
+    reasons[(reasons == "") & df["scheme_code"].duplicated(keep="last").to_numpy()] = "duplicate"
+    drop = reasons != ""
+
+    # Publish date = the most common NAV date in the file
+    valid = ~np.isnat(dates)
+    flags = np.full(len(df), "", dtype=object)
+    if valid.any():
+        values, counts = np.unique(dates[valid], return_counts=True)
+        cutoff = values[counts.argmax()] - np.timedelta64(STALE_NAV_DAYS, "D")
+        flags[valid & (dates < cutoff)] = "stale"
+    flags[~valid] = "bad_date"
+    flags[drop] = ""
+
+    _record("snapshot", codes[drop], dates[drop], navs[drop], reasons[drop])
+    flagged = flags != ""
+    _record("snapshot", codes[flagged], dates[flagged], navs[flagged], flags[flagged], rows=False)
+
+    out = df.assign(nav_date=dates, nav_flag=flags)
+    return out[~drop] if drop.any() else out
+
+
+# ---------------- HISTORIES ----------------
+# Quarantined rows never reach the caller; a split drops the rows before it
+_REASONS = np.array(["", "non_positive", "duplicate", "spike", "split"], dtype=object)
+_NON_POSITIVE, _DUPLICATE, _SPIKE, _SPLIT = 1, 2, 3, 4
+
+
+def _jumps(groups, navs):
+    # ratio to the previous row of the same scheme (1.0 at each scheme's first row)
+    same = np.r_[False, groups[1:] == groups[:-1]]
+    ratio = np.ones(len(navs))
+    ratio[1:] = navs[1:] / navs[:-1]
+    ratio[~same] = 1.0
+    return same, ratio, (ratio > MAX_DAILY_JUMP) | (ratio < 1 / MAX_DAILY_JUMP)
+
+
+def _is_split(ratio) -> bool:
+    factor = max(ratio, 1 / ratio)
+    return bool((np.abs(factor / SPLIT_FACTORS - 1) < SPLIT_TOLERANCE).any())
+
+
+def _history_reasons(groups, dates, navs):
+    """
+    Reason code per row (0 = keep) for arrays sorted by (group, date).
+    """
+    reasons = np.zeros(len(navs), dtype=np.int8)
+    reasons[~(navs > 0)] = _NON_POSITIVE
+
+    # Same scheme and date twice: the later row wins
+    dup = np.r_[(groups[1:] == groups[:-1]) & (dates[1:] == dates[:-1]), False]
+    reasons[(reasons == 0) & dup] = _DUPLICATE
+
+    keep = np.flatnonzero(reasons == 0)
+    k_groups, k_navs = groups[keep], navs[keep]
+    _, ratio, jump = _jumps(k_groups, k_navs)
+    if not jump.any():
+        return reasons
+
+    # Jumps are rare: walk them one by one
+    at = np.flatnonzero(jump)
+    starts = np.searchsorted(k_groups, k_groups[at], side="left")
+    ends = np.searchsorted(k_groups, k_groups[at], side="right")
+    last_split = {}
+    covered = -1
+    for i, start, end in zip(at, starts, ends):
+        # The jump back out of a bad print is not a jump of its own
+        if i <= covered:
+            continue
+
+        # Rows until the NAV is back near the level before the jump
+        window = k_navs[i:min(i + SPLIT_MIN_DAYS, end)] / k_navs[i - 1]
+        back = np.flatnonzero((window < SPIKE_REVERT) & (window > 1 / SPIKE_REVERT))
+
+        if back.size:
+            # Bad print: only the glitched rows go
+            covered = i + back[0]
+            reasons[keep[i:covered]] = _SPIKE
+        elif len(window) < SPLIT_MIN_DAYS:
+            # Too recent to tell a split from a bad print
+            covered = end
+            reasons[keep[i:covered]] = _SPIKE
+        elif _is_split(ratio[i]):
+            last_split[k_groups[i]] = (start, i)
+
+    # Split: everything before the scheme's last one goes
+    for start, i in last_split.values():
+        reasons[keep[start:i]] = _SPLIT
+
+    return reasons
+
+
+def check_history_panel(df: pd.DataFrame, source="history") -> pd.DataFrame:
+    """
+    Long panel (scheme_code, date, nav; any number of schemes), sorted by
+    scheme and date on return, with bad rows removed.
+    """
+    if df.empty:
+        return df
+
+    groups, _ = pd.factorize(df["scheme_code"], sort=True)
+    dates = df["date"].to_numpy()
+    order = np.lexsort((dates, groups))
+
+    df = df.iloc[order]
+    groups, dates = groups[order], dates[order]
+    navs = df["nav"].to_numpy(dtype=float)
+
+    reasons = _history_reasons(groups, dates, navs)
+    drop = reasons != 0
+    if not drop.any():
+        return df
+
+    codes = df["scheme_code"].to_numpy()
+    _record(source, codes[drop], dates[drop], navs[drop], _REASONS[reasons[drop]])
+    return df[~drop]
+
+
+def check_history(df_nav: pd.DataFrame, scheme_code, source="history") -> pd.DataFrame:
+    """
+    One scheme's (date, nav) history, sorted by date, with bad rows removed.
+    """
+    if df_nav.empty:
+        return df_nav
+
+    dates = df_nav["date"].to_numpy()
+    order = np.argsort(dates, kind="stable")
+    dates = dates[order]
+    navs = df_nav["nav"].to_numpy(dtype=float)[order]
+
+    reasons = _history_reasons(np.zeros(len(order), dtype=np.int64), dates, navs)
+    keep = order[reasons == 0]
+    drop = reasons != 0
+
+    if drop.any():
+        code = str(scheme_code)
+        _record(source, np.full(int(drop.sum()), code, dtype=object), dates[drop], navs[drop], _REASONS[reasons[drop]])
+
+    return df_nav.iloc[keep].reset_index(drop=True)
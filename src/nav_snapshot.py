@@ -0,0 +1,223 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+
+from src import data_fetch
+from src.data_fetch import fetch_amfi_text, parse_amfi_text, save_cache, load_cache
+from src.tracing import span
+
+logger = logging.getLogger("mf.snapshot")
+
+IST = timezone(timedelta(hours=5, minutes=30))
+
+# AMFI publishes the day's NAVs in the evening and late corrections overnight
+REFRESH_TIMES_IST = ["08:00", "21:30", "23:30"]
+
+# Minimum gap between network attempts while AMFI keeps failing
+RETRY_AFTER_S = 300
+
+
+@dataclass
+class NavSnapshot:
+    df: pd.DataFrame
+    fetched_at: float
+    source: str
+    digest: str
+
+
+# ---------------- SCHEDULE ----------------
+def _schedule(day):
+    for hhmm in REFRESH_TIMES_IST:
+        h, m = map(int, hhmm.split(":"))
+        yield datetime(day.year, day.month, day.day, h, m, tzinfo=IST)
+
+
+def last_publish_time(now: float = None) -> float:
+    """
+    Most recent scheduled refresh time (epoch seconds) at or before `now`.
+    """
+    now_dt = datetime.fromtimestamp(now if now is not None else time.time(), IST)
+    today = now_dt.date()
+
+    for day in (today, today - timedelta(days=1)):
+        past = [t for t in _schedule(day) if t <= now_dt]
+        if past:
+            return max(past).timestamp()
+
+    return (now_dt - timedelta(days=1)).timestamp()
+
+
+def next_publish_time(now: float = None) -> float:
+    """
+    Next scheduled refresh time (epoch seconds) after `now`.
+    """
+    now_dt = datetime.fromtimestamp(now if now is not None else time.time(), IST)
+    today = now_dt.date()
+
+    for day in (today, today + timedelta(days=1)):
+        upcoming = [t for t in _schedule(day) if t > now_dt]
+        if upcoming:
+            return min(upcoming).timestamp()
+
+    return (now_dt + timedelta(days=1)).timestamp()
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8", errors="ignore")).hexdigest()[:12]
+
+
+# ---------------- STORE ----------------
+class NavSnapshotStore:
+    """
+    Stale-while-revalidate holder for the parsed AMFI NAV snapshot.
+
+    get() always returns the last good snapshot immediately and schedules a
+    background refresh once a publish time has passed. Concurrent refresh
+    requests collapse into one in-flight fetch; the new snapshot replaces the
+    old one in a single reference swap.
+    """
+
+    def __init__(self):
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="nav-refresh")
+        self._inflight = None
+        self._scheduler = None
+        self._last_attempt = 0.0
+        self._listeners = []
+        self.last_error = None
+
+    # ---------- reads ----------
+    @property
+    def snapshot(self):
+        return self._snapshot
+
+    def is_stale(self, now: float = None) -> bool:
+        snap = self._snapshot
+        return snap is None or snap.fetched_at < last_publish_time(now)
+
+    def get(self) -> NavSnapshot:
+        snap = self._snapshot
+
+        if snap is None:
+            # Nothing to serve yet: the first callers share one load
+            snap = self.refresh_async().result()
+
+        if self.is_stale() and time.time() - self._last_attempt > RETRY_AFTER_S:
+            self.refresh_async()
+
+        return snap
+
+    def add_listener(self, fn):
+        """
+        Call fn(snapshot) after each swap to a snapshot with new contents.
+        Runs on the refresh thread: keep it short (hand work to a pool).
+        """
+        with self._lock:
+            if fn not in self._listeners:
+                self._listeners.append(fn)
+
+    # ---------- refresh ----------
+    def refresh_async(self):
+        """
+        Start a refresh unless one is already running; return its future.
+        """
+        with self._lock:
+            if self._inflight is None or self._inflight.done():
+                self._inflight = self._executor.submit(self._refresh)
+            return self._inflight
+
+    def _refresh(self) -> NavSnapshot:
+        with span("nav_snapshot_refresh") as sp:
+            current = self._snapshot
+
+            path = data_fetch.CACHE_PATH
+            disk_mtime = os.path.getmtime(path) if os.path.exists(path) else 0
+
+            # Cold start: serve the disk copy first, get() revalidates it
+            # Warm: another process may already have fetched this publish window
+            if disk_mtime and (
+                current is None
+                or (disk_mtime >= last_publish_time() and disk_mtime > current.fetched_at)
+            ):
+                sp["cache"] = "hit"
+                return self._swap(load_cache(), "LOCAL CACHE", disk_mtime)
+
+            sp["cache"] = "miss"
+            self._last_attempt = time.time()
+            try:
+                text = fetch_amfi_text()
+            except Exception as e:
+                self.last_error = str(e)
+                sp["error"] = self.last_error
+                if current is not None:
+                    return current
+                raise
+
+            save_cache(text)
+            self.last_error = None
+            return self._swap(text, "LIVE AMFI", time.time())
+
+    def _swap(self, text, source, fetched_at) -> NavSnapshot:
+        df = parse_amfi_text(text)
+        df.attrs["source"] = source
+
+        snap = NavSnapshot(df=df, fetched_at=fetched_at, source=source, digest=_digest(text))
+        old, self._snapshot = self._snapshot, snap
+
+        if old is None or old.digest != snap.digest:
+            for fn in list(self._listeners):
+                try:
+                    fn(snap)
+                except Exception:
+                    logger.exception("snapshot listener failed")
+        return snap
+
+    # ---------- schedule ----------
+    def start_scheduler(self):
+        """
+        Daemon thread that refreshes right after each AMFI publish time.
+        """
+        with self._lock:
+            if self._scheduler is not None:
+                return
+            self._scheduler = threading.Thread(target=self._run_schedule, name="nav-scheduler", daemon=True)
+            self._scheduler.start()
+
+    def _run_schedule(self):
+        while True:
+            time.sleep(max(1.0, next_publish_time() - time.time() + 60))
+            try:
+                self.refresh_async().result()
+            except Exception as e:
+                self.last_error = str(e)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_nav_store() -> NavSnapshotStore:
+    """
+    Process-wide store shared by every Streamlit session.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = NavSnapshotStore()
+            _store.start_scheduler()
+    return _store
+
+
+def get_live_snapshot() -> pd.DataFrame:
+    """
+    Latest NAV snapshot as a DataFrame (served from memory, refreshed in background).
+    """
+    return get_nav_store().get().df
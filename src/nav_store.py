@@ -0,0 +1,480 @@
+import atexit
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from src.historical_nav import fetch_scheme_history, HISTORY_TTL_S
+from src.tracing import span
+
+try:
+    import fcntl
+except ImportError:  # Windows: one process per store directory
+    fcntl = None
+
+# manifest.json (generation, segments, retired ones), manifest.lock (flock'd
+# around manifest updates), readers/<pid>-<id>.json (generation each process
+# has mapped) and the seg-<time>-<pid>-<id>/ segment directories
+STORE_DIR = os.environ.get("MF_NAV_STORE", "data/nav_store")
+
+# Schemes buffered in memory before they are written out as a new segment
+FLUSH_EVERY = 64
+
+# More segments than this are merged into one on the next flush
+MAX_SEGMENTS = 16
+
+# A query past the last stored NAV by more than this refetches the scheme
+# (weekends + a holiday are normal gaps)
+STALE_AFTER_DAYS = 4
+
+# Readers look for a newer manifest at most this often
+RELOAD_EVERY_S = 5
+
+# A reader that has not checked in for this long no longer holds old segments back
+READER_TTL_S = 600
+
+_EPOCH = np.datetime64("1970-01-01", "D")
+
+
+def to_day(value) -> int:
+    """
+    Date-like -> int days since epoch (the store's date unit).
+    """
+    return int((np.datetime64(pd.Timestamp(value).date(), "D") - _EPOCH).astype(int))
+
+
+def from_day(day) -> pd.Timestamp:
+    return pd.Timestamp(_EPOCH + np.timedelta64(int(day), "D"))
+
+
+def _history_arrays(df_nav: pd.DataFrame):
+    if df_nav is None or df_nav.empty:
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float64)
+
+    df = df_nav.dropna(subset=["date", "nav"]).sort_values("date")
+    days = (df["date"].to_numpy().astype("datetime64[D]") - _EPOCH).astype(np.int32)
+
+    # One NAV per day; the later row wins
+    keep = np.r_[days[1:] != days[:-1], True]
+    return days[keep], df["nav"].to_numpy(dtype=np.float64)[keep]
+
+
+def _write_json(path, payload):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(payload, f)
+    os.replace(tmp, path)
+
+
+def _remove_segment(path):
+    shutil.rmtree(path, ignore_errors=True)
+
+
+# codes.json (offset order), offsets.npy (int64, len(codes) + 1), dates.npy
+# (int32 days since epoch, sorted per scheme) and navs.npy, memory-mapped on
+# open so "NAV of X on <date>" is one binary search
+class _Segment:
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+
+        with open(os.path.join(path, "codes.json")) as f:
+            self.codes = json.load(f)
+
+        self.offsets = np.load(os.path.join(path, "offsets.npy"))
+        self.dates = np.load(os.path.join(path, "dates.npy"), mmap_mode="r")
+        self.navs = np.load(os.path.join(path, "navs.npy"), mmap_mode="r")
+
+    @staticmethod
+    def write(path, series: dict):
+        """
+        series: scheme_code -> (days, navs). Written to a temp dir, then renamed.
+        """
+        tmp = path + ".tmp"
+        os.makedirs(tmp, exist_ok=True)
+
+        codes = list(series)
+        lengths = [len(series[c][0]) for c in codes]
+        offsets = np.zeros(len(codes) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+
+        dates = np.concatenate([series[c][0] for c in codes]) if codes else np.empty(0, np.int32)
+        navs = np.concatenate([series[c][1] for c in codes]) if codes else np.empty(0, np.float64)
+
+        np.save(os.path.join(tmp, "offsets.npy"), offsets)
+        np.save(os.path.join(tmp, "dates.npy"), dates.astype(np.int32))
+        np.save(os.path.join(tmp, "navs.npy"), navs.astype(np.float64))
+        with open(os.path.join(tmp, "codes.json"), "w") as f:
+            json.dump(codes, f)
+
+        os.replace(tmp, path)
+        return _Segment(path)
+
+
+class NavHistoryStore:
+    """
+    scheme_code -> sorted (dates, navs), served from memory-mapped segments
+    plus an in-memory overlay of schemes fetched since the last flush.
+    Later segments shadow earlier ones for the same scheme.
+    """
+
+    def __init__(self, root=STORE_DIR, flush_every=FLUSH_EVERY):
+        self.root = root
+        self.flush_every = flush_every
+        self._lock = threading.RLock()
+
+        self._segments = []
+        self._where = {}          # scheme_code -> (segment index, start, end)
+        self._pending = {}        # scheme_code -> (days, navs)
+        self._refreshed = {}      # scheme_code -> time.time() of the last fetch
+
+        self._generation = 0
+        self._manifest_mtime = None
+        self._checked = 0.0
+        self._reader_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._checked_in = (None, 0.0)
+
+        self.stats = {"lookups": 0, "fetches": 0, "flushes": 0, "reloads": 0}
+
+        self._open()
+
+    # ---------- disk ----------
+    @property
+    def _manifest_path(self):
+        return os.path.join(self.root, "manifest.json")
+
+    @property
+    def _reader_path(self):
+        return os.path.join(self.root, "readers", self._reader_id + ".json")
+
+    @contextmanager
+    def _locked(self):
+        """
+        Exclusive lock on the store directory across processes, for manifest
+        read-modify-write.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, "manifest.lock"), "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read_manifest(self):
+        try:
+            mtime = os.path.getmtime(self._manifest_path)
+            with open(self._manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None, {}
+        return mtime, manifest
+
+    def _open(self):
+        mtime, manifest = self._read_manifest()
+        self._load(mtime, manifest)
+
+    def _load(self, mtime, manifest):
+        # Segments already mapped are reused; dropped ones are let go
+        opened = {s.name: s for s in self._segments}
+        self._segments, self._where = [], {}
+
+        for name in manifest.get("segments", []):
+            seg = opened.get(name)
+            if seg is None:
+                path = os.path.join(self.root, name)
+                if not os.path.isdir(path):
+                    continue
+                seg = _Segment(path)
+            self._add_segment(seg)
+
+        self._generation = manifest.get("generation", 0)
+        self._manifest_mtime = mtime
+        self._checked = time.time()
+        self._check_in()
+
+    def _maybe_reload(self):
+        # Pick up segments other processes wrote and let go of compacted ones
+        now = time.time()
+        if now - self._checked < RELOAD_EVERY_S:
+            return
+        self._checked = now
+
+        try:
+            mtime = os.path.getmtime(self._manifest_path)
+        except OSError:
+            return
+
+        if mtime != self._manifest_mtime:
+            self._load(*self._read_manifest())
+            self.stats["reloads"] += 1
+        else:
+            self._check_in()
+
+    def _check_in(self, force=False):
+        # Tell writers which generation this process has mapped (the mtime is its heartbeat)
+        if not self._segments:
+            return
+        generation, at = self._checked_in
+        now = time.time()
+        if not force and generation == self._generation and now - at < READER_TTL_S / 4:
+            return
+
+        os.makedirs(os.path.dirname(self._reader_path), exist_ok=True)
+        _write_json(self._reader_path, {"generation": self._generation, "pid": os.getpid()})
+        self._checked_in = (self._generation, now)
+
+    def _oldest_reader(self):
+        """
+        Lowest generation any live reader has mapped (None when there are none).
+        """
+        root = os.path.join(self.root, "readers")
+        oldest = None
+        for fname in os.listdir(root) if os.path.isdir(root) else []:
+            path = os.path.join(root, fname)
+            try:
+                if time.time() - os.path.getmtime(path) > READER_TTL_S:
+                    os.remove(path)
+                    continue
+                with open(path) as f:
+                    generation = json.load(f)["generation"]
+            except (OSError, ValueError, KeyError):
+                continue
+            oldest = generation if oldest is None else min(oldest, generation)
+        return oldest
+
+    def _sweep(self, retired):
+        # Delete retired segments once no live reader is behind the generation that retired them
+        oldest = self._oldest_reader()
+        keep = []
+        for r in retired:
+            if oldest is not None and oldest < r["generation"]:
+                keep.append(r)
+            else:
+                _remove_segment(os.path.join(self.root, r["name"]))
+        return keep
+
+    def _commit(self, retired):
+        """
+        Publish the current segment list as the next generation (lock held).
+        """
+        self._generation += 1
+        self._check_in(force=True)
+        _write_json(self._manifest_path, {
+            "generation": self._generation,
+            "segments": [s.name for s in self._segments],
+            "retired": self._sweep(retired),
+        })
+        self._manifest_mtime = os.path.getmtime(self._manifest_path)
+
+    def _add_segment(self, seg):
+        i = len(self._segments)
+        self._segments.append(seg)
+        for j, code in enumerate(seg.codes):
+            self._where[code] = (i, int(seg.offsets[j]), int(seg.offsets[j + 1]))
+
+    def _new_segment_path(self):
+        # Unique across processes sharing the directory
+        return os.path.join(self.root, f"seg-{int(time.time())}-{os.getpid()}-{uuid.uuid4().hex[:8]}")
+
+    def flush(self):
+        """
+        Write buffered schemes out as a new segment.
+        """
+        with self._lock:
+            if not self._pending:
+                return
+
+            with self._locked():
+                # Segments other processes added since we last looked stay in
+                mtime, manifest = self._read_manifest()
+                self._load(mtime, manifest)
+
+                self._add_segment(_Segment.write(self._new_segment_path(), self._pending))
+                self._pending = {}
+                self._commit(manifest.get("retired", []))
+
+            self.stats["flushes"] += 1
+
+            if len(self._segments) > MAX_SEGMENTS:
+                self.compact()
+
+    def compact(self):
+        """
+        Merge every segment (latest copy of each scheme) into one. The old
+        segments are deleted once every reader has reopened the manifest.
+        """
+        with self._lock:
+            self.flush()
+
+            with self._locked():
+                mtime, manifest = self._read_manifest()
+                self._load(mtime, manifest)
+                if len(self._segments) <= 1:
+                    return
+
+                merged = {code: tuple(np.array(a) for a in self.series(code)) for code in self._where}
+                old = [s.name for s in self._segments]
+
+                seg = _Segment.write(self._new_segment_path(), merged)
+                self._segments, self._where = [], {}
+                self._add_segment(seg)
+
+                retired = manifest.get("retired", []) + [
+                    {"name": name, "generation": self._generation + 1} for name in old
+                ]
+                self._commit(retired)
+
+    def close(self):
+        """
+        Flush and stop holding segments back from deletion.
+        """
+        self.flush()
+        try:
+            os.remove(self._reader_path)
+        except OSError:
+            pass
+
+    # ---------- series ----------
+    def add(self, scheme_code, df_nav: pd.DataFrame):
+        code = str(scheme_code).strip()
+        days, navs = _history_arrays(df_nav)
+
+        with self._lock:
+            self._pending[code] = (days, navs)
+            self._refreshed[code] = time.time()
+            flush = len(self._pending) >= self.flush_every
+
+        if flush:
+            self.flush()
+
+    def series(self, scheme_code):
+        """
+        (days, navs) for a scheme, or None if it is not stored.
+        """
+        code = str(scheme_code).strip()
+        with self._lock:
+            self._maybe_reload()
+            hit = self._pending.get(code)
+            if hit is not None:
+                return hit
+
+            where = self._where.get(code)
+            if where is None:
+                return None
+            i, start, end = where
+            seg = self._segments[i]
+            return seg.dates[start:end], seg.navs[start:end]
+
+    def _fetch(self, code):
+        self.stats["fetches"] += 1
+        self.add(code, fetch_scheme_history(code))
+        return self.series(code)
+
+    def _series_for(self, code, day):
+        s = self.series(code)
+
+        if s is None or len(s[0]) == 0:
+            if s is None or time.time() - self._refreshed.get(code, 0) > HISTORY_TTL_S:
+                s = self._fetch(code)
+            return s
+
+        # Asked for a date after what we have: refetch unless we just did
+        if day > int(s[0][-1]) + STALE_AFTER_DAYS and time.time() - self._refreshed.get(code, 0) > HISTORY_TTL_S:
+            try:
+                s = self._fetch(code)
+            except Exception:
+                pass
+        return s
+
+    # ---------- lookups ----------
+    def nav_as_of(self, scheme_code, date):
+        """
+        NAV on `date`, or on the nearest earlier trading day.
+        None if the scheme has no NAV on or before that date.
+        """
+        code = str(scheme_code).strip()
+        day = to_day(date)
+
+        with span("nav_as_of", scheme_code=code) as sp:
+            self.stats["lookups"] += 1
+            s = self._series_for(code, day)
+            if s is None or len(s[0]) == 0:
+                sp["found"] = False
+                return None
+
+            days, navs = s
+            pos = int(np.searchsorted(days, day, side="right")) - 1
+            sp["found"] = pos >= 0
+            if pos < 0:
+                return None
+
+            found = int(days[pos])
+            return {
+                "scheme_code": code,
+                "requested": from_day(day),
+                "date": from_day(found),
+                "nav": float(navs[pos]),
+                "exact": found == day,
+                "first_date": from_day(days[0]),
+                "last_date": from_day(days[-1]),
+            }
+
+    def return_between(self, scheme_code, start, end):
+        """
+        Absolute and annualised return (%) between two dates, each resolved
+        to its nearest earlier trading day.
+        """
+        start, end = sorted([pd.Timestamp(start), pd.Timestamp(end)])
+
+        a = self.nav_as_of(scheme_code, start)
+        b = self.nav_as_of(scheme_code, end)
+        if a is None or b is None or a["nav"] <= 0:
+            return None
+
+        years = (b["date"] - a["date"]).days / 365.25
+        absolute = (b["nav"] / a["nav"] - 1) * 100
+        cagr = ((b["nav"] / a["nav"]) ** (1 / years) - 1) * 100 if years >= 1 else None
+
+        return {"start": a, "end": b, "return_pct": absolute, "cagr_pct": cagr, "years": years}
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                **self.stats,
+                "segments": len(self._segments),
+                "generation": self._generation,
+                "stored": len(self._where),
+                "pending": len(self._pending),
+            }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_nav_history_store() -> NavHistoryStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = NavHistoryStore()
+            # schemes fetched since the last flush survive a restart
+            atexit.register(_store.close)
+        return _store
+
+
+def nav_as_of(scheme_code, date):
+    return get_nav_history_store().nav_as_of(scheme_code, date)
+
+
+def return_between(scheme_code, start, end):
+    return get_nav_history_store().return_between(scheme_code, start, end)
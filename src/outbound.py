@@ -0,0 +1,197 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger("mf.outbound")
+
+# Per-source limits shared by every session in the process
+SOURCE_LIMITS = {
+    "amfi": {"rate": 0.2, "burst": 2, "timeout": 20, "failure_threshold": 3, "reset_after": 120},
+    "mfapi": {"rate": 10.0, "burst": 20, "timeout": 10, "failure_threshold": 5, "reset_after": 30},
+}
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a source whose circuit is open."""
+
+
+class RateLimitedError(Exception):
+    """Raised when no token frees up within the caller's wait budget."""
+
+
+# ---------------- TOKEN BUCKET ----------------
+class TokenBucket:
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, max_wait: float = 30.0) -> float:
+        """
+        Take one token, sleeping until one is available.
+        Returns the seconds waited.
+        """
+        deadline = time.monotonic() + max_wait
+        waited = 0.0
+
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                sleep_for = (1 - self._tokens) / self.rate
+
+            if time.monotonic() + sleep_for > deadline:
+                raise RateLimitedError(f"no token within {max_wait}s")
+
+            time.sleep(sleep_for)
+            waited += sleep_for
+
+
+# ---------------- CIRCUIT BREAKER ----------------
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures;
+    open -> half_open after `reset_after` seconds (one trial call);
+    half_open -> closed on success, back to open on failure.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_after: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+        self.metrics = {
+            "calls": 0,
+            "failures": 0,
+            "rejected": 0,
+            "opened": 0,
+            "half_opened": 0,
+            "closed": 0,
+        }
+
+    def _transition(self, state):
+        if state == self.state:
+            return
+        logger.info("circuit %s: %s -> %s", self.name, self.state, state)
+        self.state = state
+        self.metrics[{OPEN: "opened", HALF_OPEN: "half_opened", CLOSED: "closed"}[state]] += 1
+
+    def allow(self):
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.reset_after:
+                self._transition(HALF_OPEN)
+
+            if self.state == OPEN or (self.state == HALF_OPEN and self._trial_running):
+                self.metrics["rejected"] += 1
+                raise CircuitOpenError(f"{self.name} circuit is {self.state}")
+
+            if self.state == HALF_OPEN:
+                self._trial_running = True
+
+            self.metrics["calls"] += 1
+
+    def cancel(self):
+        with self._lock:
+            self._trial_running = False
+            self.metrics["calls"] -= 1
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._trial_running = False
+            self._transition(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self.metrics["failures"] += 1
+            self._trial_running = False
+
+            if self.state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._transition(OPEN)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self._failures, **self.metrics}
+
+
+# ---------------- SHARED CALL LAYER ----------------
+_limiters = {name: TokenBucket(cfg["rate"], cfg["burst"]) for name, cfg in SOURCE_LIMITS.items()}
+_breakers = {
+    name: CircuitBreaker(name, cfg["failure_threshold"], cfg["reset_after"])
+    for name, cfg in SOURCE_LIMITS.items()
+}
+
+
+def guarded_get(source: str, url: str, **kwargs) -> "requests.Response":
+    """
+    requests.get through the source's rate limiter and circuit breaker.
+    Raises CircuitOpenError without touching the network while the source is unhealthy.
+    """
+    breaker = _breakers[source]
+    breaker.allow()
+
+    try:
+        _limiters[source].acquire()
+    except RateLimitedError:
+        # Not the source's fault: give back the slot without counting a failure
+        breaker.cancel()
+        raise
+
+    kwargs.setdefault("timeout", SOURCE_LIMITS[source]["timeout"])
+
+    import requests
+
+    try:
+        r = requests.get(url, **kwargs)
+    except (requests.Timeout, requests.ConnectionError):
+        breaker.record_failure()
+        raise
+    except Exception:
+        # Never reached the source (bad URL, bad arguments)
+        breaker.cancel()
+        raise
+
+    # A 4xx (unknown scheme code, bad request) is the caller's problem, and the
+    # source answered it: only 5xx counts against the circuit
+    if r.status_code >= 500:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+
+    r.raise_for_status()
+    return r
+
+
+def is_open(source: str) -> bool:
+    return _breakers[source].state == OPEN
+
+
+def record_failure(source: str):
+    """
+    For failures detected after a 200 (e.g. AMFI's HTML error page).
+    """
+    _breakers[source].record_failure()
+
+
+def source_metrics() -> dict:
+    return {name: breaker.snapshot() for name, breaker in _breakers.items()}
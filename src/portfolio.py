@@ -0,0 +1,196 @@
+import numpy as np
+import pandas as pd
+
+from src.compare import fetch_histories
+from src.sip import build_nav_panel
+from src.tracing import span
+
+# ~3 years of trading days of daily returns
+LOOKBACK_DAYS = 756
+
+# Fewer daily returns than this and a scheme's correlations are not trusted
+MIN_OBSERVATIONS = 60
+
+# Column block size for the correlation product (bounds peak memory)
+CORR_BLOCK = 512
+
+# Greedy selection: skip candidates this correlated with a pick,
+# and trade score for diversification at this rate
+MAX_PAIR_CORR = 0.90
+CORR_PENALTY = 1.0
+
+# Long-only min-variance weights, capped per fund
+MAX_WEIGHT = 0.40
+
+
+# ---------------- RETURNS ----------------
+def standardized_returns(panel: pd.DataFrame, lookback_days=LOOKBACK_DAYS):
+    """
+    Daily returns over the lookback, demeaned and scaled so that Z.T @ Z is
+    the correlation matrix. Missing days contribute 0.
+
+    Returns (Z, vol, valid): Z is (days, schemes), vol is the daily return
+    std per scheme, valid marks schemes with enough observations.
+    """
+    n = panel.shape[1]
+    if panel.empty or len(panel) < 3:
+        return np.zeros((0, n)), np.full(n, np.nan), np.zeros(n, dtype=bool)
+
+    values = panel.tail(lookback_days + 1).to_numpy(dtype=float)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r = values[1:] / values[:-1] - 1
+
+        obs = np.isfinite(r).sum(axis=0)
+        mean = np.nanmean(r, axis=0)
+        vol = np.nanstd(r, axis=0)
+
+        valid = (obs >= MIN_OBSERVATIONS) & (vol > 0)
+        Z = (r - mean) / (vol * np.sqrt(np.maximum(obs, 1)))
+
+    Z[:, ~valid] = 0.0
+    return np.nan_to_num(Z, nan=0.0), vol, valid
+
+
+def correlation_matrix(Z: np.ndarray, block=CORR_BLOCK) -> np.ndarray:
+    """
+    Full (schemes x schemes) correlation, computed in column blocks.
+    """
+    n = Z.shape[1]
+    corr = np.empty((n, n))
+
+    for i in range(0, n, block):
+        corr[i:i + block] = Z[:, i:i + block].T @ Z
+
+    np.clip(corr, -1.0, 1.0, out=corr)
+    return corr
+
+
+# ---------------- SELECTION ----------------
+def greedy_diversify(scores, Z, top_n=5, valid=None, max_corr=MAX_PAIR_CORR, penalty=CORR_PENALTY):
+    """
+    Pick top_n indices: best score first, then repeatedly the candidate with
+    the best score after a penalty for its highest correlation to the picks.
+
+    Only one correlation column per pick is computed (Z.T @ z), so the cost is
+    O(days * candidates * top_n) and the full matrix is never built.
+    """
+    scores = np.asarray(scores, dtype=float)
+    n = len(scores)
+    k = min(int(top_n), n)
+    if k == 0:
+        return np.array([], dtype=int)
+
+    valid = np.ones(n, dtype=bool) if valid is None else np.asarray(valid, dtype=bool)
+
+    # Put scores on a unit scale so the penalty means the same for any weights
+    finite = np.where(np.isfinite(scores), scores, np.nan)
+    spread = np.nanstd(finite) if np.isfinite(finite).any() else 0.0
+    norm = np.nan_to_num((finite - np.nanmean(finite)) / spread if spread else np.zeros(n), nan=-np.inf)
+
+    # Schemes without enough history go last
+    norm = np.where(valid, norm, norm - 1e6)
+
+    picked = [int(np.argmax(norm))]
+    worst = Z.T @ Z[:, picked[0]]
+
+    while len(picked) < k:
+        adjusted = norm - penalty * np.clip(worst, 0.0, None)
+        adjusted[picked] = -np.inf
+
+        # Near-duplicates are skipped while anything else is left
+        allowed = (worst < max_corr) | ~valid
+        allowed[picked] = False
+        if allowed.any():
+            adjusted[~allowed] = -np.inf
+
+        nxt = int(np.argmax(adjusted))
+        picked.append(nxt)
+        worst = np.maximum(worst, Z.T @ Z[:, nxt])
+
+    return np.array(picked)
+
+
+def min_variance_weights(cov: np.ndarray, max_weight=MAX_WEIGHT, iters=500) -> np.ndarray:
+    """
+    Long-only minimum-variance weights summing to 1 with a per-fund cap,
+    by projected gradient descent.
+    """
+    k = cov.shape[0]
+    if k == 0:
+        return np.array([])
+
+    cap = max(float(max_weight), 1.0 / k)
+    cov = np.nan_to_num(cov)
+    step = 1.0 / (2 * np.linalg.norm(cov, 2) + 1e-12)
+
+    w = np.full(k, 1.0 / k)
+    for _ in range(iters):
+        w_new = _project_capped_simplex(w - step * 2 * cov @ w, cap)
+        if np.abs(w_new - w).max() < 1e-9:
+            w = w_new
+            break
+        w = w_new
+
+    return w
+
+
+def _project_capped_simplex(v, cap):
+    # Find tau with sum(clip(v - tau, 0, cap)) == 1 by bisection
+    lo, hi = v.min() - cap, v.max()
+    for _ in range(60):
+        tau = (lo + hi) / 2
+        if np.clip(v - tau, 0, cap).sum() > 1:
+            lo = tau
+        else:
+            hi = tau
+    return np.clip(v - hi, 0, cap)
+
+
+# ---------------- PORTFOLIO ----------------
+def build_portfolio(ranked: pd.DataFrame, histories=None, top_n=5, score_col="final_score"):
+    """
+    Diversified top_n from a ranked candidate pool.
+
+    Adds columns: weight (min-variance, capped) and max_corr (highest daily
+    return correlation to another pick). Histories are fetched when not given.
+    """
+    if ranked is None or ranked.empty:
+        return ranked
+
+    codes = ranked["scheme_code"].astype(str).str.strip().tolist()
+
+    with span("build_portfolio", rows_in=len(codes)) as sp:
+        if histories is None:
+            histories, _ = fetch_histories(codes)
+
+        panel = build_nav_panel({c: histories[c] for c in codes if c in histories})
+        panel = panel.reindex(columns=codes)
+
+        Z, vol, valid = standardized_returns(panel)
+        picks = greedy_diversify(pd.to_numeric(ranked[score_col], errors="coerce"), Z, top_n, valid)
+
+        corr = Z[:, picks].T @ Z[:, picks]
+        np.fill_diagonal(corr, np.nan)
+
+        cov = np.clip(corr, -1, 1) * np.outer(vol[picks], vol[picks])
+        np.fill_diagonal(cov, vol[picks] ** 2)
+
+        picked_valid = valid[picks]
+        weights = np.zeros(len(picks))
+        if picked_valid.any():
+            sub = np.ix_(picked_valid, picked_valid)
+            weights[picked_valid] = min_variance_weights(cov[sub])
+        else:
+            weights[:] = 1.0 / len(picks)
+
+        portfolio = ranked.iloc[picks].copy()
+        portfolio["weight"] = np.round(weights, 4)
+        with np.errstate(invalid="ignore"):
+            portfolio["max_corr"] = np.where(
+                picked_valid & (len(picks) > 1), np.nanmax(np.where(np.isnan(corr), -np.inf, corr), axis=1), np.nan
+            )
+
+        sp["rows_out"] = len(portfolio)
+
+    return portfolio
@@ -0,0 +1,490 @@
+import argparse
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import time
+import uuid
+
+import pandas as pd
+
+from src.category_ranks import RANKS_PATH, refresh_category_ranks
+from src.compare import fetch_histories
+from src.historical_nav import compute_returns
+from src.similar import FEATURES_PATH, NUMERIC_FEATURES, load_feature_table, save_feature_table, scheme_features
+from src.tracing import span
+
+logger = logging.getLogger("mf.precompute")
+
+# manifest.json (shards and their codes, written once by plan), base_profiles.csv,
+# and per shard in shards/: NNNN.claim (O_EXCL; mtime is the heartbeat),
+# NNNN.csv, NNNN.done.json (written after the csv) and NNNN.failed.json
+PRECOMPUTE_DIR = os.environ.get("MF_PRECOMPUTE_DIR", "data/precompute")
+
+SHARD_SIZE = 400
+
+# Codes fetched between heartbeats; a claim untouched for CLAIM_TTL_S is taken over
+HEARTBEAT_EVERY = 50
+CLAIM_TTL_S = 600
+
+# A shard fails (and is retried) when more than this share of its schemes has no history
+MAX_ERROR_FRACTION = 0.5
+MAX_ATTEMPTS = 3
+RETRY_AFTER_S = 60
+
+POLL_S = 5
+
+METRIC_COLS = [
+    "returns_6m", "returns_1y", "returns_2y", "returns_3y", "returns_5y", "returns_10y",
+    "volatility", "max_drawdown", "as_of",
+]
+
+
+# ---------------- FILES ----------------
+def _write_atomic(path, write):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def _write_json(path, payload):
+    def write(tmp):
+        with open(tmp, "w") as f:
+            json.dump(payload, f, indent=1, default=str)
+    _write_atomic(path, write)
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _shard_path(root, shard_id, suffix):
+    return os.path.join(root, "shards", f"{shard_id:04d}.{suffix}")
+
+
+def load_manifest(root=PRECOMPUTE_DIR) -> dict:
+    manifest = _read_json(os.path.join(root, "manifest.json"))
+    if manifest is None:
+        raise Exception(f"❌ No precompute manifest in {root}. Run `python -m src.precompute plan` first.")
+    return manifest
+
+
+# ---------------- PLAN ----------------
+def plan_shards(codes, shard_size=SHARD_SIZE) -> list:
+    codes = list(dict.fromkeys(str(c).strip() for c in codes))
+    return [codes[i:i + shard_size] for i in range(0, len(codes), shard_size)]
+
+
+def plan(root=PRECOMPUTE_DIR, hist_txt_path="data/NAVAll.txt", shard_size=SHARD_SIZE, profiles=None) -> dict:
+    """
+    Build the base profiles, split their scheme codes into shards and write
+    the manifest. Replaces any earlier plan (and its shard results).
+    """
+    if profiles is None:
+        from src.build_fund_profiles import make_fund_profiles
+        profiles = make_fund_profiles(hist_txt_path)
+
+    shards = plan_shards(profiles["scheme_code"], shard_size)
+
+    os.makedirs(os.path.join(root, "shards"), exist_ok=True)
+    for name in os.listdir(os.path.join(root, "shards")):
+        os.remove(os.path.join(root, "shards", name))
+
+    _write_atomic(os.path.join(root, "base_profiles.csv"), lambda tmp: profiles.to_csv(tmp, index=False))
+
+    manifest = {
+        "plan_id": uuid.uuid4().hex[:12],
+        "created_at": time.time(),
+        "n_schemes": sum(len(s) for s in shards),
+        "shard_size": shard_size,
+        "shards": [{"id": i, "codes": codes} for i, codes in enumerate(shards)],
+    }
+    _write_json(os.path.join(root, "manifest.json"), manifest)
+
+    logger.info("planned %d schemes in %d shards (plan %s)", manifest["n_schemes"], len(shards), manifest["plan_id"])
+    return manifest
+
+
+# ---------------- CLAIM ----------------
+def _shard_state(root, shard_id, now=None):
+    now = now if now is not None else time.time()
+
+    if os.path.exists(_shard_path(root, shard_id, "done.json")):
+        return "done", None
+
+    failed = _read_json(_shard_path(root, shard_id, "failed.json")) or {}
+    attempts = failed.get("attempts", 0)
+
+    try:
+        age = now - os.path.getmtime(_shard_path(root, shard_id, "claim"))
+        return ("stale" if age > CLAIM_TTL_S else "claimed"), failed
+    except OSError:
+        pass
+
+    if attempts >= MAX_ATTEMPTS:
+        return "exhausted", failed
+    if attempts and now - failed.get("failed_at", 0) < RETRY_AFTER_S:
+        return "backoff", failed
+    return ("retry" if attempts else "pending"), failed
+
+
+def claim_shard(root, manifest, worker_id):
+    """
+    Claim the next shard: never-attempted ones first, then retries and
+    claims whose worker stopped heartbeating. Returns the shard id or None.
+    """
+    states = {s["id"]: _shard_state(root, s["id"])[0] for s in manifest["shards"]}
+    order = (
+        [i for i, st in states.items() if st == "pending"]
+        + [i for i, st in states.items() if st in ("retry", "stale")]
+    )
+
+    for shard_id in order:
+        path = _shard_path(root, shard_id, "claim")
+
+        if states[shard_id] == "stale":
+            # Only one worker wins the rename of a dead worker's claim
+            try:
+                os.rename(path, f"{path}.stale-{worker_id}")
+                os.remove(f"{path}.stale-{worker_id}")
+            except OSError:
+                continue
+
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            continue
+
+        with os.fdopen(fd, "w") as f:
+            json.dump({"worker": worker_id, "host": socket.gethostname(), "pid": os.getpid(),
+                       "claimed_at": time.time()}, f)
+
+        # Committed by someone else between the state check and the claim
+        if os.path.exists(_shard_path(root, shard_id, "done.json")):
+            os.remove(path)
+            continue
+
+        return shard_id
+
+    return None
+
+
+def _heartbeat(root, shard_id):
+    try:
+        os.utime(_shard_path(root, shard_id, "claim"))
+    except OSError:
+        pass
+
+
+# ---------------- PROCESS ----------------
+def compute_shard(codes, heartbeat=None) -> tuple:
+    """
+    Returns + volatility / drawdown for a list of scheme codes.
+    Returns (metrics DataFrame indexed by scheme_code, {code: error}).
+    """
+    frames, errors = [], {}
+
+    for start in range(0, len(codes), HEARTBEAT_EVERY):
+        chunk = codes[start:start + HEARTBEAT_EVERY]
+
+        histories, chunk_errors = fetch_histories(chunk)
+        errors.update(chunk_errors)
+
+        if histories:
+            returns = pd.DataFrame({code: compute_returns(df) for code, df in histories.items()}).T
+            feats = scheme_features(histories)[["volatility", "max_drawdown", "as_of"]]
+            frames.append(returns.join(feats))
+
+        if heartbeat is not None:
+            heartbeat()
+
+    if not frames:
+        return pd.DataFrame(columns=METRIC_COLS), errors
+
+    out = pd.concat(frames)
+    out.index.name = "scheme_code"
+    return out[METRIC_COLS], errors
+
+
+def commit_shard(root, shard_id, metrics, meta):
+    """
+    Results first, then the done marker, then release the claim.
+    """
+    # Same inputs, atomic replace: a shard computed twice after a takeover is harmless
+    _write_atomic(_shard_path(root, shard_id, "csv"), lambda tmp: metrics.to_csv(tmp))
+    _write_json(_shard_path(root, shard_id, "done.json"), meta)
+    try:
+        os.remove(_shard_path(root, shard_id, "claim"))
+    except OSError:
+        pass
+
+
+def fail_shard(root, shard_id, worker_id, error):
+    failed = _read_json(_shard_path(root, shard_id, "failed.json")) or {}
+    _write_json(_shard_path(root, shard_id, "failed.json"), {
+        "attempts": failed.get("attempts", 0) + 1,
+        "failed_at": time.time(),
+        "worker": worker_id,
+        "error": error,
+    })
+    try:
+        os.remove(_shard_path(root, shard_id, "claim"))
+    except OSError:
+        pass
+
+
+def run_shard(root, manifest, shard_id, worker_id) -> dict:
+    codes = manifest["shards"][shard_id]["codes"]
+    start = time.time()
+
+    with span("precompute_shard", shard=shard_id, rows_in=len(codes)) as sp:
+        try:
+            metrics, errors = compute_shard(codes, heartbeat=lambda: _heartbeat(root, shard_id))
+
+            if len(errors) > MAX_ERROR_FRACTION * len(codes):
+                sample = next(iter(errors.values()))
+                raise Exception(f"{len(errors)}/{len(codes)} schemes failed (e.g. {sample})")
+
+        except Exception as e:
+            fail_shard(root, shard_id, worker_id, f"{type(e).__name__}: {e}")
+            sp["error"] = str(e)
+            logger.warning("shard %d failed on %s: %s", shard_id, worker_id, e)
+            return {"shard": shard_id, "ok": False, "error": str(e)}
+
+        # Re-planned while this shard ran: its codes may belong to another shard now
+        if load_manifest(root)["plan_id"] != manifest["plan_id"]:
+            logger.warning("shard %d dropped: plan %s was replaced", shard_id, manifest["plan_id"])
+            return {"shard": shard_id, "ok": False, "error": "plan replaced"}
+
+        meta = {
+            "plan_id": manifest["plan_id"],
+            "worker": worker_id,
+            "host": socket.gethostname(),
+            "started_at": start,
+            "elapsed_s": round(time.time() - start, 2),
+            "codes": len(codes),
+            "rows": len(metrics),
+            "errors": len(errors),
+        }
+        commit_shard(root, shard_id, metrics, meta)
+        sp["rows_out"] = len(metrics)
+
+    logger.info("shard %d committed by %s: %d schemes in %.1fs (%d without history)",
+                shard_id, worker_id, len(codes), meta["elapsed_s"], len(errors))
+    return {"shard": shard_id, "ok": True, **meta}
+
+
+def work(root=PRECOMPUTE_DIR, worker_id=None, max_shards=None, wait=True) -> list:
+    """
+    Claim and process shards until none are left. With wait=True the worker
+    stays around while other workers' claims or retries are outstanding, so a
+    crashed worker's shard is picked up once its claim goes stale.
+    """
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    manifest = load_manifest(root)
+    done = []
+
+    while max_shards is None or len(done) < max_shards:
+        shard_id = claim_shard(root, manifest, worker_id)
+
+        if shard_id is None:
+            report = status(root, manifest)
+            outstanding = report["claimed"] + report["backoff"] + report["pending"] + report["retry"]
+            if not wait or not outstanding:
+                break
+            time.sleep(POLL_S)
+            continue
+
+        done.append(run_shard(root, manifest, shard_id, worker_id))
+        report = status(root, manifest)
+        logger.info("progress: %d/%d shards done, %d failed for good, eta %s s",
+                    report["done"], report["shards"], report["exhausted"], report["eta_s"])
+
+    return done
+
+
+# ---------------- STATUS ----------------
+def status(root=PRECOMPUTE_DIR, manifest=None) -> dict:
+    """
+    Shard counts by state, per-shard timings, throughput and an ETA.
+    """
+    manifest = manifest or load_manifest(root)
+    now = time.time()
+
+    counts = {k: 0 for k in ("done", "claimed", "stale", "pending", "retry", "backoff", "exhausted")}
+    timings, failures = [], []
+
+    for shard in manifest["shards"]:
+        state, failed = _shard_state(root, shard["id"], now)
+        counts[state] += 1
+
+        if state == "done":
+            meta = _read_json(_shard_path(root, shard["id"], "done.json")) or {}
+            timings.append({"shard": shard["id"], **meta})
+        elif failed:
+            failures.append({"shard": shard["id"], "state": state, **failed})
+
+    # stale claims are work nobody is doing
+    counts["retry"] += counts.pop("stale")
+
+    elapsed = sum(t.get("elapsed_s", 0) for t in timings)
+    codes_done = sum(t.get("codes", 0) for t in timings)
+    per_code = elapsed / codes_done if codes_done else None
+    codes_left = sum(len(s["codes"]) for s in manifest["shards"]) - codes_done
+
+    # Wall-clock ETA assuming the current number of busy workers keeps going
+    workers = max(counts["claimed"], 1)
+    eta = round(per_code * codes_left / workers) if per_code is not None else None
+
+    return {
+        "plan_id": manifest["plan_id"],
+        "shards": len(manifest["shards"]),
+        **counts,
+        "schemes_done": codes_done,
+        "schemes_per_s_per_worker": round(1 / per_code, 1) if per_code else None,
+        "eta_s": eta,
+        "timings": timings,
+        "failures": failures,
+    }
+
+
+# ---------------- MERGE ----------------
+def merge(root=PRECOMPUTE_DIR, output_path="data/fund_profiles.csv", features_path=FEATURES_PATH,
+          ranks_path=RANKS_PATH, allow_partial=False) -> dict:
+    """
+    Join every committed shard onto the base profiles and write the profile
+    snapshot, the similar-fund feature table and the category ranks.
+    """
+    manifest = load_manifest(root)
+    report = status(root, manifest)
+
+    if report["done"] < report["shards"] and not allow_partial:
+        raise Exception(
+            f"❌ {report['shards'] - report['done']} of {report['shards']} shards are not done "
+            f"(failed for good: {report['exhausted']}). Re-run workers or pass --partial."
+        )
+
+    with span("precompute_merge", rows_in=report["done"]) as sp:
+        frames = [
+            pd.read_csv(_shard_path(root, t["shard"], "csv"), dtype={"scheme_code": str}, parse_dates=["as_of"])
+            for t in report["timings"]
+        ]
+        metrics = pd.concat(frames).drop_duplicates("scheme_code", keep="last") if frames else \
+            pd.DataFrame(columns=["scheme_code"] + METRIC_COLS)
+
+        base = pd.read_csv(os.path.join(root, "base_profiles.csv"), dtype={"scheme_code": str})
+        profiles = base.drop(columns=[c for c in METRIC_COLS if c in base.columns]).merge(
+            metrics, on="scheme_code", how="left"
+        )
+
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        _write_atomic(output_path, lambda tmp: profiles.to_csv(tmp, index=False))
+
+        # Same numbers feed the similar-fund index and the category ranks
+        feats = metrics.set_index("scheme_code").rename(columns={
+            "returns_6m": "ret_6m", "returns_1y": "ret_1y", "returns_3y": "ret_3y", "returns_5y": "ret_5y",
+        })[NUMERIC_FEATURES + ["as_of"]]
+        feats["computed_at"] = pd.Timestamp(time.time(), unit="s")
+
+        table = load_feature_table(features_path)
+        table = pd.concat([table.drop(index=feats.index, errors="ignore"), feats])
+        save_feature_table(table, features_path)
+
+        ranked = refresh_category_ranks(table, profiles, ranks_path)
+
+        sp["rows_out"] = len(profiles)
+
+    logger.info("merged %d shards: %d profiles, %d with metrics -> %s",
+                report["done"], len(profiles), len(metrics), output_path)
+
+    return {
+        "profiles": len(profiles),
+        "with_metrics": len(metrics),
+        "shards_merged": report["done"],
+        "shards_missing": report["shards"] - report["done"],
+        "ranked_categories": len(ranked),
+        "output": output_path,
+    }
+
+
+# ---------------- LOCAL RUN ----------------
+def run_local(root=PRECOMPUTE_DIR, workers=4, output_path="data/fund_profiles.csv") -> dict:
+    """
+    Start `workers` worker processes on this machine, wait for them, merge.
+    """
+    start = time.time()
+    procs = [
+        subprocess.Popen([sys.executable, "-m", "src.precompute", "work", "--root", root,
+                          "--worker-id", f"{socket.gethostname()}-w{i}"])
+        for i in range(workers)
+    ]
+    codes = [p.wait() for p in procs]
+
+    report = merge(root, output_path)
+    report["workers"] = workers
+    report["worker_exit_codes"] = codes
+    report["wall_s"] = round(time.time() - start, 1)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sharded precompute of scheme returns and risk metrics")
+    parser.add_argument("--root", default=PRECOMPUTE_DIR)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("plan", help="split the universe into shards")
+    p.add_argument("--hist", default="data/NAVAll.txt")
+    p.add_argument("--shard-size", type=int, default=SHARD_SIZE)
+
+    p = sub.add_parser("work", help="claim and process shards")
+    p.add_argument("--worker-id", default=None)
+    p.add_argument("--max-shards", type=int, default=None)
+    p.add_argument("--no-wait", action="store_true", help="exit as soon as nothing is claimable")
+
+    sub.add_parser("status", help="progress and per-shard timing")
+
+    p = sub.add_parser("merge", help="write the profile snapshot")
+    p.add_argument("--out", default="data/fund_profiles.csv")
+    p.add_argument("--partial", action="store_true", help="merge even if some shards are missing")
+
+    p = sub.add_parser("run", help="plan if needed, run local workers, merge")
+    p.add_argument("--hist", default="data/NAVAll.txt")
+    p.add_argument("--shard-size", type=int, default=SHARD_SIZE)
+    p.add_argument("--workers", type=int, default=4)
+    p.add_argument("--out", default="data/fund_profiles.csv")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(name)s %(message)s")
+    logger.setLevel(logging.INFO)
+
+    if args.cmd == "plan":
+        manifest = plan(args.root, args.hist, args.shard_size)
+        out = {k: v for k, v in manifest.items() if k != "shards"} | {"shards": len(manifest["shards"])}
+    elif args.cmd == "work":
+        out = work(args.root, args.worker_id, args.max_shards, wait=not args.no_wait)
+    elif args.cmd == "status":
+        out = status(args.root)
+    elif args.cmd == "merge":
+        out = merge(args.root, args.out, allow_partial=args.partial)
+    else:
+        # Resume an unfinished plan, otherwise start a fresh one
+        try:
+            report = status(args.root)
+            fresh = report["done"] + report["exhausted"] == report["shards"]
+        except Exception:
+            fresh = True
+        if fresh:
+            plan(args.root, args.hist, args.shard_size)
+        out = run_local(args.root, args.workers, args.out)
+
+    print(json.dumps(out, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from src.historical_nav import fetch_scheme_history, compute_returns
+from src.similar import scheme_features
+from src.tracing import span
+
+# Background fetches shared by every chat session
+PREFETCH_WORKERS = 4
+
+# Queued + running prefetches across all sessions; extra requests are dropped
+MAX_PENDING = 64
+
+# A session with no chat message for this long is treated as abandoned
+SESSION_IDLE_S = 300
+
+# How long a follow-up answer waits for an in-flight prefetch
+FOLLOWUP_WAIT_S = 15
+
+METRICS_TTL_S = 6 * 3600
+METRICS_CACHE_SIZE = 1024
+
+
+# ---------------- METRICS ----------------
+def compute_fund_metrics(scheme_code) -> dict:
+    """
+    Returns, volatility and drawdown for one scheme (history via the shared LRU).
+    """
+    code = str(scheme_code).strip()
+
+    with span("fund_metrics", scheme_code=code):
+        df_nav = fetch_scheme_history(code)
+        metrics = compute_returns(df_nav)
+
+        feats = scheme_features({code: df_nav})
+        if code in feats.index:
+            metrics["volatility"] = feats.at[code, "volatility"]
+            metrics["max_drawdown"] = feats.at[code, "max_drawdown"]
+
+        return metrics
+
+
+class Prefetcher:
+    """
+    Bounded worker pool that warms a fund's history and metrics as soon as
+    the chat resolves it, so the likely follow-up (returns / risk / compare)
+    reads from memory. Pending work is tracked per session and cancelled when
+    the session goes idle.
+    """
+
+    def __init__(self, workers=PREFETCH_WORKERS, max_pending=MAX_PENDING):
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chat-prefetch")
+        self._lock = threading.Lock()
+
+        self._cache = OrderedDict()      # scheme_code -> (metrics, computed_at)
+        self._futures = {}               # scheme_code -> future
+        self._sessions = {}              # session_id -> set of scheme_codes
+        self._last_seen = {}             # session_id -> monotonic time
+
+        self.stats = {"submitted": 0, "hits": 0, "dropped": 0, "cancelled": 0, "waited": 0}
+
+    # ---------- cache ----------
+    def _cached(self, code):
+        hit = self._cache.get(code)
+        if hit is None or time.time() - hit[1] > METRICS_TTL_S:
+            return None
+        self._cache.move_to_end(code)
+        return hit[0]
+
+    def _run(self, code):
+        try:
+            metrics = compute_fund_metrics(code)
+            with self._lock:
+                self._cache[code] = (metrics, time.time())
+                self._cache.move_to_end(code)
+                while len(self._cache) > METRICS_CACHE_SIZE:
+                    self._cache.popitem(last=False)
+            return metrics
+        finally:
+            with self._lock:
+                self._futures.pop(code, None)
+
+    # ---------- sessions ----------
+    def touch(self, session_id):
+        with self._lock:
+            self._last_seen[session_id] = time.monotonic()
+        self.reap()
+
+    def prefetch(self, session_id, scheme_code):
+        """
+        Queue a background warm-up of `scheme_code` for this session.
+        Returns False when it is already cached, running, or the pool is full.
+        """
+        code = str(scheme_code).strip()
+        self.touch(session_id)
+
+        with self._lock:
+            if self._cached(code) is not None or code in self._futures:
+                self._sessions.setdefault(session_id, set()).add(code)
+                return False
+
+            if len(self._futures) >= self.max_pending:
+                self.stats["dropped"] += 1
+                return False
+
+            self._futures[code] = self._executor.submit(self._run, code)
+            self._sessions.setdefault(session_id, set()).add(code)
+            self.stats["submitted"] += 1
+            return True
+
+    def cancel_session(self, session_id):
+        """
+        Drop queued prefetches only this session asked for; running ones finish.
+        """
+        with self._lock:
+            codes = self._sessions.pop(session_id, set())
+            self._last_seen.pop(session_id, None)
+
+            still_wanted = set().union(*self._sessions.values()) if self._sessions else set()
+
+            for code in codes - still_wanted:
+                fut = self._futures.get(code)
+                if fut is not None and fut.cancel():
+                    self._futures.pop(code, None)
+                    self.stats["cancelled"] += 1
+
+    def reap(self, now=None):
+        now = now if now is not None else time.monotonic()
+        with self._lock:
+            idle = [s for s, seen in self._last_seen.items() if now - seen > SESSION_IDLE_S]
+        for session_id in idle:
+            self.cancel_session(session_id)
+
+    # ---------- reads ----------
+    def metrics(self, scheme_code, wait=FOLLOWUP_WAIT_S):
+        """
+        Metrics for a follow-up answer: cached, else join the in-flight
+        prefetch, else compute now. None if the history cannot be fetched.
+        """
+        code = str(scheme_code).strip()
+
+        with self._lock:
+            hit = self._cached(code)
+            fut = self._futures.get(code)
+            if hit is not None:
+                self.stats["hits"] += 1
+                return hit
+
+        try:
+            if fut is not None and not fut.cancelled():
+                self.stats["waited"] += 1
+                return fut.result(timeout=wait)
+            return self._run(code)
+        except Exception:
+            return None
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                **self.stats,
+                "pending": len(self._futures),
+                "cached": len(self._cache),
+                "sessions": len(self._sessions),
+            }
+
+
+_prefetcher = Prefetcher()
+
+
+def get_prefetcher() -> Prefetcher:
+    return _prefetcher
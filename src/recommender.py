@@ -1,6 +1,16 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+
+import numpy as np
 import pandas as pd
-from src.agents import risk_profile_agent, amount_filter_agent
-from src.historical_nav import compute_all_returns
+from src.agents import risk_profile_agent, amount_filter_agent, investment_agent
+from src.category_ranks import attach_category_ranks, get_category_ranks, quartile_label
+from src.historical_nav import cached_history, fetch_scheme_history, compute_returns
+from src.fund_family import add_family_columns, pick_family_representatives
+from src.outbound import CircuitOpenError
+from src.portfolio import build_portfolio
+from src.tracing import span
 
 
 # ---------------- FUND TYPE DETECTION ----------------
@@ -38,31 +48,64 @@ def detect_fund_type(name: str) -> str:
     return "Other"
 
 
+@lru_cache(maxsize=65536)
+def _cached_fund_type(name: str) -> str:
+    return detect_fund_type(name)
+
+
+def classify_fund_types(names: pd.Series) -> pd.Series:
+    """
+    detect_fund_type for a column, once per distinct name per process.
+    """
+    names = names.astype(str)
+    uniq = names.unique()
+    return names.map(dict(zip(uniq, map(_cached_fund_type, uniq))))
+
+
 # ---------------- RISK FILTER ----------------
-def filter_by_risk(df, user_type):
-    if user_type == "Conservative":
-        return df[df["fund_type"].isin(["Debt", "Hybrid", "Gold"])]
-    elif user_type == "Balanced":
-        return df[df["fund_type"].isin(["Hybrid", "Equity", "Debt"])]
-    else:
-        return df[df["fund_type"].isin(["Equity", "Hybrid"])]
+RISK_FUND_TYPES = {
+    "Conservative": ["Debt", "Hybrid", "Gold"],
+    "Balanced": ["Hybrid", "Equity", "Debt"],
+    "Aggressive": ["Equity", "Hybrid"],
+}
 
+RETURN_COLS = ["returns_6m", "returns_1y", "returns_2y", "returns_3y", "returns_5y", "returns_10y"]
 
-# ---------------- MAIN AGENTIC RECOMMENDER ----------------
-def agentic_recommender(
-    df_master,
-    risk_appetite,
-    horizon,
-    invest_type,
-    amount,
-    fund_type,
-    top_n=5
-):
-    # 1) Risk profile agent
-    user_type = risk_profile_agent(risk_appetite, horizon)
+# How many pre-ranked candidates get a history fetch
+N_CANDIDATES = 10
+
+# Concurrent history fetches while streaming results
+STREAM_WORKERS = 4
+
+# Written by the sharded precompute; its return columns seed provisional rankings
+PROFILES_PATH = "data/fund_profiles.csv"
+
+# final_score = feature matrix @ weights (missing features count as 0)
+SCORE_WEIGHTS = {
+    "returns_1y": 0.20,
+    "returns_3y": 0.15,
+    "returns_5y": 0.15,
+    "returns_10y": 0.10,
+    "nav_change_pct": 0.20,
+    "xirr": 0.20,
+    # average 1Y/3Y/5Y return percentile within the AMFI category (0-100); off by default
+    "category_pct": 0.0,
+}
+FEATURE_COLS = list(SCORE_WEIGHTS)
+
+
+def filter_by_risk(df, user_type):
+    allowed = RISK_FUND_TYPES.get(user_type, RISK_FUND_TYPES["Aggressive"])
+    return df[df["fund_type"].isin(allowed)]
 
-    df_master = df_master.copy()
 
+# ---------------- PIPELINE STAGES ----------------
+def select_candidates(df_master, fund_type, invest_type, amount, user_type=None):
+    """
+    Steps 2-9: classify, filter and pre-rank the snapshot.
+    Returns (top_candidates, name_col, message); message is set when nothing is left.
+    user_type=None skips the risk filter (leaderboards apply it per combination).
+    """
     # 2) Ensure scheme_code exists
     if "scheme_code" not in df_master.columns:
         raise Exception("❌ scheme_code column missing in df_master. Check merge_hist_live() output.")
@@ -75,30 +118,33 @@ def agentic_recommender(
     else:
         raise Exception("❌ No scheme_name or fund_name column found!")
 
-    # 4) Always create fund_type column
-    df_master["fund_type"] = df_master[name_col].apply(detect_fund_type)
+    # 4) The cached master table is already classified; anything else is classified here
+    if "fund_type" in df_master.columns:
+        fund_types = df_master["fund_type"]
+    else:
+        with span("detect_fund_type", rows_in=len(df_master)):
+            fund_types = classify_fund_types(df_master[name_col]).astype(str).str.strip().str.title()
 
-    # normalize
-    df_master["fund_type"] = df_master["fund_type"].astype(str).str.strip().str.title()
     fund_type = str(fund_type).strip().title()
 
-    # 5) Filter by user selected fund type
-    df_master = df_master[df_master["fund_type"] == fund_type]
+    # 5) Filter by user selected fund type (only the matches are copied)
+    df_master = df_master[fund_types == fund_type].assign(fund_type=fund_type)
 
     if df_master.empty:
-        return pd.DataFrame(), [f"⚠️ No funds found for selected Fund Type: {fund_type}"]
+        return None, name_col, f"⚠️ No funds found for selected Fund Type: {fund_type}"
 
     # 6) Amount filter agent
     filtered = amount_filter_agent(df_master, invest_type, amount)
 
     if filtered.empty:
-        return pd.DataFrame(), ["⚠️ No funds found after amount filter. Try changing amount/type."]
+        return None, name_col, "⚠️ No funds found after amount filter. Try changing amount/type."
 
     # 7) Risk filtering
-    filtered = filter_by_risk(filtered, user_type)
+    if user_type is not None:
+        filtered = filter_by_risk(filtered, user_type)
 
-    if filtered.empty:
-        return pd.DataFrame(), ["⚠️ No funds found after risk filtering. Try different risk/horizon."]
+        if filtered.empty:
+            return None, name_col, "⚠️ No funds found after risk filtering. Try different risk/horizon."
 
     # 8) Drop invalid rows
     filtered["nav_change_pct"] = pd.to_numeric(filtered.get("nav_change_pct"), errors="coerce")
@@ -106,60 +152,147 @@ def agentic_recommender(
 
     filtered = filtered.dropna(subset=["nav_change_pct", "nav"])
 
+    # NAVs the ingest quality pass flagged (stale / undated) are not recommended
+    if "nav_flag" in filtered.columns:
+        filtered = filtered[filtered["nav_flag"].fillna("").eq("")]
+
     if filtered.empty:
-        return pd.DataFrame(), ["⚠️ No valid NAV rows found after cleaning."]
+        return None, name_col, "⚠️ No valid NAV rows found after cleaning."
+
+    # 8b) One preferred variant (Direct Growth) per fund family
+    if "family_id" not in filtered.columns:
+        filtered = add_family_columns(filtered, name_col)
+    filtered = pick_family_representatives(filtered)
 
     # 9) Initial scoring (fast ranking)
     filtered["score_initial"] = (0.8 * filtered["nav_change_pct"]) + (0.2 * filtered["nav"])
-    top_candidates = filtered.sort_values("score_initial", ascending=False).head(10)
+    top_candidates = filtered.sort_values("score_initial", ascending=False).head(N_CANDIDATES)
 
-    # 10) Agentic tool call -> compute historical returns
+    return top_candidates, name_col, None
+
+
+def fetch_candidate_returns(top_candidates):
+    """
+    Steps 10-11: fetch each candidate's history and merge its returns back.
+    Returns (candidates, histories, fetch_errors).
+    """
     returns_list = []
+    histories = {}
+    fetch_errors = []
 
-    for _, row in top_candidates.iterrows():
-        scheme_code = str(row["scheme_code"]).strip()
+    with span("fetch_histories", rows_in=len(top_candidates)) as sp:
+        for _, row in top_candidates.iterrows():
+            scheme_code = str(row["scheme_code"]).strip()
 
-        try:
-            ret = compute_all_returns(scheme_code)  # must return dict with returns_6m, returns_1y etc
-        except Exception:
-            ret = {
-                "returns_6m": None,
-                "returns_1y": None,
-                "returns_2y": None,
-                "returns_3y": None,
-                "returns_5y": None,
-                "returns_10y": None,
-            }
-
-        ret["scheme_code"] = scheme_code
-        returns_list.append(ret)
+            try:
+                df_nav = fetch_scheme_history(scheme_code)
+                histories[scheme_code] = df_nav
+                ret = compute_returns(df_nav)  # dict with returns_6m, returns_1y etc
+            except Exception as e:
+                fetch_errors.append(e)
+                ret = {c: None for c in RETURN_COLS}
+
+            ret["scheme_code"] = scheme_code
+            returns_list.append(ret)
+
+        sp["rows_out"] = len(histories)
+        sp["errors"] = len(fetch_errors)
 
     df_returns = pd.DataFrame(returns_list)
 
     # 11) Merge returns back
+    top_candidates = top_candidates.copy()
     top_candidates["scheme_code"] = top_candidates["scheme_code"].astype(str).str.strip()
     df_returns["scheme_code"] = df_returns["scheme_code"].astype(str).str.strip()
 
     top_candidates = top_candidates.merge(df_returns, on="scheme_code", how="left")
 
+    return top_candidates, histories, fetch_errors
+
+
+def feature_matrix(candidates) -> np.ndarray:
+    """
+    (n_candidates, len(FEATURE_COLS)) float matrix, NaN -> 0.
+    """
+    X = np.zeros((len(candidates), len(FEATURE_COLS)))
+
+    for j, c in enumerate(FEATURE_COLS):
+        if c in candidates.columns:
+            X[:, j] = pd.to_numeric(candidates[c], errors="coerce").to_numpy(dtype=float)
+
+    return np.nan_to_num(X)
+
+
+def weight_vector(weights=None) -> np.ndarray:
+    weights = SCORE_WEIGHTS if weights is None else weights
+    return np.array([float(weights.get(c, 0.0)) for c in FEATURE_COLS])
+
+
+def rerank(candidates, weights=None, top_n=5, features=None):
+    """
+    Re-score cached candidates with new weights: one matrix-vector product
+    plus a partial sort of the top_n. No fetching or merging.
+    """
+    if features is None:
+        features = feature_matrix(candidates)
+
+    scores = features @ weight_vector(weights)
+    k = min(int(top_n), len(scores))
+    if k == 0:
+        return candidates.head(0)
+
+    idx = np.argpartition(-scores, k - 1)[:k]
+    idx = idx[np.argsort(-scores[idx], kind="stable")]
+
+    top_funds = candidates.iloc[idx].copy()
+    top_funds["final_score"] = scores[idx]
+    return top_funds
+
+
+def score_candidates(candidates, histories, invest_type, amount, horizon, weights=None):
+    """
+    Steps 11b-12: SIP/lumpsum backtest, then the final score, sorted best first.
+    """
+    # 11b) SIP / lumpsum backtest for the user's amount and horizon
+    with span("investment_agent", rows_in=len(histories)):
+        df_invest = investment_agent(histories, invest_type, amount, horizon).reset_index()
+    df_invest["scheme_code"] = df_invest["scheme_code"].astype(str)
+
+    candidates = candidates.merge(df_invest, on="scheme_code", how="left")
+
+    # Category-relative ranks are precomputed; this is a join on family_id
+    candidates = attach_category_ranks(candidates, get_category_ranks())
+
     # 12) Final score (long-term + short-term)
-    for c in ["returns_6m", "returns_1y", "returns_2y", "returns_3y", "returns_5y", "returns_10y"]:
-        if c not in top_candidates.columns:
-            top_candidates[c] = None
-        top_candidates[c] = pd.to_numeric(top_candidates[c], errors="coerce")
-
-    top_candidates["final_score"] = (
-        0.25 * top_candidates["returns_1y"].fillna(0) +
-        0.20 * top_candidates["returns_3y"].fillna(0) +
-        0.20 * top_candidates["returns_5y"].fillna(0) +
-        0.10 * top_candidates["returns_10y"].fillna(0) +
-        0.25 * top_candidates["nav_change_pct"].fillna(0)
+    for c in RETURN_COLS + ["xirr"]:
+        if c not in candidates.columns:
+            candidates[c] = None
+        candidates[c] = pd.to_numeric(candidates[c], errors="coerce")
+
+    candidates["final_score"] = feature_matrix(candidates) @ weight_vector(weights)
+
+    return candidates.sort_values("final_score", ascending=False)
+
+
+def _category_line(row):
+    q = row.get("ret_1y_q")
+    if q is None or pd.isna(q):
+        return ""
+    return (
+        f"\n🏷️ {row.get('rank_category', 'Category')}: 1Y return {quartile_label(q)}, "
+        f"3Y {quartile_label(row.get('ret_3y_q'))} (of {int(row['category_n'])} funds)"
     )
 
-    # 13) Top funds output
-    top_funds = top_candidates.sort_values("final_score", ascending=False).head(top_n)
 
-    # 14) Explanations (fixed string formatting)
+def _fmt(value, pattern) -> str:
+    value = pd.to_numeric(value, errors="coerce")
+    return "N/A" if pd.isna(value) else pattern.format(value)
+
+
+def explain_funds(top_funds, name_col, invest_type, amount, user_type, fetch_errors=(), n_candidates=0):
+    """
+    Steps 14-15: one explanation per recommended fund, plus a data warning.
+    """
     explanations = []
     for _, row in top_funds.iterrows():
         explanations.append(
@@ -170,8 +303,230 @@ def agentic_recommender(
             f"3Y: {row.get('returns_3y', 0)} | "
             f"5Y: {row.get('returns_5y', 0)} | "
             f"10Y: {row.get('returns_10y', 0)}\n"
+            f"💸 {str(invest_type).upper()} of {amount:,.0f} → Value: {_fmt(row.get('terminal_value'), '{:,.0f}')} | "
+            f"XIRR: {_fmt(row.get('xirr'), '{:.2f}%')}\n"
             f"📈 NAV Change: {row['nav_change_pct']:.2f}% | Final Score: {row['final_score']:.2f}\n"
             f"🧠 Profile Match: {user_type}"
+            + _category_line(row)
         )
 
+    # 15) Surface missing histories instead of silently scoring them as 0
+    if fetch_errors:
+        reason = (
+            "mfapi is unavailable right now (circuit open)"
+            if any(isinstance(e, CircuitOpenError) for e in fetch_errors)
+            else "mfapi requests failed"
+        )
+        explanations.append(
+            f"⚠️ History missing for {len(fetch_errors)} of {n_candidates} candidates: "
+            f"{reason}. Their returns are shown as empty."
+        )
+
+    return explanations
+
+
+# ---------------- MAIN AGENTIC RECOMMENDER ----------------
+def rank_candidates(
+    df_master,
+    risk_appetite,
+    horizon,
+    invest_type,
+    amount,
+    fund_type,
+    weights=None
+):
+    """
+    Steps 1-12: the full ranked candidate pool (with feature columns) and
+    the context needed to explain it. context["message"] is set when empty.
+    """
+    # 1) Risk profile agent
+    user_type = risk_profile_agent(risk_appetite, horizon)
+
+    # 2-9) Filter + pre-rank
+    top_candidates, name_col, message = select_candidates(
+        df_master, fund_type, invest_type, amount, user_type
+    )
+
+    context = {"name_col": name_col, "user_type": user_type, "message": message,
+               "fetch_errors": [], "n_candidates": 0}
+
+    if message:
+        return pd.DataFrame(), context
+
+    # 10-11) Agentic tool call -> fetch history + compute historical returns
+    candidates, histories, fetch_errors = fetch_candidate_returns(top_candidates)
+    context["fetch_errors"] = fetch_errors
+    context["n_candidates"] = len(candidates)
+
+    # 11b-12) SIP backtest + final score
+    ranked = score_candidates(candidates, histories, invest_type, amount, horizon, weights)
+
+    return ranked, context
+
+
+def pool_for_codes(df_master, codes, risk_appetite, horizon, invest_type, amount, weights=None):
+    """
+    rank_candidates for a known set of scheme codes (a session's last pool),
+    straight from the master table; histories come from the shared cache.
+    """
+    name_col = "scheme_name" if "scheme_name" in df_master.columns else "fund_name"
+    context = {"name_col": name_col, "user_type": risk_profile_agent(risk_appetite, horizon),
+               "message": None, "fetch_errors": [], "n_candidates": 0}
+
+    codes = [str(c).strip() for c in codes]
+    df = df_master.assign(scheme_code=df_master["scheme_code"].astype(str).str.strip())
+    candidates = df[df["scheme_code"].isin(codes)].drop_duplicates("scheme_code")
+    if candidates.empty:
+        return pd.DataFrame(), context
+
+    if "family_id" not in candidates.columns:
+        candidates = add_family_columns(candidates, name_col)
+
+    candidates, histories, fetch_errors = fetch_candidate_returns(candidates)
+    context["fetch_errors"] = fetch_errors
+    context["n_candidates"] = len(candidates)
+
+    ranked = score_candidates(candidates, histories, invest_type, amount, horizon, weights)
+    return ranked, context
+
+
+def agentic_recommender(
+    df_master,
+    risk_appetite,
+    horizon,
+    invest_type,
+    amount,
+    fund_type,
+    top_n=5,
+    weights=None,
+    diversify=False
+):
+    ranked, context = rank_candidates(
+        df_master, risk_appetite, horizon, invest_type, amount, fund_type, weights
+    )
+
+    if context["message"]:
+        return pd.DataFrame(), [context["message"]]
+
+    # 13) Top funds output (or a low-correlation portfolio of them)
+    top_funds = build_portfolio(ranked, top_n=top_n) if diversify else ranked.head(top_n)
+
+    # 14-15) Explanations
+    explanations = explain_funds(
+        top_funds, context["name_col"], invest_type, amount, context["user_type"],
+        context["fetch_errors"], context["n_candidates"]
+    )
+
     return top_funds, explanations
+
+
+# ---------------- STREAMING ----------------
+_precomputed = {}
+
+
+def precomputed_returns(path=PROFILES_PATH) -> pd.DataFrame:
+    """
+    Return columns from the profile snapshot, indexed by scheme_code
+    (no columns when the profiles were written without them).
+    Parsed once per file version.
+    """
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        mtime = None
+
+    cached = _precomputed.get(path)
+    if cached is None or cached[0] != mtime:
+        try:
+            df = pd.read_csv(path, usecols=lambda c: c in ["scheme_code"] + RETURN_COLS, dtype={"scheme_code": str})
+            df = df.drop_duplicates("scheme_code").set_index("scheme_code")
+        except Exception:
+            df = pd.DataFrame(index=pd.Index([], name="scheme_code"))
+        cached = _precomputed[path] = (mtime, df)
+    return cached[1]
+
+
+def stream_candidates(
+    df_master,
+    risk_appetite,
+    horizon,
+    invest_type,
+    amount,
+    fund_type,
+    weights=None
+):
+    """
+    rank_candidates as a generator of (ranked, context).
+
+    The first ranking uses only what is at hand: cached histories, else the
+    precomputed profile returns. The missing histories are then fetched
+    concurrently and the pool is re-scored as each one arrives.
+    context["pending"] counts histories still outstanding and context["final"]
+    marks the last ranking, which matches rank_candidates.
+    """
+    user_type = risk_profile_agent(risk_appetite, horizon)
+
+    top_candidates, name_col, message = select_candidates(
+        df_master, fund_type, invest_type, amount, user_type
+    )
+
+    context = {"name_col": name_col, "user_type": user_type, "message": message,
+               "fetch_errors": [], "n_candidates": 0, "pending": 0, "final": True}
+
+    if message:
+        yield pd.DataFrame(), context
+        return
+
+    top_candidates = top_candidates.copy()
+    top_candidates["scheme_code"] = top_candidates["scheme_code"].astype(str).str.strip()
+    codes = top_candidates["scheme_code"].tolist()
+
+    histories, returns, pending = {}, {}, []
+    for code in codes:
+        df_nav = cached_history(code)
+        if df_nav is None:
+            pending.append(code)
+        else:
+            histories[code] = df_nav
+            returns[code] = compute_returns(df_nav)
+
+    # Provisional returns for the rest, replaced as their histories arrive
+    known = precomputed_returns()
+    cols = [c for c in RETURN_COLS if c in known.columns]
+    for code in pending:
+        if cols and code in known.index:
+            returns[code] = known.loc[code, cols].to_dict()
+
+    def ranked():
+        rows = [{**returns.get(c, {}), "scheme_code": c} for c in codes]
+        candidates = top_candidates.merge(pd.DataFrame(rows), on="scheme_code", how="left")
+        return score_candidates(candidates, histories, invest_type, amount, horizon, weights)
+
+    fetch_errors = []
+    context.update(n_candidates=len(codes), pending=len(pending), final=not pending)
+    yield ranked(), dict(context)
+
+    if not pending:
+        return
+
+    pool = ThreadPoolExecutor(max_workers=min(STREAM_WORKERS, len(pending)), thread_name_prefix="stream-fetch")
+    try:
+        futures = {pool.submit(fetch_scheme_history, code): code for code in pending}
+
+        for fut in as_completed(futures):
+            code = futures[fut]
+            try:
+                histories[code] = fut.result()
+                returns[code] = compute_returns(histories[code])
+            except Exception as e:
+                # Same as rank_candidates: no stale numbers for a failed fetch
+                fetch_errors.append(e)
+                returns[code] = {c: None for c in RETURN_COLS}
+
+            context.update(pending=context["pending"] - 1, fetch_errors=list(fetch_errors))
+            context["final"] = context["pending"] == 0
+            yield ranked(), dict(context)
+    finally:
+        # A consumer that stops early (new click, rerun) cancels what is queued
+        pool.shutdown(wait=False, cancel_futures=True)
+
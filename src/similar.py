@@ -0,0 +1,291 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src.category_ranks import refresh_category_ranks
+from src.compare import fetch_histories, horizon_returns, max_drawdown
+from src.fund_family import add_family_columns, pick_family_representatives
+from src.sip import build_nav_panel
+from src.tracing import span
+
+FEATURES_PATH = "data/scheme_features.csv"
+
+NUMERIC_FEATURES = ["ret_6m", "ret_1y", "ret_3y", "ret_5y", "volatility", "max_drawdown"]
+
+# One-hot fund_type is scaled up so neighbours mostly stay in the same category
+CATEGORY_WEIGHT = 3.0
+
+# Histories the app fetches per build: the asked-about fund and its category
+# peers that have no precomputed features (python -m src.precompute does the rest)
+CRAWL_LIMIT = 40
+
+VOL_WINDOW_DAYS = 252
+
+
+# ---------------- FEATURES ----------------
+def scheme_features(histories: dict) -> pd.DataFrame:
+    """
+    One row per scheme_code: horizon returns (%), annualised volatility (%),
+    max drawdown (%) and the last NAV date the row was computed from.
+    """
+    panel = build_nav_panel(histories)
+    if panel.empty:
+        return pd.DataFrame(columns=NUMERIC_FEATURES + ["as_of"])
+
+    rets = horizon_returns(panel)
+    daily = panel.tail(VOL_WINDOW_DAYS + 1).pct_change(fill_method=None)
+
+    last_dates = panel.apply(pd.Series.last_valid_index)
+
+    feats = pd.DataFrame({
+        "ret_6m": rets["6M"],
+        "ret_1y": rets["1Y"],
+        "ret_3y": rets["3Y"],
+        "ret_5y": rets["5Y"],
+        "volatility": daily.std() * np.sqrt(252) * 100,
+        "max_drawdown": max_drawdown(panel),
+        "as_of": last_dates,
+    })
+    feats.index.name = "scheme_code"
+    return feats
+
+
+# ---------------- INDEX ----------------
+class SimilarityIndex:
+    """
+    BallTree over standardised scheme features plus weighted fund_type one-hot.
+    One row per fund family (its preferred variant).
+    """
+
+    def __init__(self, features: pd.DataFrame, profiles: pd.DataFrame, key=None):
+        profiles = profiles.copy()
+        profiles["scheme_code"] = profiles["scheme_code"].astype(str).str.strip()
+
+        # Precomputed profiles carry volatility / max_drawdown too; the features win
+        reps = pick_family_representatives(profiles).drop(columns=NUMERIC_FEATURES, errors="ignore")
+        rows = reps.merge(features[NUMERIC_FEATURES], left_on="scheme_code", right_index=True, how="inner")
+
+        self.key = key
+        self.built_at = time.time()
+        self.rows = rows.reset_index(drop=True)
+
+        # Any variant of a family resolves to the family's row
+        self._row_by_code = dict(zip(self.rows["scheme_code"], self.rows.index))
+        self._row_by_family = dict(zip(self.rows["family_id"], self.rows.index))
+        self._family_by_code = dict(zip(profiles["scheme_code"], profiles["family_id"]))
+
+        self.X = self._matrix(self.rows)
+        self.tree = None
+
+        if len(self.rows):
+            # scikit-learn costs ~1s to import; only index builds need it
+            from sklearn.neighbors import BallTree
+            self.tree = BallTree(self.X)
+
+    @staticmethod
+    def _matrix(rows):
+        num = rows[NUMERIC_FEATURES].astype(float)
+
+        # Missing horizons sit at the mean (z = 0)
+        z = ((num - num.mean()) / num.std(ddof=0).replace(0, 1.0)).fillna(0.0).to_numpy()
+
+        types = rows.get("fund_type", pd.Series("Other", index=rows.index)).fillna("Other").astype(str)
+        onehot = pd.get_dummies(types).to_numpy(dtype=float) * CATEGORY_WEIGHT
+
+        return np.hstack([z, onehot])
+
+    def __len__(self):
+        return len(self.rows)
+
+    def locate(self, scheme_code):
+        code = str(scheme_code).strip()
+        if code in self._row_by_code:
+            return self._row_by_code[code]
+        return self._row_by_family.get(self._family_by_code.get(code))
+
+    def neighbours(self, scheme_code, k=5):
+        """
+        (row positions, distances) of the k nearest other funds, closest first.
+        Returns None when the scheme is not in the index.
+        """
+        i = self.locate(scheme_code)
+        if i is None or self.tree is None:
+            return None
+
+        dist, idx = self.tree.query(self.X[i:i + 1], k=min(int(k) + 1, len(self.rows)))
+
+        keep = idx[0] != i
+        return idx[0][keep][:k], dist[0][keep][:k]
+
+    def query(self, scheme_code, k=5) -> pd.DataFrame:
+        """
+        k nearest other funds to `scheme_code` with a distance column.
+        """
+        found = self.neighbours(scheme_code, k)
+        if found is None:
+            return None
+
+        idx, dist = found
+        out = self.rows.iloc[idx].copy()
+        out["distance"] = dist.round(3)
+        return out
+
+
+# ---------------- FEATURE TABLE ----------------
+def load_feature_table(path=FEATURES_PATH) -> pd.DataFrame:
+    try:
+        df = pd.read_csv(path, dtype={"scheme_code": str}, parse_dates=["as_of", "computed_at"])
+        return df.set_index("scheme_code")
+    except Exception:
+        return pd.DataFrame(columns=NUMERIC_FEATURES + ["as_of", "computed_at"])
+
+
+def save_feature_table(df: pd.DataFrame, path=FEATURES_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    df.to_csv(tmp)
+    os.replace(tmp, path)
+
+
+def profile_features(profiles: pd.DataFrame) -> pd.DataFrame:
+    """
+    Feature rows from the metric columns precompute writes into the profiles.
+    """
+    cols = {"returns_6m": "ret_6m", "returns_1y": "ret_1y", "returns_3y": "ret_3y", "returns_5y": "ret_5y",
+            "volatility": "volatility", "max_drawdown": "max_drawdown"}
+    have = [c for c in cols if c in profiles.columns]
+    if not have:
+        return pd.DataFrame(columns=NUMERIC_FEATURES + ["as_of", "computed_at"])
+
+    feats = profiles.set_index("scheme_code")[have].rename(columns=cols).apply(pd.to_numeric, errors="coerce")
+    feats = feats[feats.notna().any(axis=1)].reindex(columns=NUMERIC_FEATURES)
+    as_of = profiles.set_index("scheme_code")["as_of"] if "as_of" in profiles.columns else pd.Series(dtype=object)
+    feats["as_of"] = pd.to_datetime(as_of.reindex(feats.index), errors="coerce")
+    feats["computed_at"] = feats["as_of"]
+    return feats[~feats.index.duplicated(keep="last")]
+
+
+# ---------------- STORE ----------------
+class SimilarityStore:
+    """
+    Process-wide similar-fund index over the precomputed feature table and
+    profile metrics. Rebuilt in the background for each new data key; a fund
+    asked about without features gets a bounded fetch of its category peers.
+    """
+
+    def __init__(self, path=FEATURES_PATH):
+        self.path = path
+        self._index = None
+        self._table = None
+        self._tried = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="similar-index")
+        self._inflight = None
+        self._inflight_key = None
+
+    @property
+    def index(self):
+        return self._index
+
+    def ensure(self, key, df_profiles, focus=None):
+        """
+        Current index (may be from an earlier key); starts a rebuild for a new
+        key, or a bounded fetch around `focus` when the index lacks it.
+        """
+        focus = None if focus is None or pd.isna(focus) else str(focus).strip()
+        with self._lock:
+            current = self._index
+            rebuild = current is None or current.key != key
+            missing = focus is not None and focus not in self._tried and (
+                current is None or current.locate(focus) is None
+            )
+            if (rebuild or missing) and (
+                self._inflight is None or self._inflight.done() or self._inflight_key != key
+            ):
+                if rebuild:
+                    self._tried.clear()
+                if focus is not None:
+                    self._tried.add(focus)
+                self._inflight_key = key
+                self._inflight = self._executor.submit(self._build, key, df_profiles, focus)
+        return current
+
+    def _crawl_codes(self, profiles, reps, focus):
+        # The focus fund's family first, then its category peers; only codes without features
+        row = profiles[profiles["scheme_code"] == focus]
+        if row.empty:
+            return []
+
+        rep_rows = profiles[profiles["scheme_code"].isin(reps)]
+        own = rep_rows["family_id"] == row["family_id"].iloc[0]
+        peers = own
+        if "fund_type" in profiles.columns:
+            peers = rep_rows["fund_type"] == row["fund_type"].iloc[0]
+
+        codes = list(rep_rows.loc[own, "scheme_code"]) + list(rep_rows.loc[peers & ~own, "scheme_code"])
+        return [c for c in codes if c not in self._table.index][:CRAWL_LIMIT]
+
+    def _build(self, key, df_profiles, focus=None):
+        with span("build_similarity_index", rows_in=len(df_profiles)) as sp:
+            profiles = df_profiles.copy()
+            profiles["scheme_code"] = profiles["scheme_code"].astype(str).str.strip()
+            if "family_id" not in profiles.columns:
+                profiles = add_family_columns(profiles, "fund_name")
+
+            if self._table is None:
+                self._table = load_feature_table(self.path)
+
+            # Metrics precompute merged into the profiles fill codes the table lacks
+            extra = profile_features(profiles)
+            extra = extra.drop(index=self._table.index, errors="ignore")
+            if len(extra):
+                self._table = pd.concat([self._table, extra])
+            self._index = SimilarityIndex(self._table, profiles, key=key)
+
+            reps = pick_family_representatives(profiles)["scheme_code"]
+            todo = self._crawl_codes(profiles, set(reps), focus) if focus is not None else []
+
+            if todo:
+                histories, _ = fetch_histories(todo)
+                feats = scheme_features(histories)
+                feats["computed_at"] = pd.Timestamp(time.time(), unit="s")
+
+                table = self._table.drop(index=feats.index, errors="ignore")
+                self._table = pd.concat([table, feats])
+                save_feature_table(self._table, self.path)
+                self._index = SimilarityIndex(self._table, profiles, key=key)
+
+            # Same features, ranked within each category; only changed categories are redone
+            sp["ranked_categories"] = len(refresh_category_ranks(self._table, profiles))
+
+            sp["rows_out"] = len(self._index)
+            sp["recomputed"] = len(todo)
+
+        return self._index
+
+
+_store = SimilarityStore()
+
+
+def get_similarity_store() -> SimilarityStore:
+    return _store
+
+
+# ---------------- API ----------------
+def similar_funds(scheme_code, k=5, df_profiles=None, key=None):
+    """
+    Up to k funds most similar to `scheme_code` by returns, volatility,
+    drawdown and fund type. Returns None while the index has no row for it.
+    """
+    index = _store.index
+    if df_profiles is not None:
+        index = _store.ensure(key or "profiles", df_profiles, focus=scheme_code) or index
+
+    if index is None:
+        return None
+
+    return index.query(scheme_code, k)
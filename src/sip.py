@@ -0,0 +1,163 @@
+import numpy as np
+import pandas as pd
+
+
+# Sidebar horizon -> backtest window (years)
+HORIZON_YEARS = {
+    "short": 1,
+    "medium": 3,
+    "long": 5,
+}
+
+
+# ---------------- NAV PANEL ----------------
+def build_nav_panel(histories: dict) -> pd.DataFrame:
+    """
+    Align per-scheme NAV histories into one wide frame.
+    Index = date, columns = scheme_code, values forward-filled.
+
+    Built by scattering every (date, scheme) NAV into one array, so the cost
+    stays linear in total rows for thousands of schemes.
+    """
+    codes, dates, navs, cols = [], [], [], []
+
+    for scheme_code, df_nav in histories.items():
+        if df_nav is None or df_nav.empty:
+            continue
+
+        cols.append(np.full(len(df_nav), len(codes)))
+        codes.append(str(scheme_code))
+        dates.append(df_nav["date"].to_numpy(dtype="datetime64[ns]"))
+        navs.append(df_nav["nav"].to_numpy(dtype=float))
+
+    if not codes:
+        return pd.DataFrame()
+
+    index, rows = np.unique(np.concatenate(dates), return_inverse=True)
+
+    # Duplicate dates within a scheme: the later row wins
+    values = np.full((len(index), len(codes)), np.nan)
+    values[rows, np.concatenate(cols)] = np.concatenate(navs)
+
+    panel = pd.DataFrame(values, index=pd.DatetimeIndex(index, name="date"), columns=codes)
+    return panel.ffill()
+
+
+# ---------------- BATCHED XIRR ----------------
+# Annual rates searched for; a scheme whose NPV does not change sign in here is NaN
+XIRR_BOUNDS = (-0.9999, 100.0)
+
+
+def _npv(cf, t, rate):
+    base = 1.0 + rate
+    disc = base ** (-t)
+    return (cf * disc).sum(axis=0), (-t * cf * disc / base).sum(axis=0)
+
+
+def batch_xirr(cashflows: np.ndarray, times: np.ndarray, guess=0.1, max_iter=100, tol=1e-7) -> np.ndarray:
+    """
+    Safeguarded Newton solver for XIRR over many schemes at once.
+
+    cashflows: (n_flows, n_schemes), NaN where a scheme has no flow
+    times: (n_flows,) in years from the first flow
+    Returns an array of annual rates (NaN where no root was bracketed or it
+    did not converge).
+    """
+    cf = np.nan_to_num(cashflows, nan=0.0)
+    t = times[:, None]
+    n = cf.shape[1]
+
+    with np.errstate(over="ignore", divide="ignore", invalid="ignore"):
+        # a keeps the sign of f at the lower bound, b the other one
+        a = np.full(n, XIRR_BOUNDS[0])
+        b = np.full(n, XIRR_BOUNDS[1])
+        f_a, _ = _npv(cf, t, a)
+        f_b, _ = _npv(cf, t, b)
+        bracketed = np.isfinite(f_a) & np.isfinite(f_b) & (np.sign(f_a) * np.sign(f_b) < 0)
+
+        rate = np.full(n, float(np.clip(guess, *XIRR_BOUNDS)))
+        done = ~bracketed
+
+        for _ in range(max_iter):
+            f, df = _npv(cf, t, rate)
+
+            side_a = np.sign(f) == np.sign(f_a)
+            a = np.where(side_a, rate, a)
+            b = np.where(side_a, b, rate)
+
+            # Newton steps that leave the bracket (or divide by 0) bisect instead
+            newton = rate - f / df
+            low, high = np.minimum(a, b), np.maximum(a, b)
+            ok = np.isfinite(newton) & (newton > low) & (newton < high)
+            new = np.where(ok, newton, (a + b) / 2)
+
+            converged = (f == 0) | (np.abs(new - rate) < tol) | (high - low < tol)
+            rate = np.where(done, rate, new)
+            done |= converged
+            if done.all():
+                break
+
+    rate[~bracketed | ~done | ~np.isfinite(rate)] = np.nan
+    return rate
+
+
+# ---------------- SIP / LUMPSUM SIMULATOR ----------------
+def simulate_investment(panel: pd.DataFrame, invest_type: str, amount: float, years: int) -> pd.DataFrame:
+    """
+    Backtest a monthly SIP (or a one-time lumpsum) of `amount` over the last
+    `years` for every scheme in the panel.
+
+    Returns one row per scheme_code with invested, units, terminal_value, xirr (%).
+    Schemes without NAV at the first instalment are returned as NaN.
+    """
+    cols = ["invested", "units", "terminal_value", "xirr"]
+
+    if panel is None or panel.empty:
+        return pd.DataFrame(columns=cols, index=pd.Index([], name="scheme_code"))
+
+    end = panel.index.max()
+    months = int(years) * 12
+
+    # Instalment dates: one per month, first one `years` back
+    dates = pd.DatetimeIndex([end - pd.DateOffset(months=k) for k in range(months, 0, -1)])
+
+    # As-of lookup: last NAV on or before each instalment date
+    pos = panel.index.searchsorted(dates, side="right") - 1
+    values = panel.to_numpy(dtype=float)
+    navs = np.where(pos[:, None] >= 0, values[np.clip(pos, 0, None)], np.nan)
+
+    if str(invest_type).lower() == "lumpsum":
+        flows = np.zeros_like(navs)
+        flows[0] = amount
+    else:
+        flows = np.full_like(navs, float(amount))
+
+    valid = ~np.isnan(navs[0])
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        units = np.nansum(np.where(flows > 0, flows / navs, 0.0), axis=0)
+
+    invested = flows.sum(axis=0)
+    terminal_value = units * values[-1]
+
+    # Cashflows: outflows at each instalment, terminal value at `end`
+    # (schemes younger than the window are left out of the solve)
+    cashflows = np.vstack([-flows, terminal_value[None, :]])
+    cashflows[:, ~valid] = 0.0
+    times = np.append((dates - dates[0]).days, (end - dates[0]).days) / 365.0
+
+    xirr = batch_xirr(cashflows, times) * 100
+
+    out = pd.DataFrame(
+        {
+            "invested": invested,
+            "units": units,
+            "terminal_value": terminal_value,
+            "xirr": xirr,
+        },
+        index=panel.columns,
+    )
+    out.loc[~valid, cols] = np.nan
+    out.index.name = "scheme_code"
+
+    return out
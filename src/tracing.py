@@ -0,0 +1,130 @@
+import contextvars
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import time
+import uuid
+from contextlib import contextmanager
+
+# MF_TRACE_LOG=path  -> append one JSON line per request / orphan span
+# MF_PROFILE=1       -> capture a cProfile report per traced request
+TRACE_LOG_PATH = os.environ.get("MF_TRACE_LOG")
+PROFILE_ENABLED = os.environ.get("MF_PROFILE", "").lower() in ("1", "true", "yes")
+
+logger = logging.getLogger("mf.trace")
+
+_current_trace = contextvars.ContextVar("mf_trace", default=None)
+_depth = contextvars.ContextVar("mf_trace_depth", default=0)
+
+
+# ---------------- OUTPUT ----------------
+def _emit(record: dict):
+    line = json.dumps(record, default=str)
+    logger.info(line)
+
+    if TRACE_LOG_PATH:
+        os.makedirs(os.path.dirname(os.path.abspath(TRACE_LOG_PATH)), exist_ok=True)
+        with open(TRACE_LOG_PATH, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+# ---------------- REQUEST TRACE ----------------
+@contextmanager
+def trace_request(name: str, profile: bool = None):
+    """
+    Collect every span opened inside the block into one request record.
+    The record is yielded so the caller can keep it (e.g. for a debug panel).
+    """
+    trace = {
+        "request_id": uuid.uuid4().hex[:12],
+        "name": name,
+        "started_at": time.time(),
+        "spans": [],
+        "profile": None,
+    }
+    start = time.perf_counter()
+    trace["_start"] = start
+    token = _current_trace.set(trace)
+
+    profile = PROFILE_ENABLED if profile is None else profile
+    profiler = cProfile.Profile() if profile else None
+
+    if profiler:
+        profiler.enable()
+
+    try:
+        yield trace
+    finally:
+        if profiler:
+            profiler.disable()
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(30)
+            trace["profile"] = out.getvalue()
+
+        trace["wall_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        trace["spans"].sort(key=lambda r: r.get("offset_ms", 0))
+        trace.pop("_start", None)
+        _current_trace.reset(token)
+        _emit(trace)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def mark_once(key: str) -> float:
+    """
+    Record ms since the active trace started under trace[key], the first
+    time only (e.g. time-to-first-result). Returns the recorded value.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return None
+    if key not in trace:
+        trace[key] = round((time.perf_counter() - trace["_start"]) * 1000, 3)
+    return trace[key]
+
+
+def span_count() -> int:
+    """
+    Number of spans recorded so far in the active trace (0 if none).
+    """
+    trace = _current_trace.get()
+    return len(trace["spans"]) if trace else 0
+
+
+# ---------------- SPANS ----------------
+@contextmanager
+def span(name: str, **attrs):
+    """
+    Time one pipeline stage.
+
+    Yields a dict; set rows_in / rows_out / bytes / cache on it as they
+    become known. Spans outside a trace_request are logged on their own.
+    """
+    depth = _depth.get()
+    record = {"span": name, "depth": depth, **attrs}
+
+    token = _depth.set(depth + 1)
+    start = time.perf_counter()
+
+    trace = _current_trace.get()
+    if trace is not None:
+        record["offset_ms"] = round((start - trace["_start"]) * 1000, 3)
+
+    try:
+        yield record
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        record["wall_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        _depth.reset(token)
+
+        if trace is not None:
+            trace["spans"].append(record)
+        else:
+            _emit(record)
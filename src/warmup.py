@@ -0,0 +1,86 @@
+import importlib
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger("mf.warmup")
+
+# Imported lazily by the modules that use them
+HEAVY_IMPORTS = ["requests", "matplotlib.figure", "sklearn.neighbors"]
+
+_report = {
+    "app_import_ms": None,
+    "imports_ms": {},
+    "stages_ms": {},
+    "errors": {},
+    "total_ms": None,
+    "done": False,
+}
+_lock = threading.Lock()
+_thread = None
+
+
+def _timed(section, name, fn):
+    start = time.perf_counter()
+    try:
+        return fn()
+    except Exception as e:
+        _report["errors"][name] = f"{type(e).__name__}: {e}"
+        return None
+    finally:
+        _report[section][name] = round((time.perf_counter() - start) * 1000, 1)
+
+
+# ---------------- STAGES ----------------
+# Heavy imports, profile index, NAV snapshot and fund-type table, paid once per
+# server process in the background instead of on the first user's request
+def run_warmup(profiles_path="data/fund_profiles.csv") -> dict:
+    from src.fund_qa import load_fund_profiles
+    from src.nav_snapshot import get_nav_store
+    from src.recommender import classify_fund_types
+
+    start = time.perf_counter()
+
+    for module in HEAVY_IMPORTS:
+        _timed("imports_ms", module, lambda: importlib.import_module(module))
+
+    _timed("stages_ms", "fund_profiles", lambda: load_fund_profiles(profiles_path))
+
+    snapshot = _timed("stages_ms", "nav_snapshot", lambda: get_nav_store().get())
+
+    if snapshot is not None:
+        _timed("stages_ms", "fund_type_table", lambda: classify_fund_types(snapshot.df["fund_name"]))
+
+    _report["total_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    _report["done"] = True
+
+    logger.info("warmup %s", json.dumps(_report))
+    return warmup_report()
+
+
+def start_warmup(app_import_ms=None):
+    """
+    Start the warmup once per process (later calls are no-ops).
+    """
+    global _thread
+
+    with _lock:
+        if _report["app_import_ms"] is None and app_import_ms is not None:
+            _report["app_import_ms"] = round(app_import_ms, 1)
+
+        if _thread is None:
+            _thread = threading.Thread(target=run_warmup, name="warmup", daemon=True)
+            _thread.start()
+
+    return _thread
+
+
+def warmup_report() -> dict:
+    return json.loads(json.dumps(_report))
+
+
+# python -m src.warmup: run in the foreground and print the timings
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    print(json.dumps(run_warmup(), indent=2))
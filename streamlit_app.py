@@ -1,3 +1,6 @@
+import time
+_BOOT_T0 = time.perf_counter()
+
 import os
 import sys
 import streamlit as st
@@ -10,9 +13,29 @@ if ROOT_DIR not in sys.path:
 
 # ---------------- IMPORTS ----------------
 from src.chat_ui import render_chat_ui
-from src.data_fetch import fetch_live_nav
-from src.preprocess import preprocess_hist_data, merge_hist_live
-from src.recommender import agentic_recommender, detect_fund_type
+from src.nav_snapshot import get_nav_store
+from src.nav_quality import quality_report
+from src.master_cache import cache_snapshot, get_master, get_pool, get_upload, upload_digest
+from src.recommender import (
+    SCORE_WEIGHTS,
+    explain_funds,
+    feature_matrix,
+    pool_for_codes,
+    stream_candidates,
+    rerank,
+)
+from src.portfolio import build_portfolio
+from src.compare import fetch_histories
+from src.leaderboard import get_leaderboard_store, lookup_board
+from src.charts import plot_top_funds
+from src.outbound import source_metrics
+from src.prefetch import get_prefetcher
+from src.tracing import mark_once, trace_request, span
+from src.warmup import start_warmup, warmup_report
+
+# Heavy libraries, profiles, NAV snapshot and fund types load in the
+# background on the first run of this process; reruns only see cached modules.
+start_warmup(app_import_ms=(time.perf_counter() - _BOOT_T0) * 1000)
 
 # ---------------- STREAMLIT CONFIG ----------------
 st.set_page_config(
@@ -22,10 +45,153 @@ st.set_page_config(
 
 st.title("📈 Mutual Fund Live Recommendation (Agentic AI + XAI)")
 
-# ---------------- STREAMLIT CACHE ----------------
-@st.cache_data(ttl=3600)
+# ---------------- LIVE NAV SNAPSHOT ----------------
+# Shared by all sessions: served from memory, refreshed in the background
+# after each AMFI publish time (stale-while-revalidate).
 def get_live_nav():
-    return fetch_live_nav()
+    return get_nav_store().get()
+
+# ---------------- OUTPUT ----------------
+def render_recommendations(top_funds, explanations, invest_type, data_key=None):
+    """
+    Table, 1Y chart and explanations for the ranked funds.
+    """
+    st.subheader("✅ Recommended Funds")
+
+    if top_funds is not None and not top_funds.empty:
+
+        # ✅ CLEAN & IMPORTANT METRICS ONLY
+        display_cols = [
+            "scheme_name",
+            "fund_type",
+            "nav",
+            "returns_6m",
+            "returns_1y",
+            "returns_3y",
+            "returns_5y",
+            "returns_10y",
+            "terminal_value",
+            "xirr",
+            "final_score",
+            "weight",
+            "max_corr"
+        ]
+        display_cols = [c for c in display_cols if c in top_funds.columns]
+
+        st.dataframe(
+            top_funds[display_cols].rename(columns={
+                "returns_6m": "6M Return (%)",
+                "returns_1y": "1Y Return (%)",
+                "returns_3y": "3Y Return (%)",
+                "returns_5y": "5Y Return (%)",
+                "returns_10y": "10Y Return (%)",
+                "terminal_value": f"{invest_type.upper()} Value",
+                "xirr": "XIRR (%)",
+                "final_score": "AI Score",
+                "weight": "Weight",
+                "max_corr": "Max Corr"
+            }),
+            use_container_width=True
+        )
+
+        st.subheader("📊 Performance Comparison (Top Funds)")
+
+        if "returns_1y" in top_funds.columns:
+
+            plot_data = top_funds.copy()
+
+            # Clean numeric values safely
+            plot_data["returns_1y"] = pd.to_numeric(
+                plot_data["returns_1y"], errors="coerce"
+            )
+
+            plot_data = plot_data.dropna(subset=["returns_1y"])
+
+            if not plot_data.empty:
+
+                with span("plot_top_funds", rows_in=len(plot_data)):
+                    plot_top_funds(plot_data, snapshot=data_key)
+
+            else:
+                st.info("No valid return data available for chart.")
+
+    else:
+        st.warning("⚠️ No funds found for selected filters")
+
+    # ---------- EXPLANATIONS ----------
+    st.subheader("🧠 Agentic AI Explanation")
+    if explanations:
+        for exp in explanations:
+            st.write(exp)
+    else:
+        st.info("No explanations generated")
+
+
+def ranked_pool(what_if, hist_digest, df_hist):
+    """
+    (pool, features, context) for the session's last run, from the shared
+    cache or rebuilt from the cached master table; None once the upload changed.
+    """
+    snapshot = get_nav_store().snapshot
+    if what_if["hist_digest"] != hist_digest or snapshot is None:
+        return get_pool(what_if["pool_key"])
+
+    def build():
+        df_master = get_master(hist_digest, df_hist, snapshot)
+        pool, context = pool_for_codes(
+            df_master, what_if["codes"], what_if["risk_appetite"], what_if["horizon"],
+            what_if["invest_type"], what_if["amount"]
+        )
+        return pool, feature_matrix(pool), context
+
+    return get_pool(what_if["pool_key"], build)
+
+
+def render_what_if(what_if, weights, top_n, hist_digest, df_hist, diversify=False):
+    """
+    Re-rank the cached candidate pool with the current slider weights.
+    """
+    if what_if["message"]:
+        render_recommendations(pd.DataFrame(), [what_if["message"]], what_if["invest_type"])
+        return
+
+    found = ranked_pool(what_if, hist_digest, df_hist)
+    if found is None:
+        st.info("ℹ️ Data changed since the last run – run the recommendation again")
+        return
+    pool, features, context = found
+
+    if diversify:
+        # Histories come from the process-wide history cache on every slider move
+        histories, _ = fetch_histories(pool["scheme_code"])
+
+        ranked = rerank(pool, weights, len(pool), features)
+        top_funds = build_portfolio(ranked, histories, top_n)
+    else:
+        with span("rerank", rows_in=len(pool)):
+            top_funds = rerank(pool, weights, top_n, features)
+
+    explanations = explain_funds(
+        top_funds, context["name_col"], what_if["invest_type"], what_if["amount"],
+        context["user_type"], context["fetch_errors"], context["n_candidates"]
+    )
+    render_recommendations(top_funds, explanations, what_if["invest_type"], what_if.get("data_key"))
+
+def render_provisional(pool, context, invest_type, amount, top_n, data_key):
+    """
+    Ranking from the metrics at hand while candidate histories load.
+    """
+    if context["message"]:
+        render_recommendations(pd.DataFrame(), [context["message"]], invest_type)
+        return
+
+    top_funds = pool.head(top_n)
+    explanations = explain_funds(
+        top_funds, context["name_col"], invest_type, amount,
+        context["user_type"], context["fetch_errors"], context["n_candidates"]
+    )
+    render_recommendations(top_funds, explanations, invest_type, data_key)
+
 
 # ---------------- SIDEBAR INPUTS ----------------
 st.sidebar.header("User Preferences")
@@ -55,6 +221,29 @@ top_n = st.sidebar.slider(
     "Top N Funds", 3, 10, 5
 )
 
+WEIGHT_LABELS = {
+    "returns_1y": "1Y return",
+    "returns_3y": "3Y return",
+    "returns_5y": "5Y return",
+    "returns_10y": "10Y return",
+    "nav_change_pct": "NAV change",
+    "xirr": "SIP/Lumpsum XIRR",
+    "category_pct": "Category percentile",
+}
+
+with st.sidebar.expander("⚖️ Scoring weights (what-if)"):
+    score_weights = {
+        c: st.slider(WEIGHT_LABELS.get(c, c), 0.0, 1.0, float(w), 0.05, key=f"weight_{c}")
+        for c, w in SCORE_WEIGHTS.items()
+    }
+
+diversify = st.sidebar.checkbox(
+    "🧩 Diversified portfolio", value=False,
+    help="Pick low-correlation funds from the ranked pool and suggest min-variance weights"
+)
+
+show_debug = st.sidebar.checkbox("🐞 Show pipeline timings", value=False)
+
 st.sidebar.markdown("---")
 
 # ---------------- FILE UPLOAD ----------------
@@ -75,156 +264,168 @@ cache_file = st.sidebar.file_uploader(
 )
 
 if cache_file is not None:
-    os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
-    with open(CACHE_PATH, "wb") as f:
-        f.write(cache_file.getbuffer())
+    # The uploader keeps the file across reruns; only swap it in once
+    upload_key = (cache_file.name, cache_file.size)
+    if st.session_state.get("cache_upload_key") != upload_key:
+        os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+        with open(CACHE_PATH, "wb") as f:
+            f.write(cache_file.getbuffer())
+        get_nav_store().refresh_async()
+        st.session_state["cache_upload_key"] = upload_key
     st.sidebar.success("✅ Cache file saved")
 
 # ---------------- MAIN FLOW ----------------
 if uploaded_file is not None:
 
     # ---------- READ FILE ----------
+    # Hashed once per uploaded file, parsed once per content across sessions
+    if st.session_state.get("upload_file_id") != uploaded_file.file_id:
+        st.session_state["upload_file_id"] = uploaded_file.file_id
+        st.session_state["upload_digest"] = upload_digest(uploaded_file.getvalue())
+    hist_digest = st.session_state["upload_digest"]
+
     try:
-        if uploaded_file.name.lower().endswith(".csv"):
-            df_hist = pd.read_csv(uploaded_file)
-        else:
-            df_hist = pd.read_csv(
-                uploaded_file,
-                sep=";",
-                engine="python",
-                on_bad_lines="skip"
-            )
+        df_hist, _ = get_upload(uploaded_file.name, uploaded_file.getvalue(), hist_digest)
     except Exception as e:
         st.error(f"❌ Error reading file: {e}")
         st.stop()
 
-    df_hist = preprocess_hist_data(df_hist)
     st.success("✅ Historical dataset uploaded")
 
+    # Leaderboards for this upload are built now and after every NAV snapshot
+    get_leaderboard_store().watch(hist_digest, df_hist)
+
     # ---------- RUN PIPELINE ----------
     if st.button("🚀 Run Live Recommendation"):
 
-        with st.spinner("Fetching Live NAV from AMFI..."):
-            try:
-                df_live = get_live_nav()
-                st.success("✅ Live NAV loaded")
-            except Exception as e:
-                st.error(f"❌ Failed to fetch NAV: {e}")
-                st.stop()
-
-        with st.spinner("Merging datasets..."):
-            df_master = merge_hist_live(df_hist, df_live)
-
-        # Ensure scheme_name exists
-        if "scheme_name" not in df_master.columns:
-            if "fund_name" in df_master.columns:
-                df_master["scheme_name"] = df_master["fund_name"]
+        with trace_request("live_recommendation") as trace:
+            with st.spinner("Fetching Live NAV from AMFI..."):
+                try:
+                    with span("get_live_nav") as sp:
+                        sp["cache"] = "hit" if get_nav_store().snapshot is not None else "miss"
+                        snapshot = get_live_nav()
+                        df_live = snapshot.df
+                        sp["rows_out"] = len(df_live)
+                        sp["snapshot"] = snapshot.digest
+                    st.success(
+                        f"✅ Live NAV loaded ({snapshot.source}, "
+                        f"as of {pd.Timestamp(snapshot.fetched_at, unit='s', tz='Asia/Kolkata'):%d-%b %H:%M} IST)"
+                    )
+                except Exception as e:
+                    st.error(f"❌ Failed to fetch NAV: {e}")
+                    st.stop()
+
+            # Merged and classified once per (upload, snapshot), shared across sessions
+            with st.spinner("Merging datasets..."):
+                try:
+                    df_master = get_master(hist_digest, df_hist, snapshot)
+                except Exception as e:
+                    st.error(str(e))
+                    st.stop()
+
+            # ---------- DEBUG ----------
+            st.subheader("🔍 Fund Type Distribution")
+            st.write(df_master["fund_type"].value_counts())
+
+            # ---------- RECOMMENDER ----------
+            # Precomputed boards per (snapshot, upload); a miss scores live
+            leaderboards = get_leaderboard_store().get(f"{snapshot.digest}:{hist_digest}")
+
+            with span("leaderboard_read") as sp:
+                found = lookup_board(leaderboards, risk_appetite, horizon, invest_type, amount, fund_type)
+                sp["cache"] = "hit" if found is not None else "miss"
+
+            # Provisional rankings and the final one replace each other here
+            results = st.empty()
+            data_key = f"{snapshot.digest}:{hist_digest}"
+
+            if found is not None:
+                pool, context = found
+                st.caption("⚡ Served from precomputed leaderboard")
             else:
-                st.error("❌ scheme_name column missing")
-                st.stop()
-
-        # Fund type classification
-        df_master["fund_type"] = (
-            df_master["scheme_name"]
-            .apply(detect_fund_type)
-            .astype(str)
-            .str.title()
-        )
-
-        # ---------- DEBUG ----------
-        st.subheader("🔍 Fund Type Distribution")
-        st.write(df_master["fund_type"].value_counts())
-
-        # ---------- RECOMMENDER ----------
-        with st.spinner("Generating recommendations..."):
-            top_funds, explanations = agentic_recommender(
-                df_master=df_master,
-                risk_appetite=risk_appetite,
-                horizon=horizon,
-                invest_type=invest_type,
-                amount=amount,
-                fund_type=fund_type,
-                top_n=top_n
-            )
-
-        # ---------- OUTPUT ----------
-        st.subheader("✅ Recommended Funds")
-
-        if top_funds is not None and not top_funds.empty:
-
-            # ✅ CLEAN & IMPORTANT METRICS ONLY
-            display_cols = [
-                "scheme_name",
-                "fund_type",
-                "nav",
-                "returns_6m",
-                "returns_1y",
-                "returns_3y",
-                "returns_5y",
-                "returns_10y",
-                "final_score"
-            ]
-            display_cols = [c for c in display_cols if c in top_funds.columns]
-
-            st.dataframe(
-                top_funds[display_cols].rename(columns={
-                    "returns_6m": "6M Return (%)",
-                    "returns_1y": "1Y Return (%)",
-                    "returns_3y": "3Y Return (%)",
-                    "returns_5y": "5Y Return (%)",
-                    "returns_10y": "10Y Return (%)",
-                    "final_score": "AI Score"
-                }),
-                use_container_width=True
-            )
-
-            import matplotlib.pyplot as plt
-
-            st.subheader("📊 Performance Comparison (Top Funds)")
-
-            if "returns_1y" in top_funds.columns:
+                with span("agentic_recommender", rows_in=len(df_master)) as sp:
+                    for pool, context in stream_candidates(
+                        df_master=df_master,
+                        risk_appetite=risk_appetite,
+                        horizon=horizon,
+                        invest_type=invest_type,
+                        amount=amount,
+                        fund_type=fund_type,
+                        weights=score_weights
+                    ):
+                        if context["final"]:
+                            break
+
+                        with results.container():
+                            st.caption(
+                                f"⏳ Provisional ranking – {context['pending']} of "
+                                f"{context['n_candidates']} fund histories still loading"
+                            )
+                            render_provisional(pool, context, invest_type, amount, top_n,
+                                               f"{data_key}:p{context['pending']}")
+                        sp["first_result_ms"] = mark_once("first_result_ms")
+
+                    sp["rows_out"] = len(pool)
+
+            # The pool and its feature matrix live in the shared cache; the
+            # session keeps the scheme codes to rebuild it after eviction
+            pool_key = f"{data_key}:{risk_appetite}:{horizon}:{invest_type}:{fund_type}:{amount}"
+            get_pool(pool_key, lambda: (pool, feature_matrix(pool), context))
+            st.session_state["what_if"] = {
+                "pool_key": pool_key,
+                "codes": pool["scheme_code"].astype(str).tolist() if "scheme_code" in pool else [],
+                "message": context["message"],
+                "risk_appetite": risk_appetite,
+                "horizon": horizon,
+                "invest_type": invest_type,
+                "amount": amount,
+                "hist_digest": hist_digest,
+                "data_key": data_key,
+            }
+
+            with results.container():
+                render_what_if(st.session_state["what_if"], score_weights, top_n,
+                               hist_digest, df_hist, diversify)
+            mark_once("first_result_ms")
+
+        st.session_state["last_trace"] = trace
+
+    elif "what_if" in st.session_state:
+        st.caption("↕️ Last run, re-ranked with the current scoring weights")
+        render_what_if(st.session_state["what_if"], score_weights, top_n,
+                       hist_digest, df_hist, diversify)
 
-                plot_data = top_funds.copy()
-
-            # Clean numeric values safely
-                plot_data["returns_1y"] = pd.to_numeric(
-                    plot_data["returns_1y"], errors="coerce"
-                )
-
-                plot_data = plot_data.dropna(subset=["returns_1y"])
-
-                if not plot_data.empty:
-
-                    fig, ax = plt.subplots()
+else:
+    st.info("⬅️ Upload historical data from sidebar to start")
 
-                    ax.bar(
-                        plot_data["scheme_name"],
-                        plot_data["returns_1y"]
-                    )
+# ---------------- DEBUG PANEL ----------------
+if show_debug and st.session_state.get("last_trace"):
+    last_trace = st.session_state["last_trace"]
 
-                    ax.set_ylabel("1 Year Return (%)")
-                    ax.set_title("Top Recommended Funds – 1Y Returns")
-                    plt.xticks(rotation=45, ha="right")
+    first = last_trace.get("first_result_ms")
+    first = f", first result {first:.0f} ms" if first is not None else ""
+    with st.expander(f"🐞 Pipeline timings – {last_trace['wall_ms']:.0f} ms total{first}", expanded=True):
+        st.dataframe(pd.DataFrame(last_trace["spans"]), use_container_width=True)
 
-                    st.pyplot(fig)
+        st.caption("Outbound sources (rate limiter / circuit breaker)")
+        st.dataframe(pd.DataFrame(source_metrics()).T, use_container_width=True)
 
-                else:
-                    st.info("No valid return data available for chart.")
+        st.caption("NAV data quality (quarantined / flagged rows)")
+        st.json(quality_report())
 
+        st.caption("Upload / master table cache")
+        st.json(cache_snapshot())
 
-        else:
-            st.warning("⚠️ No funds found for selected filters")
+        st.caption("Chat prefetcher")
+        st.json(get_prefetcher().snapshot())
 
-        # ---------- EXPLANATIONS ----------
-        st.subheader("🧠 Agentic AI Explanation")
-        if explanations:
-            for exp in explanations:
-                st.write(exp)
-        else:
-            st.info("No explanations generated")
+        if last_trace.get("profile"):
+            st.code(last_trace["profile"])
 
-else:
-    st.info("⬅️ Upload historical data from sidebar to start")
+if show_debug:
+    boot = warmup_report()
+    with st.expander(f"🚀 Cold start – app imports {boot['app_import_ms']} ms, warmup {boot['total_ms']} ms"):
+        st.json(boot)
 
 # ---------------- FUND CHATBOT ----------------
 st.markdown("---")
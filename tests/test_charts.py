@@ -0,0 +1,57 @@
+import gc
+
+import numpy as np
+import pandas as pd
+from matplotlib import _pylab_helpers
+
+from src import charts
+
+RENDERS = 1000
+WARMUP = 50
+MAX_GROWTH_MB = 25
+
+
+def _rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * 4096 / 2**20
+
+
+def _rebased(i, n_funds=8, days=750):
+    rng = np.random.default_rng(i)
+    values = 100 * np.exp(np.cumsum(rng.normal(0.0004, 0.01, (days, n_funds)), axis=0))
+    return pd.DataFrame(values, index=pd.bdate_range("2023-01-02", periods=days),
+                        columns=[str(500000 + i * n_funds + j) for j in range(n_funds)])
+
+
+def _render(i):
+    # Every snapshot is new, so every render is a cache miss
+    fund = {"scheme_code": str(i), "returns_1y": i % 17, "returns_3y": i % 23, "returns_5y": i % 29}
+    charts.returns_chart_png(fund, snapshot=f"test-{i}")
+    if i % 50 == 0:
+        charts.comparison_png(_rebased(i), snapshot=f"test-{i}")
+
+
+def test_memory_stays_flat_over_1000_renders():
+    charts.clear_chart_cache()
+    for i in range(WARMUP):
+        _render(10**6 + i)
+    gc.collect()
+    start = _rss_mb()
+
+    for i in range(RENDERS):
+        _render(i)
+    gc.collect()
+
+    assert _rss_mb() - start < MAX_GROWTH_MB
+    assert _pylab_helpers.Gcf.get_num_fig_managers() == 0
+    assert len(charts._cache) <= charts.CHART_CACHE_SIZE
+
+
+def test_repeat_render_is_served_from_cache():
+    charts.clear_chart_cache()
+    fund = {"scheme_code": "1", "returns_1y": 5}
+    first = charts.returns_chart_png(fund, snapshot="same")
+    renders = charts.stats["renders"]
+
+    assert charts.returns_chart_png(fund, snapshot="same") is first
+    assert charts.stats["renders"] == renders
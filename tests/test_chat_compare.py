@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+import streamlit as st
+
+from src import chat_ui, compare, fund_qa
+from src.chat_ui import fund_chatbot_response
+
+PROFILES = pd.DataFrame({
+    "scheme_code": ["101", "102", "103"],
+    "fund_name": [
+        "Alpha Flexi Cap Fund - Direct Plan - Growth",
+        "Beta Large Cap Fund - Direct Plan - Growth",
+        "Gamma Mid Cap Fund - Direct Plan - Growth",
+    ],
+    "fund_type": ["Equity", "Equity", "Equity"],
+    "nav": [100.0, 50.0, 25.0],
+})
+
+
+def _history(code):
+    rng = np.random.default_rng(int(code))
+    dates = pd.bdate_range(end="2026-02-03", periods=800)
+    return pd.DataFrame({"date": dates, "nav": 10 * np.cumprod(1 + rng.normal(0, 0.01, len(dates)))})
+
+
+@pytest.fixture(autouse=True)
+def chat(monkeypatch):
+    monkeypatch.setattr(st, "session_state", {})
+    monkeypatch.setattr(chat_ui, "load_fund_profiles", lambda: PROFILES)
+    monkeypatch.setattr(chat_ui, "prefetch_fund", lambda fund_row: None)
+    monkeypatch.setattr(fund_qa, "prefetch_fund", lambda fund_row: None)
+    monkeypatch.setattr(fund_qa, "plot_comparison", lambda *a, **k: None)
+    monkeypatch.setattr(compare, "fetch_scheme_history", _history)
+
+
+def test_compare_from_chat_entry_point():
+    fund_chatbot_response("nav of alpha flexi cap")
+    assert "Comparison Ready (2 funds)" in fund_chatbot_response("compare with beta large cap")
+    assert "Comparison Ready (3 funds)" in fund_chatbot_response("compare with gamma mid cap")
+
+    reply = fund_chatbot_response("compare returns")
+    assert "Return Comparison" in reply
+    for name in PROFILES["fund_name"]:
+        assert name in reply
+    assert st.session_state["compare_codes"] == ["101", "102", "103"]
+
+
+def test_clear_compare_from_chat():
+    fund_chatbot_response("compare with alpha flexi cap")
+    fund_chatbot_response("compare with beta large cap")
+    assert "cleared" in fund_chatbot_response("clear compare")
+    assert st.session_state["compare_codes"] == []
@@ -0,0 +1,47 @@
+import pandas as pd
+
+from src.chat_parser import parse_query
+from src.fund_qa import match_query
+
+PROFILES = pd.DataFrame({"fund_name": [
+    "DSP 10Y G-Sec Fund - Direct Plan - Growth",
+    "DSP G-Sec Fund - Direct Plan - Growth",
+    "Bandhan Gilt Fund with 10 year constant duration Fund - Direct Plan - Growth",
+    "Bandhan Gilt Fund - Direct Plan - Growth",
+    "SBI GILT FUND -  GROWTH - PF (Fixed Period - 3 Yrs) Option",
+    "SBI GILT FUND -  GROWTH - PF (Fixed Period - 1 Year) Option",
+    "HDFC Flexi Cap Fund - Direct Plan - Growth",
+    "HDFC Top 100 Fund - Direct Plan - Growth",
+    "HDFC 100 Index Fund - Direct Plan - Growth",
+]})
+
+
+def _match(message):
+    match = match_query(PROFILES, parse_query(message))
+    assert isinstance(match, pd.Series), match
+    return match["fund_name"]
+
+
+def test_tenor_in_fund_name_is_kept():
+    assert parse_query("nav of dsp 10y g-sec").name_keyword == "dsp 10y g sec"
+    assert _match("nav of dsp 10y g-sec").startswith("DSP 10Y G-Sec")
+    assert _match("bandhan gilt fund with 10 year constant duration").startswith("Bandhan Gilt Fund with 10 year")
+    assert "3 Yrs" in _match("sbi gilt fund pf fixed period 3 yrs")
+
+
+def test_horizon_outside_fund_name_still_stripped():
+    pq = parse_query("returns of hdfc flexi cap 3y")
+    assert pq.horizons == ("3y",)
+    assert _match("returns of hdfc flexi cap 3y").startswith("HDFC Flexi Cap")
+
+
+def test_category_alone_is_not_a_rank_question():
+    assert not parse_query("category of hdfc flexi cap").has("rank")
+    assert parse_query("is hdfc flexi cap top quartile in its category").has("rank")
+    assert parse_query("is hdfc flexi cap top in its category").has("rank")
+
+
+def test_top_in_fund_name():
+    assert parse_query("hdfc top 100").keyword == "hdfc top 100"
+    assert parse_query("rank of hdfc top 100").has("rank")
+    assert _match("rank of hdfc top 100").startswith("HDFC Top 100")
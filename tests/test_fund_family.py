@@ -0,0 +1,33 @@
+import pandas as pd
+
+from src.fund_family import add_family_columns, parse_scheme_names, pick_family_representatives
+
+
+def test_bonus_option_after_growth_plan_is_bonus():
+    names = pd.Series([
+        "Nippon India Low Duration Fund - Direct Plan Growth Plan - Bonus Option",
+        "Nippon India Low Duration Fund - Direct Plan Growth Plan - Growth Option",
+        "PGIM India Premier Bond Fund - Direct Plan - Half-Yearly Bonus",
+        "Nippon India Gilt Fund - Direct Plan - Quarterly Div Option",
+    ])
+    assert parse_scheme_names(names)["option"].tolist() == ["Bonus", "Growth", "Half Yearly Bonus", "Quarterly IDCW"]
+
+
+def test_family_representative_prefers_growth_over_bonus():
+    df = add_family_columns(pd.DataFrame({"fund_name": [
+        "Nippon India Low Duration Fund - Direct Plan Growth Plan - Bonus Option",
+        "Nippon India Low Duration Fund - Direct Plan Growth Plan - Growth Option",
+        "Nippon India Low Duration Fund - Direct Plan - Monthly IDCW Option",
+        "Nippon India Low Duration Fund - Regular Plan Growth Plan - Growth Option",
+    ]}))
+    assert df["family_id"].nunique() == 1
+    reps = pick_family_representatives(df)
+    assert reps["fund_name"].tolist() == ["Nippon India Low Duration Fund - Direct Plan Growth Plan - Growth Option"]
+
+
+def test_bonus_only_family_keeps_a_representative():
+    df = add_family_columns(pd.DataFrame({"fund_name": [
+        "ICICI Prudential Money Market Fund - Direct Plan Bonus",
+        "ICICI Prudential Money Market Fund - Bonus",
+    ]}))
+    assert len(pick_family_representatives(df)) == 1
@@ -0,0 +1,33 @@
+import pandas as pd
+
+from src.leaderboard import REFERENCE_AMOUNT, Leaderboards, lookup_board
+
+
+def _boards():
+    # Only the Equity / Aggressive / SIP / long board was built
+    lb = Leaderboards(key="snap:upload")
+    lb.boards[("Equity", "Aggressive", "sip", "long")] = pd.DataFrame({
+        "scheme_code": ["101"], "invested": [REFERENCE_AMOUNT], "units": [10.0], "terminal_value": [1500.0],
+    })
+    lb.messages[("Debt", "Aggressive", "sip", "long")] = "⚠️ No funds found"
+    return lb
+
+
+def test_built_board_is_served_rescaled():
+    pool, context = lookup_board(_boards(), "high", "long", "SIP", 5000, "equity")
+    assert pool["terminal_value"].tolist() == [7500.0]
+    assert context["user_type"] == "Aggressive"
+
+
+def test_combinations_not_built_fall_through_to_live_scoring():
+    lb = _boards()
+    assert lookup_board(lb, "high", "medium", "sip", 1000, "Equity") is None
+    assert lookup_board(lb, "low", "long", "sip", 1000, "Equity") is None
+    assert lookup_board(lb, "high", "long", "lumpsum", 1000, "Equity") is None
+    assert lookup_board(lb, "high", "long", "sip", 1000, "Index") is None
+    assert lookup_board(None, "high", "long", "sip", 1000, "Equity") is None
+
+
+def test_empty_combination_keeps_its_message():
+    pool, context = lookup_board(_boards(), "high", "long", "sip", 1000, "Debt")
+    assert pool.empty and context["message"] == "⚠️ No funds found"
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+
+from src.nav_quality import check_history
+
+
+def _history(navs):
+    return pd.DataFrame({"date": pd.bdate_range("2018-01-01", periods=len(navs)), "nav": navs})
+
+
+def _base(n=2000):
+    return 100 * np.cumprod(1 + np.random.default_rng(1).normal(0, 0.005, n))
+
+
+def test_bad_print_drops_only_glitched_rows():
+    navs = _base()
+    navs[1000:1002] *= 10
+    out = check_history(_history(navs), "1")
+    assert len(out) == len(navs) - 2
+    assert out["nav"].max() < 1000
+
+
+def test_split_drops_rows_before_it():
+    navs = _base()
+    navs[1200:] /= 10
+    assert len(check_history(_history(navs), "1")) == len(navs) - 1200
+
+
+def test_lasting_jump_that_is_not_a_split_is_kept():
+    navs = _base()
+    navs[1200:] *= 1.7
+    assert len(check_history(_history(navs), "1")) == len(navs)
@@ -0,0 +1,50 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from src import nav_store
+from src.nav_store import NavHistoryStore
+
+
+def _history(code, n=300):
+    dates = pd.bdate_range(end="2026-02-03", periods=n)
+    return pd.DataFrame({"date": dates, "nav": np.linspace(10, 20, n) + int(code) % 7})
+
+
+def _segments(root):
+    return sorted(d for d in os.listdir(root) if d.startswith("seg-"))
+
+
+def test_two_writers_keep_each_others_segments(tmp_path):
+    a = NavHistoryStore(str(tmp_path), flush_every=1)
+    b = NavHistoryStore(str(tmp_path), flush_every=1)
+
+    a.add("1", _history("1"))
+    b.add("2", _history("2"))
+    a.add("3", _history("3"))
+
+    fresh = NavHistoryStore(str(tmp_path))
+    assert fresh.snapshot()["segments"] == 3
+    assert all(fresh.series(c) is not None for c in ["1", "2", "3"])
+
+
+def test_compact_waits_for_readers_before_deleting(tmp_path, monkeypatch):
+    writer = NavHistoryStore(str(tmp_path), flush_every=1)
+    for code in ["1", "2", "3"]:
+        writer.add(code, _history(code))
+
+    reader = NavHistoryStore(str(tmp_path))
+    old = _segments(tmp_path)
+
+    writer.compact()
+    # The reader still has generation 3 mapped: nothing is deleted yet
+    assert set(old) <= set(_segments(tmp_path))
+    assert float(reader.series("2")[1][-1]) == float(_history("2")["nav"].iloc[-1])
+
+    # Once it reopens the manifest, the next commit sweeps the old segments
+    monkeypatch.setattr(nav_store, "RELOAD_EVERY_S", 0)
+    reader.series("2")
+    writer.add("4", _history("4"))
+    assert not set(old) & set(_segments(tmp_path))
+    assert NavHistoryStore(str(tmp_path)).snapshot()["stored"] == 4
@@ -0,0 +1,47 @@
+import pytest
+import requests
+
+from src import outbound
+from src.outbound import CLOSED, OPEN, CircuitBreaker, CircuitOpenError, guarded_get
+
+
+def _response(status):
+    r = requests.Response()
+    r.status_code = status
+    r.url = "http://source.test/x"
+    return r
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    b = CircuitBreaker("mfapi", failure_threshold=2, reset_after=60)
+    monkeypatch.setitem(outbound._breakers, "mfapi", b)
+    return b
+
+
+def test_404s_do_not_open_the_circuit(monkeypatch, breaker):
+    monkeypatch.setattr(requests, "get", lambda url, **kw: _response(404))
+
+    for _ in range(5):
+        with pytest.raises(requests.HTTPError):
+            guarded_get("mfapi", "http://source.test/x")
+
+    assert breaker.state == CLOSED
+    assert breaker.snapshot()["failures"] == 0
+
+
+def test_5xx_and_timeouts_open_the_circuit(monkeypatch, breaker):
+    monkeypatch.setattr(requests, "get", lambda url, **kw: _response(503))
+    with pytest.raises(requests.HTTPError):
+        guarded_get("mfapi", "http://source.test/x")
+
+    def timeout(url, **kw):
+        raise requests.Timeout("slow")
+
+    monkeypatch.setattr(requests, "get", timeout)
+    with pytest.raises(requests.Timeout):
+        guarded_get("mfapi", "http://source.test/x")
+
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        guarded_get("mfapi", "http://source.test/x")
@@ -0,0 +1,68 @@
+import random
+import sys
+
+import pandas as pd
+import pytest
+import streamlit as st
+
+from src import chat_ui, fund_qa
+from src.chat_ui import CHAT_HISTORY_LIMIT, fund_chatbot_response, remember_message
+from src.fund_qa import load_fund_profiles
+
+SESSIONS = 8
+TURNS = 80              # 160 messages, past the history limit
+MAX_KB_PER_SESSION = 96
+
+TEMPLATES = ["nav of {}", "returns of {}", "is {} risky", "{}", "compare with {}", "details"]
+
+
+def _deep_size(obj, seen=None) -> int:
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True).sum())
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(deep=True))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_size(k, seen) + _deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(_deep_size(v, seen) for v in obj)
+    return size
+
+
+@pytest.fixture
+def names(monkeypatch):
+    df = load_fund_profiles()
+    if df is None or df.empty:
+        pytest.skip("data/fund_profiles.csv is missing")
+
+    # Answers come from profile columns only: no history fetches
+    monkeypatch.setattr(chat_ui, "prefetch_fund", lambda fund_row: None)
+    monkeypatch.setattr(fund_qa, "prefetch_fund", lambda fund_row: None)
+    monkeypatch.setattr(fund_qa, "plot_comparison", lambda *a, **k: None)
+    monkeypatch.setattr(chat_ui, "with_metrics", lambda fund_row: fund_row)
+    return sorted({n.split(" - ")[0].lower().strip() for n in df["fund_name"].astype(str)})
+
+
+def test_session_state_stays_bounded(monkeypatch, names):
+    sizes = []
+    for seed in range(SESSIONS):
+        state = {}
+        monkeypatch.setattr(st, "session_state", state)
+
+        rng = random.Random(seed)
+        for _ in range(TURNS):
+            q = rng.choice(TEMPLATES).format(rng.choice(names))
+            remember_message("user", q)
+            remember_message("assistant", fund_chatbot_response(q))
+
+        assert len(state["messages"]) <= CHAT_HISTORY_LIMIT
+        assert not any(isinstance(v, (pd.DataFrame, pd.Series)) for v in state.values())
+        sizes.append(_deep_size(state))
+
+    assert max(sizes) / 1024 <= MAX_KB_PER_SESSION
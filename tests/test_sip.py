@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.sip import batch_xirr, simulate_investment
+
+GROWTH = {"gain": 1.15, "flat": 1.0, "mild_loss": 0.95, "halving": 0.5, "heavy_loss": 0.7}
+
+
+def _panel(years):
+    dates = pd.bdate_range(end="2026-02-03", periods=int(years * 262) + 30)
+    t = (dates - dates[0]).days / 365.0
+    return pd.DataFrame({name: 10 * g ** t for name, g in GROWTH.items()}, index=dates)
+
+
+def _reference_xirr(flows, times):
+    # Plain scalar bisection on NPV(rate)
+    def npv(r):
+        return sum(c * (1 + r) ** -t for c, t in zip(flows, times))
+
+    lo, hi = -0.9999, 100.0
+    for _ in range(200):
+        mid = (lo + hi) / 2
+        if (npv(mid) > 0) == (npv(lo) > 0):
+            lo = mid
+        else:
+            hi = mid
+    return mid
+
+
+def _expected(panel, code, invest_type, amount, years):
+    end = panel.index.max()
+    dates = [end - pd.DateOffset(months=k) for k in range(years * 12, 0, -1)]
+    navs = [panel[code].asof(d) for d in dates]
+    flows = [amount] + [0] * (len(dates) - 1) if invest_type == "lumpsum" else [amount] * len(dates)
+
+    units = sum(f / n for f, n in zip(flows, navs))
+    times = [(d - dates[0]).days / 365.0 for d in dates] + [(end - dates[0]).days / 365.0]
+    return _reference_xirr([-f for f in flows] + [units * panel[code].iloc[-1]], times) * 100
+
+
+@pytest.mark.parametrize("invest_type", ["sip", "lumpsum"])
+@pytest.mark.parametrize("years", [3, 5])
+def test_xirr_matches_scalar_reference(invest_type, years):
+    panel = _panel(years)
+    out = simulate_investment(panel, invest_type, 1000, years)
+
+    for code in GROWTH:
+        expected = _expected(panel, code, invest_type, 1000, years)
+        assert out.loc[code, "xirr"] == pytest.approx(expected, abs=1e-4), code
+        assert -100 < out.loc[code, "xirr"] < 100
+
+
+def test_losing_funds_rank_below_gaining_ones():
+    xirr = simulate_investment(_panel(5), "sip", 1000, 5)["xirr"]
+    assert list(xirr.sort_values(ascending=False).index) == ["gain", "flat", "mild_loss", "heavy_loss", "halving"]
+
+
+def test_unbracketed_flows_are_nan():
+    # Money in, nothing back, and a scheme with no flows at all
+    cashflows = np.array([[-100.0, 0.0], [-100.0, 0.0], [0.0, 0.0]])
+    assert np.isnan(batch_xirr(cashflows, np.array([0.0, 0.5, 1.0]))).all()
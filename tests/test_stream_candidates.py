@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import recommender
+from src.recommender import RETURN_COLS, rank_candidates, stream_candidates
+
+
+def _master(n=6):
+    return pd.DataFrame({
+        "scheme_code": [str(100 + i) for i in range(n)],
+        "scheme_name": [f"Alpha{i} Flexi Cap Equity Fund - Direct Plan - Growth" for i in range(n)],
+        "nav": np.linspace(20, 40, n),
+        "nav_change_pct": np.linspace(0.1, 1.2, n),
+    })
+
+
+def _history(code):
+    dates = pd.bdate_range(end="2026-02-03", periods=1400)
+    growth = 1 + int(code) % 7 / 100
+    return pd.DataFrame({"date": dates, "nav": 10 * growth ** ((dates - dates[0]).days / 365.0)})
+
+
+@pytest.fixture
+def stubbed(monkeypatch):
+    failing = set()
+
+    def fetch(code):
+        if code in failing:
+            raise ConnectionError(f"mfapi down for {code}")
+        return _history(code)
+
+    # Every scheme also has (stale) precomputed returns
+    known = pd.DataFrame({c: 99.0 for c in RETURN_COLS}, index=_master()["scheme_code"])
+
+    monkeypatch.setattr(recommender, "fetch_scheme_history", fetch)
+    monkeypatch.setattr(recommender, "cached_history", lambda code: None)
+    monkeypatch.setattr(recommender, "precomputed_returns", lambda: known)
+    return failing
+
+
+@pytest.mark.parametrize("failing", [set(), {"102", "104"}])
+def test_final_yield_matches_rank_candidates(stubbed, failing):
+    stubbed.update(failing)
+    args = (_master(), "high", "long", "sip", 1000, "Equity")
+
+    expected, expected_ctx = rank_candidates(*args)
+    *_, (final, ctx) = stream_candidates(*args)
+
+    assert ctx["final"]
+    assert len(ctx["fetch_errors"]) == len(expected_ctx["fetch_errors"]) == len(failing)
+
+    cols = ["scheme_code", "final_score", "xirr"] + RETURN_COLS
+    pd.testing.assert_frame_equal(
+        final[cols].reset_index(drop=True), expected[cols].reset_index(drop=True)
+    )
+    assert final.loc[final["scheme_code"].isin(failing), RETURN_COLS].isna().all().all()